@@ -0,0 +1,118 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from frame_buffer import PNG_COMPRESSION
+from page_archive import parse_ref, read_image
+
+
+def content_bbox(img, tolerance=24, min_pixels=2):
+    """
+    Bounding box (left, top, right, bottom) of everything that differs from
+    the page background, or None for a blank page. The background color is
+    the median of the outermost pixel ring, so dark-mode pages work too.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+    background = int(np.median(border))
+    mask = cv2.absdiff(gray, np.full_like(gray, background)) > tolerance
+    # A row/column needs a few content pixels, so isolated specks don't widen the box
+    rows = np.flatnonzero(np.count_nonzero(mask, axis=1) >= min_pixels)
+    cols = np.flatnonzero(np.count_nonzero(mask, axis=0) >= min_pixels)
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def page_content_bbox(path, max_width=400):
+    """
+    content_bbox of one page, measured on a copy shrunk to about max_width
+    and scaled back outwards to full-resolution coordinates. Returns
+    (box or None, full-resolution shape), or (None, None) if unreadable.
+    """
+    img = read_image(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None, None
+    h, w = img.shape
+    factor = max(1, w // max_width)
+    min_pixels = 2
+    if factor > 1:
+        # INTER_AREA keeps thin strokes as lighter pixels instead of dropping them, and already
+        # fades isolated specks below the tolerance, so a single pixel of a thin rule counts
+        img = cv2.resize(img, (max(1, w // factor), max(1, h // factor)), interpolation=cv2.INTER_AREA)
+        min_pixels = 1
+    box = content_bbox(img, min_pixels=min_pixels)
+    if box is None:
+        return None, (h, w)
+    left, top, right, bottom = box
+    return (left * factor, top * factor, min(right * factor + factor, w), min(bottom * factor + factor, h)), (h, w)
+
+
+def find_book_crop(image_paths, padding=16, min_saving=0.02, workers=4):
+    """
+    Derives one crop box for the whole book: the union of the content boxes
+    of every page, each measured on a downscaled copy (page_content_bbox).
+    The crop is identical on every page (no jitter) and never cuts into
+    content that reaches further on some pages, such as a full-bleed
+    illustration or a wide table. Returns None when cropping would save less
+    than min_saving of the page area, or when the pages differ in size (one
+    box in pixel coordinates cannot fit them all).
+    """
+    if not image_paths:
+        return None
+    box = None
+    shapes = set()
+    # Decoding dominates and OpenCV releases the GIL, so threads scale
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for page_box, page_shape in pool.map(page_content_bbox, image_paths):
+            if page_shape is not None:
+                shapes.add(page_shape)
+            if page_box is None:
+                continue
+            box = page_box if box is None else (min(box[0], page_box[0]), min(box[1], page_box[1]),
+                                                max(box[2], page_box[2]), max(box[3], page_box[3]))
+    if len(shapes) > 1:
+        print(f"Auto crop: pages differ in size {sorted(shapes)}, not cropping.")
+        return None
+    if box is None:
+        return None
+    (h, w), = shapes
+    left, top = max(box[0] - padding, 0), max(box[1] - padding, 0)
+    right, bottom = min(box[2] + padding, w), min(box[3] + padding, h)
+    if (right - left) * (bottom - top) > (1 - min_saving) * w * h:
+        return None
+    return left, top, right, bottom
+
+
+def crop_images(image_paths, box, output_dir):
+    """Writes each image cropped to `box` into output_dir and returns the new paths (same order)."""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    left, top, right, bottom = box
+    cropped = []
+    for i, path in enumerate(image_paths):
+        img = read_image(path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            print(f"Error reading {path}")
+            continue
+        name = f"page_{i + 1:05d}.png" if parse_ref(path) else os.path.basename(path)
+        out = os.path.join(output_dir, name)
+        # Same zlib level as capture (OpenCV's default is the fastest, largest one)
+        cv2.imwrite(out, img[top:bottom, left:right], [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+        cropped.append(out)
+    return cropped
+
+
+def auto_crop_book(image_paths, output_dir):
+    """
+    Pipeline stage: finds the book crop and writes cropped copies to output_dir.
+    Returns the original paths unchanged when there is nothing worth cropping.
+    """
+    box = find_book_crop(image_paths)
+    if box is None:
+        print("Auto crop: no margins worth cropping.")
+        return list(image_paths)
+    print(f"Auto crop: {box}")
+    return crop_images(image_paths, box, output_dir)
@@ -0,0 +1,100 @@
+"""
+Headless throughput benchmark for the capture loop.
+
+Runs CaptureEngine against a replay source instead of the live screen, so it
+works on any machine (no Kindle, no display needed).
+
+    python src/bench_capture.py --pages 200 --width 1600 --height 2400
+    python src/bench_capture.py --frames-dir recorded_frames --latency 0.15
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from capture_engine import CaptureEngine
+from frame_buffer import SCRATCH
+from frame_source import DirectoryReplaySource, SyntheticBookSource
+
+
+def run_benchmark(source, wait_time=0.0, output_dir=None, encode_workers=2, **capture_kwargs):
+    """Runs one capture against `source` and returns a result dict."""
+    cleanup = output_dir is None
+    if cleanup:
+        output_dir = tempfile.mkdtemp(prefix="bench_capture_")
+    try:
+        engine = CaptureEngine(output_dir=output_dir, frame_source=source, page_turner=source,
+                               encode_workers=encode_workers)
+        engine.set_region(0, 0, 0, 0)  # Region is ignored by replay sources
+
+        start = time.perf_counter()
+        engine.start_capture(direction="右キー", wait_time=wait_time, **capture_kwargs)
+        elapsed = time.perf_counter() - start
+
+        saved = len(engine.saved_files)
+        frames = engine.stats.get('frames', 0)
+        result = {
+            'pages_saved': saved,
+            'frames_grabbed': frames,
+            'page_turns': source.turns,
+            'elapsed_sec': elapsed,
+            'pages_per_min': saved / elapsed * 60 if elapsed > 0 else 0.0,
+            'compare_ms_per_frame': engine.stats.get('compare_time', 0.0) / frames * 1000 if frames else 0.0,
+        }
+        encode = engine.stats.get('encode', {})
+        result['encode_ms_avg'] = encode.get('encode_time_avg', 0.0) * 1000
+        result['encode_blocked_sec'] = encode.get('blocked_time', 0.0)
+        result['encode_max_queue_depth'] = encode.get('max_queue_depth', 0)
+        # Full-frame scratch buffers allocated so far: constant per thread, not per page
+        result['scratch_allocations'] = SCRATCH.stats['allocations']
+        result['scratch_mb'] = SCRATCH.stats['allocated_bytes'] / 1e6
+        expected = getattr(source, 'distinct_pages', len(source))
+        result['expected_pages'] = expected
+        # End of book is detected correctly when we stop on the last page with nothing missed
+        result['end_detected'] = saved == expected and source.index == len(source) - 1
+        return result
+    finally:
+        if cleanup:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture loop throughput benchmark")
+    parser.add_argument("--frames-dir", help="Replay recorded frames from this directory instead of synthetic pages")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=1200)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated page render latency (sec)")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="Probability a page repeats the previous one")
+    parser.add_argument("--wait", type=float, default=0.0, help="wait_time passed to the engine (sec)")
+    parser.add_argument("--adaptive", action="store_true", help="Use adaptive page-settle detection instead of a fixed wait")
+    parser.add_argument("--spread", action="store_true", help="Two-page spreads, split at the gutter")
+    parser.add_argument("--encode-workers", type=int, default=2, help="PNG writer threads")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.frames_dir:
+        source = DirectoryReplaySource(args.frames_dir, render_latency=args.latency)
+    else:
+        source = SyntheticBookSource(pages=args.pages, width=args.width, height=args.height,
+                                     render_latency=args.latency, duplicate_rate=args.duplicates,
+                                     seed=args.seed, spread=args.spread)
+
+    result = run_benchmark(source, wait_time=args.wait, adaptive=args.adaptive, spread=args.spread,
+                           encode_workers=args.encode_workers)
+
+    print("--- Capture benchmark ---")
+    print(f"Pages saved:      {result['pages_saved']} (expected {result['expected_pages']})")
+    print(f"Frames grabbed:   {result['frames_grabbed']}")
+    print(f"Elapsed:          {result['elapsed_sec']:.2f} s")
+    print(f"Throughput:       {result['pages_per_min']:.1f} pages/min")
+    print(f"Duplicate check:  {result['compare_ms_per_frame']:.2f} ms/frame")
+    print(f"PNG encode:       {result['encode_ms_avg']:.1f} ms/page avg, "
+          f"max queue depth {result['encode_max_queue_depth']}, "
+          f"loop blocked {result['encode_blocked_sec']:.2f} s")
+    print(f"Scratch buffers:  {result['scratch_allocations']} allocated ({result['scratch_mb']:.1f} MB)")
+    print(f"End of book:      {'OK' if result['end_detected'] else 'MISSED'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+"""
+CPU micro-benchmarks for the hot paths, on synthetic book pages.
+
+Each benchmark times one stage (duplicate check, PNG encoding, spread
+splitting, PDF generation with part splitting, OCR text cleanup, ...) over
+the same generated book at several resolutions and reports ms/page, MB/s of
+input and peak memory. Results are saved as JSON, so a change can be checked
+against an earlier run:
+
+    python src/bench_suite.py
+    python src/bench_suite.py --sizes 800x1200,1600x2400 --pages 24 --only compare,png_encode
+    python src/bench_suite.py --compare bench_results/bench_20260101_120000.json
+
+Pages follow a fixed mix and seed: vertical (tategaki) and horizontal
+Japanese-like text, illustrations, blank pages and near-duplicates (the
+previous page with only the progress indicator changed), as BGRA arrays like
+the frames the capture loop grabs.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from frame_buffer import encode_png, write_png
+
+RESULTS_DIR = "bench_results"
+DEFAULT_SIZES = "800x1200,1600x2400"
+KINDS = ('vertical', 'horizontal', 'illustration', 'blank', 'near_duplicate')
+# Repeated over the book: mostly text, every kind in any 10 consecutive pages
+KIND_PATTERN = ('vertical', 'vertical', 'near_duplicate', 'horizontal', 'vertical',
+                'blank', 'horizontal', 'illustration', 'vertical', 'horizontal')
+PAPER = 250  # gray level of the page background
+INK = 30
+
+
+# --- Synthetic pages ---
+
+def glyph_atlas(size, rng, count=96):
+    """Kanji/kana-like glyphs (a few strokes in a square cell) as ink masks, drawn once and tiled."""
+    atlas = np.zeros((count, size, size), np.uint8)
+    pad, stroke = max(1, size // 8), max(1, size // 12)
+    for glyph in atlas:
+        for _ in range(rng.integers(2, 7)):
+            x0, y0, x1, y1 = (int(v) for v in rng.integers(pad, size - pad, 4))
+            shape = rng.random()
+            if shape < 0.4:
+                y1 = y0  # horizontal stroke
+            elif shape < 0.8:
+                x1 = x0  # vertical stroke
+            cv2.line(glyph, (x0, y0), (x1, y1), 255, stroke, cv2.LINE_AA)
+    return atlas
+
+
+class SyntheticBook:
+    """
+    A book of `pages` BGRA pages of one resolution (see module docstring).
+    kinds[i] says what page i is; png_paths() writes them once for the
+    file-based benchmarks.
+    """
+    def __init__(self, width, height, pages, seed=0):
+        self.width = width
+        self.height = height
+        self._rng = np.random.default_rng((seed, width, height))
+        self.glyph = max(8, height // 48)
+        self._atlas = glyph_atlas(self.glyph, self._rng)
+        self.kinds = [KIND_PATTERN[i % len(KIND_PATTERN)] for i in range(pages)]
+        self.frames = []
+        for number, kind in enumerate(self.kinds, 1):
+            if kind == 'near_duplicate':
+                frame = self._near_duplicate(self.frames[-1])
+            else:
+                frame = self._page(getattr(self, '_' + kind)(), number)
+            self.frames.append(frame)
+        self._paths = None
+
+    @property
+    def label(self):
+        return f"{self.width}x{self.height}"
+
+    @property
+    def raw_bytes(self):
+        return sum(frame.nbytes for frame in self.frames)
+
+    def _page(self, ink, number):
+        """BGRA page from an ink mask (uint8, 255 = full ink) or a ready BGR image, with a page number."""
+        if ink.ndim == 2:
+            gray = (PAPER - ink.astype(np.uint16) * (PAPER - INK) // 255).astype(np.uint8)
+            bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        else:
+            bgr = ink
+        h, w = self.height, self.width
+        cv2.putText(bgr, str(number), (w // 2, h - h // 30), cv2.FONT_HERSHEY_SIMPLEX,
+                    max(h / 1600, 0.4), (INK, INK, INK), 1, cv2.LINE_AA)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+
+    def _glyphs(self, n):
+        return self._atlas[self._rng.integers(0, len(self._atlas), n)]
+
+    def _vertical(self):
+        """Columns of glyphs read top to bottom, right to left, with short paragraph ends."""
+        h, w, g = self.height, self.width, self.glyph
+        ink = np.zeros((h, w), np.uint8)
+        top, margin = h // 12, w // 10
+        per_column = (h - 2 * top) // g
+        pitch = g * 8 // 5
+        for x in range(w - margin - g, margin, -pitch):
+            n = per_column if self._rng.random() < 0.8 else int(self._rng.integers(1, per_column))
+            ink[top:top + n * g, x:x + g] = self._glyphs(n).reshape(n * g, g)
+        return ink
+
+    def _horizontal(self):
+        """Lines of glyphs read left to right, top to bottom."""
+        h, w, g = self.height, self.width, self.glyph
+        ink = np.zeros((h, w), np.uint8)
+        top, margin = h // 12, w // 10
+        per_line = (w - 2 * margin) // g
+        pitch = g * 8 // 5
+        for y in range(top, h - top - g, pitch):
+            n = per_line if self._rng.random() < 0.8 else int(self._rng.integers(1, per_line))
+            ink[y:y + g, margin:margin + n * g] = self._glyphs(n).transpose(1, 0, 2).reshape(g, n * g)
+        return ink
+
+    def _illustration(self):
+        """Gradient, filled shapes and sensor-like noise: the worst case for PNG and the bilevel test."""
+        h, w = self.height, self.width
+        ramp = np.linspace(0, 1, w, dtype=np.float32)[None, :] * np.linspace(0.6, 1, h, dtype=np.float32)[:, None]
+        base = self._rng.integers(60, 200, 3)
+        bgr = np.dstack([(ramp * c + 40).astype(np.uint8) for c in base])
+        for _ in range(12):
+            center = (int(self._rng.integers(0, w)), int(self._rng.integers(0, h)))
+            axes = (int(self._rng.integers(w // 20, w // 4)), int(self._rng.integers(h // 20, h // 4)))
+            color = tuple(int(c) for c in self._rng.integers(0, 256, 3))
+            cv2.ellipse(bgr, center, axes, float(self._rng.integers(0, 180)), 0, 360, color, -1, cv2.LINE_AA)
+        noise = self._rng.normal(0, 6, bgr.shape).astype(np.int16)
+        return np.clip(bgr.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+    def _blank(self):
+        return np.zeros((self.height, self.width), np.uint8)
+
+    def _near_duplicate(self, frame):
+        """The previous page with the reading-progress bar at the bottom advanced a little."""
+        frame = frame.copy()
+        h, w = frame.shape[:2]
+        y = h - h // 60
+        progress = int(self._rng.integers(w // 10, w - w // 10))
+        frame[y:y + 3, :progress, :3] = INK
+        return frame
+
+    def png_paths(self, directory):
+        """Writes the pages as PNG files (once) and returns their paths."""
+        if self._paths is None:
+            os.makedirs(directory, exist_ok=True)
+            self._paths = []
+            for i, frame in enumerate(self.frames):
+                path = os.path.join(directory, f"page_{i + 1:04d}.png")
+                write_png(frame, path)
+                self._paths.append(path)
+        return self._paths
+
+
+def page_paragraphs(rng, count=24):
+    """Docs API paragraphs ([[style, text], ...]) of one OCR'd page, with headings, blanks and page-number junk."""
+    chars = np.array(list("あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+                          "、。「」日本語文章読書時間世界人生物語研究開発技術情報社会経済"))
+    paragraphs = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.08:
+            paragraphs.append(['NORMAL_TEXT', ""])
+        elif roll < 0.12:
+            paragraphs.append(['NORMAL_TEXT', f"Page {int(rng.integers(1, 400))}"])
+        elif roll < 0.16:
+            paragraphs.append(['HEADING_2', "".join(rng.choice(chars, int(rng.integers(6, 20))))])
+        else:
+            paragraphs.append(['NORMAL_TEXT', " " + "".join(rng.choice(chars, int(rng.integers(40, 240))))])
+    return paragraphs
+
+
+# --- Benchmarks ---
+# Each one prepares its inputs from a book and returns (run, items, input_bytes):
+# run() processes `items` pages (input_bytes in total) and may return extra figures.
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@benchmark('fingerprint')
+def _fingerprint(book, work_dir):
+    from page_compare import PageComparator
+    comparator = PageComparator()
+
+    def run():
+        for frame in book.frames:
+            comparator.fingerprint(frame)
+    return run, len(book.frames), book.raw_bytes
+
+
+@benchmark('compare')
+def _compare(book, work_dir):
+    """CaptureEngine's duplicate check: thumbnails, confirmed at full resolution when they look alike."""
+    from page_compare import PageComparator
+    comparator = PageComparator()
+    fps = [comparator.fingerprint(frame) for frame in book.frames]
+    pairs = list(zip(book.frames[1:], fps[1:], book.frames, fps))
+
+    def run():
+        comparator.full_checks = 0
+        duplicates = sum(comparator.is_duplicate(*pair)[0] for pair in pairs)
+        return {'duplicates': duplicates, 'full_checks': comparator.full_checks}
+    return run, len(pairs), sum(frame.nbytes for frame, _, _, _ in pairs)
+
+
+@benchmark('spread_split')
+def _spread_split(book, work_dir):
+    from spread import SpreadSplitter
+    splitter = SpreadSplitter()
+    spreads = [np.hstack(book.frames[i:i + 2]) for i in range(0, len(book.frames) - 1, 2)]
+
+    def run():
+        return {'spreads': sum(splitter.find_gutter(spread) is not None for spread in spreads)}
+    return run, len(spreads) * 2, sum(spread.nbytes for spread in spreads)
+
+
+@benchmark('frame_hash')
+def _frame_hash(book, work_dir):
+    from page_store import PageStore
+
+    def run():
+        for frame in book.frames:
+            PageStore.frame_hash(frame)
+    return run, len(book.frames), book.raw_bytes
+
+
+@benchmark('png_encode')
+def _png_encode(book, work_dir):
+    def run():
+        encoded = sum(len(encode_png(frame)) for frame in book.frames)
+        return {'output_mb': encoded / 1e6, 'ratio': book.raw_bytes / encoded}
+    return run, len(book.frames), book.raw_bytes
+
+
+@benchmark('pdf_generate')
+def _pdf_generate(book, work_dir):
+    """PDFGenerator.generate with a part limit of a third of the book, so the splitting is exercised."""
+    from pdf_writer import PDFGenerator
+    paths = book.png_paths(os.path.join(work_dir, "pages"))
+    png_bytes = sum(os.path.getsize(path) for path in paths)
+    out_dir = os.path.join(work_dir, "pdf")
+
+    def run():
+        generator = PDFGenerator(out_dir)
+        generator.max_size_bytes = png_bytes // 3 + 100 * 1000
+        with contextlib.redirect_stdout(io.StringIO()):  # per-run stage summary
+            parts = generator.generate(paths, "bench")
+        output = sum(os.path.getsize(part) for part in parts)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        return {'parts': len(parts), 'output_mb': output / 1e6}
+    return run, len(paths), png_bytes
+
+
+@benchmark('montage_build')
+def _montage_build(book, work_dir):
+    from ocr_montage import build_montage
+    paths = book.png_paths(os.path.join(work_dir, "pages"))
+    groups = [paths[i:i + 4] for i in range(0, len(paths), 4)]
+
+    def run():
+        return {'output_mb': sum(len(build_montage(group)) for group in groups) / 1e6}
+    return run, len(paths), sum(os.path.getsize(path) for path in paths)
+
+
+@benchmark('ocr_markdown')
+def _ocr_markdown(book, work_dir):
+    """ocr_processor's cleanup of the Docs paragraphs into Markdown (resolution-independent)."""
+    from ocr_processor import paragraphs_to_markdown
+    rng = np.random.default_rng(len(book.frames))
+    pages = [page_paragraphs(rng) for _ in book.frames]
+    text_bytes = sum(len(text.encode('utf-8')) for page in pages for _, text in page)
+
+    def run():
+        for paragraphs in pages:
+            paragraphs_to_markdown(paragraphs)
+    return run, len(pages), text_bytes
+
+
+def run_benchmark(name, book, work_dir, repeat=3):
+    """
+    Times one benchmark on one book. The first run is traced with tracemalloc
+    for the peak memory (numpy/OpenCV arrays included) and doubles as warm-up;
+    the timed runs follow untraced and the fastest counts.
+    """
+    run, items, input_bytes = BENCHMARKS[name](book, work_dir)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times = []
+    extra = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        extra = run()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    result = {
+        'benchmark': name,
+        'size': book.label,
+        'pages': items,
+        'ms_per_page': best / items * 1000 if items else 0.0,
+        'mb_per_s': input_bytes / 1e6 / best if best > 0 else 0.0,
+        'peak_mb': peak / 1e6,
+        'best_s': best,
+        'mean_s': sum(times) / len(times),
+        'input_mb': input_bytes / 1e6,
+    }
+    result.update(extra or {})
+    return result
+
+
+def parse_sizes(text):
+    sizes = []
+    for item in text.split(","):
+        width, _, height = item.strip().partition("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def machine_info():
+    info = {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+    try:
+        import resource
+        # Peak resident size of the whole run (KB on Linux, bytes on macOS); not available on Windows
+        info['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        pass
+    return info
+
+
+def compare_results(old, new):
+    """Lines of ms/page changes between two result files (negative = faster)."""
+    before = {(r['benchmark'], r['size']): r for r in old['results']}
+    lines = []
+    for r in new['results']:
+        prev = before.get((r['benchmark'], r['size']))
+        if prev is None or not prev['ms_per_page']:
+            continue
+        change = (r['ms_per_page'] / prev['ms_per_page'] - 1) * 100
+        lines.append(f"{r['benchmark']:>14} {r['size']:>10}: {prev['ms_per_page']:9.3f} -> "
+                     f"{r['ms_per_page']:9.3f} ms/page ({change:+6.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU micro-benchmarks of the capture / PDF / OCR hot paths")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Page resolutions WxH, comma-separated (default: %(default)s)")
+    parser.add_argument("--pages", type=int, default=16, help="Pages per resolution")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (the fastest counts)")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help=f"Result JSON (default: {RESULTS_DIR}/bench_<date>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.only.split(",")] if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+    if args.pages < 2:
+        parser.error("--pages must be at least 2")
+
+    started = datetime.now()
+    results = []
+    work_root = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        for width, height in parse_sizes(args.sizes):
+            book = SyntheticBook(width, height, args.pages, seed=args.seed)
+            kinds = {kind: book.kinds.count(kind) for kind in KINDS}
+            print(f"--- {book.label}: {args.pages} pages {kinds} ---")
+            work_dir = os.path.join(work_root, book.label)
+            for name in names:
+                result = run_benchmark(name, book, work_dir, repeat=args.repeat)
+                results.append(result)
+                print(f"{name:>14}: {result['ms_per_page']:9.3f} ms/page  {result['mb_per_s']:9.1f} MB/s  "
+                      f"peak {result['peak_mb']:7.1f} MB")
+            del book
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    report = {
+        'name': 'bench',
+        'started': started.isoformat(timespec='seconds'),
+        'machine': machine_info(),
+        'settings': {'sizes': args.sizes, 'pages': args.pages, 'repeat': args.repeat, 'seed': args.seed},
+        'results': results,
+    }
+    path = args.output or os.path.join(RESULTS_DIR, f"bench_{started:%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results: {path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            old = json.load(f)
+        print(f"--- Compared with {args.compare} ({old.get('started', '?')}) ---")
+        for line in compare_results(old, report):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Where the pages of a captured book are found.
+
+A capture leaves a book's pages in one of three places under the image
+folder, named after the sanitized title: its page archive
+(archives/<title>.pages), its page store index (books/<title>.txt) or its
+session journal (sessions/<title>.jsonl). Only the old flow left loose
+page_*.png files in the folder itself.
+"""
+import os
+
+from page_archive import ARCHIVE_EXT, PageArchive, archive_path
+from session_journal import journal_for_book
+
+# Sub-folder and extension of each kind of book file, in lookup order
+_BOOK_FILES = (("archives", ARCHIVE_EXT), ("books", ".txt"), ("sessions", ".jsonl"))
+
+
+def book_pages(images, title):
+    """Ordered pages of a book from its archive, page store index or journal ([] if none)."""
+    archive = archive_path(images, title)
+    if os.path.exists(archive):
+        return PageArchive(archive).refs()
+    if os.path.isdir(os.path.join(images, "books")):
+        from page_store import PageStore
+        pages = PageStore(images).book_pages(title)
+        if pages:
+            return pages
+    return journal_for_book(images, title).page_paths()
+
+
+def loose_pages(images):
+    """page PNGs directly in the folder, in name order."""
+    return [os.path.join(images, f) for f in sorted(os.listdir(images)) if f.endswith('.png')]
+
+
+def latest_book(images):
+    """
+    (title, mtime) of the book written to most recently, or None.
+    The title is the sanitized file name, which book_pages accepts as is.
+    """
+    latest = None
+    for sub, ext in _BOOK_FILES:
+        folder = os.path.join(images, sub)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if name.endswith(ext):
+                mtime = os.path.getmtime(os.path.join(folder, name))
+                if latest is None or mtime > latest[1]:
+                    latest = (name[:-len(ext)], mtime)
+    return latest
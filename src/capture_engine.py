@@ -1,15 +1,20 @@
 import time
 import os
-import mss
-import mss.tools
 import cv2
 import numpy as np
-import pyautogui
 import threading
 from datetime import datetime
+from frame_source import MssFrameSource, PyAutoGuiPageTurner
+from image_writer import ImageWriterPool
+from instrument import Instrumentation
+from page_compare import PageComparator
+from page_archive import page_digest, page_size, read_image
+from spread import SpreadSplitter
 
 class CaptureEngine:
-    def __init__(self, output_dir="captured_images"):
+    def __init__(self, output_dir="captured_images", frame_source=None, page_turner=None,
+                 encode_workers=2, encode_queue_size=8, similarity_threshold=0.99, page_store=None,
+                 report_dir=None):
         self.output_dir = output_dir
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
@@ -18,6 +23,37 @@ class CaptureEngine:
         self.stop_event = threading.Event()
         self.saved_files = []
         self.last_image_data = None
+
+        # Where frames come from and how pages are turned.
+        # Defaults drive the live screen; see frame_source.ReplaySource for headless runs.
+        self.frame_source = frame_source or MssFrameSource()
+        self.page_turner = page_turner or PyAutoGuiPageTurner()
+        self.stats = {}
+
+        # PNG encoding runs on a bounded background pool (see image_writer.py)
+        self.encode_workers = encode_workers
+        self.encode_queue_size = encode_queue_size
+        self.writer = None
+
+        # Downscaled fingerprint duplicate check (see page_compare.py)
+        self.comparator = PageComparator(threshold=similarity_threshold)
+
+        # Gutter detection for two-page spreads (see spread.py)
+        self.splitter = SpreadSplitter()
+
+        # Optional content-addressed page store (see page_store.py); pages then go
+        # to blobs shared across runs and books instead of timestamped files
+        self.page_store = page_store
+        self._book_id = None
+        self._on_page_saved = None
+        self._journal = None
+        self._archive = None
+        self._splice_pending = None
+
+        # Per-stage timings of the last run (see instrument.py); a JSON report per run goes to report_dir
+        self.report_dir = report_dir or os.path.join(output_dir, "reports")
+        self.instrument = None
+        self.report_path = None
     
     def set_region(self, x, y, width, height):
         # mss requires integers
@@ -29,18 +65,94 @@ class CaptureEngine:
         }
         print(f"Region set to: {self.region}")
 
-    def start_capture(self, direction='right', wait_time=1.5, callback_status=None):
+    def start_capture(self, direction='right', wait_time=1.5, callback_status=None,
+                      adaptive=False, settle_polls=1, poll_interval=0.03,
+                      change_timeout=None, settle_timeout=3.0, on_page_saved=None, book_id=None,
+                      journal=None, resume=False, profile=False, spread=False, archive=None):
         """
         Runs the capture loop.
         direction: 'left' or 'right'
         wait_time: seconds to wait after page turn
         callback_status: function(msg, count) to update UI
+        adaptive: instead of sleeping wait_time, poll low-res grabs after each
+            turn and capture as soon as the page has changed and stayed stable
+            for settle_polls consecutive polls (at most settle_timeout seconds).
+            A turn that shows no change within change_timeout (default:
+            wait_time, what fixed-wait mode would sleep) is the duplicate
+            signal: the last poll's full frame is checked at full resolution
+            right away, so a page whose thumbnail resembles the previous one
+            is still saved, and end of book costs no more than with a fixed
+            wait. The loop reuses the last poll's frame instead of grabbing
+            again.
+        on_page_saved: function(filename) called in page order as soon as each
+            PNG is on disk (from a writer thread), e.g. PDFStream.add_page.
+        book_id: with a page_store, the book whose page index this run writes.
+            A run that starts by repeating the book's last pages (at least
+            page_store.SPLICE_OVERLAP of them, e.g. a re-capture of the end)
+            continues the book from the first repeated page; otherwise, and
+            always when resuming, its pages are appended to the book's index
+            (delete the book first to start it over).
+        journal: SessionJournal recording settings and every saved page.
+        resume: continue the journal's session instead of starting a new one.
+            The first frame must match the last journaled page (i.e. Kindle
+            still shows it), otherwise capture stops without saving anything.
+        profile: also run cProfile over the loop (slower; the stats end up
+            in the run report and a .prof file next to it).
+        spread: the region shows Kindle's two-page spread; each frame is
+            split at the gutter into two pages in reading order (right page
+            first for vertical books), so one turn yields two pages. Frames
+            without a gutter (covers, full-width images) are saved as one page.
+        archive: PageArchive (opened 'w' for a new book, 'a' to resume) that
+            receives every page instead of loose PNGs or the page store;
+            saved_files then holds page references. Closed when the run ends.
         """
         self.stop_event.clear()
         self.saved_files = []
+        self._book_id = book_id if self.page_store and archive is None else None
+        self._archive = archive
+        self._on_page_saved = on_page_saved
+        self._journal = journal
         self.last_image_data = None
+        self.last_thumbnail = None
+        page_count = 1
+        verify_resume = False
+        resume_page = None  # spread mode: last saved page, to match against half of the first frame
+        if journal is not None and resume and journal.last_page():
+            # Pick up where the journal ends: the last page becomes "previous page"
+            self.saved_files = journal.page_paths()
+            page_count = len(journal.pages) + 1
+            last = read_image(journal.last_page()['path'], cv2.IMREAD_COLOR)
+            if last is not None:
+                last = cv2.cvtColor(last, cv2.COLOR_BGR2BGRA)
+                if spread:
+                    resume_page = last
+                else:
+                    self.last_image_data = last
+                    self.last_thumbnail = self.comparator.fingerprint(last)
+                verify_resume = True
+            journal.resume()
+        elif journal is not None:
+            journal.start(region=self.region, direction=direction, wait_time=wait_time,
+                          adaptive=adaptive, book_id=book_id, spread=spread, archive=archive is not None)
+        # Digests of the run's first pages, held back until page_store decides whether
+        # they overlap the end of the book (see _page_written)
+        self._splice_pending = [] if self._book_id and not self.saved_files else None
+        end_reason = 'stopped'
+        self.stats = {'frames': 0, 'compare_time': 0.0, 'polls': 0,
+                      'pages': 0, 'turns': 0, 'turn_time': 0.0, 'bytes_written': 0}
         consecutive_duplicates = 0
         duplicate_limit = 3  # Stop after 3 times no change
+        instr = self.instrument = Instrumentation('capture', profile=profile, settings={
+            'direction': direction, 'wait_time': wait_time, 'adaptive': adaptive,
+            'settle_polls': settle_polls, 'poll_interval': poll_interval,
+            'encode_workers': self.encode_workers, 'encode_queue_size': self.encode_queue_size,
+            'region': self.region, 'resume': resume, 'spread': spread,
+        })
+        last_page_time = None
+        if change_timeout is None:
+            # A few polls at least, so a page can be seen changing at all
+            change_timeout = max(float(wait_time), 3 * poll_interval)
+        settled_frame = None  # (frame, fingerprint) of the last settle poll, used instead of a new grab
         
         # Mapping UI direction to key
         # "右→左 (縦書き)" means we want to go PREVIOUS page? No,
@@ -60,79 +172,250 @@ class CaptureEngine:
              key_to_press = 'right'
         elif "PageDown" in direction:
              key_to_press = 'pagedown'
+        # Vertical books turn with the left key and read their spreads right to left
+        right_to_left = key_to_press == 'left'
         
         # Safety click to ensure focus on the application
         if self.region:
-             center_x = self.region['left'] + self.region['width'] // 2
-             center_y = self.region['top'] + self.region['height'] // 2
-             
-             # Safety click to ensure focus on the application
-             # Click the center of the region once at the start to focus window
-             print(f"Clicking at {center_x}, {center_y} to focus window...")
-             pyautogui.click(center_x, center_y)
-             time.sleep(0.5)
+             self.page_turner.focus(self.region)
 
         print(f"Starting capture loop. Key: {key_to_press}, Region: {self.region}")
 
-        with mss.mss() as sct:
-            page_count = 1
-            while not self.stop_event.is_set():
-                if not self.region:
-                    if callback_status: callback_status("エラー: 範囲が設定されていません", 0)
-                    break
+        self.writer = ImageWriterPool(workers=self.encode_workers, max_queue=self.encode_queue_size,
+                                      on_written=self._page_written,
+                                      store=self.page_store if archive is None else None,
+                                      archive=archive, instrument=instr).start()
+        try:
+            with self.frame_source as source:
+                while not self.stop_event.is_set():
+                    if not self.region:
+                        if callback_status: callback_status("エラー: 範囲が設定されていません", 0)
+                        break
 
-                # 1. Capture
-                try:
-                    sct_img = sct.grab(self.region)
-                    # Convert to numpy array for OpenCV
-                    img_np = np.array(sct_img)
-                    img_bgr = cv2.cvtColor(img_np, cv2.COLOR_BGRA2BGR)
-                except Exception as e:
-                    print(f"Capture failed: {e}")
-                    break
-
-                # 2. Compare with previous
-                is_duplicate = False
-                if self.last_image_data is not None:
-                    diff = cv2.absdiff(self.last_image_data, img_bgr)
-                    non_zero_count = np.count_nonzero(diff)
-                    total_pixels = img_bgr.size
-                    similarity = 1 - (non_zero_count / total_pixels)
-                    
-                    if similarity > 0.99: # 99% similar
-                        is_duplicate = True
-                        consecutive_duplicates += 1
-                        print(f"Duplicate detected ({consecutive_duplicates}/{duplicate_limit})")
+                    # 1. Capture (adaptive mode already holds the settled frame)
+                    grab_start = time.perf_counter()
+                    if settled_frame is not None:
+                        sct_img, fingerprint = settled_frame
+                        settled_frame = None
                     else:
+                        try:
+                            sct_img = source.grab(self.region)
+                        except Exception as e:
+                            print(f"Capture failed: {e}")
+                            end_reason = 'error'
+                            break
+                        fingerprint = None
+                    # Zero-copy view of the grab for OpenCV
+                    img_np = np.asarray(sct_img)
+
+                    # 2. Compare with previous
+                    is_duplicate = False
+                    self.stats['frames'] += 1
+                    compare_start = time.perf_counter()
+                    instr.observe('grab', compare_start - grab_start)
+                    if fingerprint is None:
+                        fingerprint = self.comparator.fingerprint(img_np)
+                    fingerprint_end = time.perf_counter()
+                    instr.observe('fingerprint', fingerprint_end - compare_start)
+                    if self.last_image_data is not None:
+                        is_duplicate, similarity = self.comparator.is_duplicate(
+                            img_np, fingerprint, self.last_image_data, self.last_thumbnail)
+                        instr.observe('compare', time.perf_counter() - fingerprint_end)
+
+                        if is_duplicate:
+                            consecutive_duplicates += 1
+                            instr.count('duplicates')
+                            print(f"Duplicate detected ({consecutive_duplicates}/{duplicate_limit})")
+                        else:
+                            consecutive_duplicates = 0
+                    self.stats['compare_time'] += time.perf_counter() - compare_start
+
+                    if verify_resume:
+                        verify_resume = False
+                        if resume_page is not None:
+                            # The spread on screen must end with the last saved page
+                            half = np.asarray(self.splitter.split(img_np, right_to_left)[-1])
+                            is_duplicate, _ = self.comparator.is_duplicate(
+                                half, self.comparator.fingerprint(half),
+                                resume_page, self.comparator.fingerprint(resume_page))
+                            if is_duplicate:
+                                self.last_image_data = img_np
+                                self.last_thumbnail = fingerprint
+                        if not is_duplicate:
+                            if callback_status: callback_status("エラー: 画面が最後に保存したページと一致しません", page_count - 1)
+                            end_reason = 'error'
+                            break
+                        # Matching the restored page is the expected start, not a step towards the end of the book
                         consecutive_duplicates = 0
 
-                # 3. Save or Stop
-                if consecutive_duplicates >= duplicate_limit:
-                    if callback_status: callback_status("完了 (最終ページ到達)", len(self.saved_files))
-                    break
-                
-                if not is_duplicate:
-                    # Retry checking duplicate to avoid fast loading spinners? No, simple logic for now.
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-                    filename = os.path.join(self.output_dir, f"page_{page_count:04d}_{timestamp}.png")
-                    mss.tools.to_png(sct_img.rgb, sct_img.size, output=filename)
-                    self.saved_files.append(filename)
-                    self.last_image_data = img_bgr
-                    if callback_status: callback_status(f"キャプチャ済み: {page_count} ページ", len(self.saved_files))
-                    page_count += 1
+                    # 3. Save or Stop
+                    if consecutive_duplicates >= duplicate_limit:
+                        if callback_status: callback_status("完了 (最終ページ到達)", page_count - 1)
+                        end_reason = 'completed'
+                        break
+                    
+                    if not is_duplicate:
+                        # Retry checking duplicate to avoid fast loading spinners? No, simple logic for now.
+                        if spread:
+                            with instr.stage('split'):
+                                pages = self.splitter.split(sct_img, right_to_left)
+                            instr.count('spreads' if len(pages) == 2 else 'single_pages')
+                        else:
+                            pages = [sct_img]
+                        # Encoding + disk write happen on the writer pool, off the critical path.
+                        # saved_files is filled in page order as files land on disk (_page_written).
+                        submit_start = time.perf_counter()
+                        for page in pages:
+                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+                            filename = os.path.join(self.output_dir, f"page_{page_count:04d}_{timestamp}.png")
+                            self.writer.submit(filename, page)
+                            self.stats['pages'] += 1
+                            instr.count('pages')
+                            page_count += 1
+                        now = time.perf_counter()
+                        instr.observe('submit', now - submit_start)  # > 0 only under backpressure
+                        if last_page_time is not None:
+                            instr.observe('page', now - last_page_time)  # frame-to-frame latency
+                        last_page_time = now
+                        self.last_image_data = img_np
+                        self.last_thumbnail = fingerprint
+                        if callback_status: callback_status(f"キャプチャ済み: {page_count - 1} ページ", page_count - 1)
                 
-                # 4. Turn Page (More robust key press)
-                # Ensure focus? Maybe not every time.
-                print(f"Pressing {key_to_press}...")
-                pyautogui.keyDown(key_to_press)
-                time.sleep(0.1) # Hold key for 100ms
-                pyautogui.keyUp(key_to_press)
+                    # 4. Turn Page (More robust key press)
+                    # Ensure focus? Maybe not every time.
+                    turn_start = time.perf_counter()
+                    self.page_turner.turn(key_to_press)
+                    wait_start = time.perf_counter()
+                    instr.observe('turn', wait_start - turn_start)
                 
-                # 5. Wait
-                time.sleep(float(wait_time))
+                    # 5. Wait
+                    if adaptive:
+                        # Changed and settled, or unchanged for change_timeout (the duplicate signal):
+                        # either way the next iteration checks the last polled frame at full resolution
+                        settled_frame = self._wait_for_settle(source, settle_polls, poll_interval,
+                                                              change_timeout, settle_timeout)
+                    else:
+                        time.sleep(float(wait_time))
+                    wait_end = time.perf_counter()
+                    instr.observe('settle' if adaptive else 'wait', wait_end - wait_start)
+                    # Turn + wait (or settle) time: what wait_time / adaptive trade against page rate
+                    self.stats['turns'] += 1
+                    self.stats['turn_time'] += wait_end - turn_start
             
-            # End of loop
-            print("Capture stopped.")
+                # End of loop
+                print("Capture stopped.")
+        except BaseException:
+            end_reason = 'error'
+            raise
+        finally:
+            # Wait for queued pages so saved_files is complete when we return
+            self.writer.close()
+            if self._splice_pending:
+                # Run ended while an overlap was still possible: only a confirmed one counts
+                self._splice(self.page_store.splice_point(self._book_id, self._splice_pending, final=True))
+            self.stats['encode'] = dict(self.writer.stats, encode_time_avg=self.writer.encode_time_avg)
+            if archive is not None:
+                archive.close()
+            if journal is not None:
+                journal.record_end(end_reason)
+            self._finish_report(end_reason)
+
+    def _finish_report(self, end_reason):
+        instr = self.instrument.finish()
+        instr.settings['end_reason'] = end_reason
+        instr.count('polls', self.stats.get('polls', 0))
+        instr.count('encode_blocked_ms', int(self.writer.stats['blocked_time'] * 1000))
+        instr.count('encode_max_queue_depth', self.writer.stats['max_queue_depth'])
+        print(instr.summary())
+        try:
+            self.report_path = instr.write_report(instr.default_report_path(self.report_dir))
+            print(f"Capture report: {self.report_path}")
+        except OSError as e:
+            print(f"Failed to write capture report: {e}")
+
+    def _page_written(self, filename):
+        # Called by the writer pool in page order; failed writes never get here
+        written_start = time.perf_counter()
+        digest = None
+        if self._archive is not None:
+            digest = page_digest(filename)
+        elif self.page_store:
+            digest = self.page_store.digest_of(filename)
+        elif self._journal is not None:
+            digest = page_digest(filename)
+        if self._book_id:
+            if self._splice_pending is None:
+                self.page_store.append_page(self._book_id, digest)
+            else:
+                self._splice_pending.append(digest)
+                position = self.page_store.splice_point(self._book_id, self._splice_pending)
+                if position is not None:
+                    self._splice(position)
+        self.saved_files.append(filename)
+        try:
+            self.stats['bytes_written'] += page_size(filename)
+        except OSError:
+            pass
+        if self._journal is not None:
+            self._journal.record_page(filename, digest)
+        callback_start = time.perf_counter()
+        self.instrument.observe('bookkeeping', callback_start - written_start)  # book index + journal
+        if self._on_page_saved:
+            self._on_page_saved(filename)
+            self.instrument.observe('on_page_saved', time.perf_counter() - callback_start)
+
+    def _splice(self, position):
+        """Writes the held-back first pages into the book index after its first `position` pages."""
+        kept = len(self.page_store.book_hashes(self._book_id))
+        self.page_store.splice_book(self._book_id, position, self._splice_pending)
+        if position < kept:
+            print(f"Run repeats the end of book '{self._book_id}', continuing after page {position}")
+        self._splice_pending = None
+
+    def _wait_for_settle(self, source, settle_polls, poll_interval, change_timeout, settle_timeout):
+        """
+        Polls cheap thumbnails after a page turn until the frame differs from
+        the last saved page and has been stable for settle_polls consecutive
+        polls, the page changed but is still drawing at settle_timeout, or
+        nothing changed within change_timeout. Returns (frame, fingerprint)
+        of the last poll, or None if stopped before the first one.
+        """
+        start = time.monotonic()
+        deadline = start + settle_timeout
+        changed = self.last_thumbnail is None
+        last = None
+        stable = 0
+        while not self.stop_event.is_set() and time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            frame = source.grab(self.region)
+            thumb = self.comparator.fingerprint(frame)
+            self.stats['polls'] += 1
+            previous, last = last, (frame, thumb)
+            if not changed:
+                changed = self.comparator.differs(thumb, self.last_thumbnail)
+                if not changed and time.monotonic() - start >= change_timeout:
+                    break
+            if changed:
+                if previous is not None and not self.comparator.differs(thumb, previous[1]):
+                    stable += 1
+                    if stable >= settle_polls:
+                        break
+                else:
+                    stable = 0
+        return last
+
+    def progress(self):
+        """Live numbers for a progress display; safe to call from another thread while capturing."""
+        stats = self.stats
+        turns = stats.get('turns', 0)
+        writer = self.writer
+        return {
+            'pages': stats.get('pages', 0),
+            'turn_latency': stats.get('turn_time', 0.0) / turns if turns else 0.0,
+            'encode_backlog': writer.queue_depth if writer else 0,
+            'bytes_written': stats.get('bytes_written', 0),
+        }
 
     def stop(self):
+        # The capture thread flushes the PNG writer pool before start_capture returns
         self.stop_event.set()
@@ -0,0 +1,250 @@
+"""
+Unattended capture of several books in a row.
+
+Jobs live in a JSON file (capture_queue.json) so a queue can be prepared in
+the GUI or with `cli.py queue add`, run overnight, and picked up again after
+an interruption: finished books are skipped, a book that was cut off is
+captured again from the start (pages already in the page store are reused,
+not re-encoded).
+
+For each job the queue runs the job's open actions (e.g. switch to the
+Kindle library and open the next title), captures the book, and hands its
+PDF / OCR post-processing to a background worker while the next book is
+already being captured.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from filenames import sanitize_filename
+from page_archive import PageArchive, archive_path
+from session_journal import journal_for_book
+
+QUEUE_FILE = "capture_queue.json"
+
+JOB_DEFAULTS = {
+    'author': "",
+    'direction': "左キー (縦書き本)",
+    'wait_ms': 500,
+    'adaptive': False,
+    'spread': False,
+    'archive': False,
+    'open_actions': [],    # see ActionRunner
+    'open_wait': 3.0,      # seconds for the book to open after the actions
+    'pdf': True,
+    'recompress': False,
+    'auto_crop': False,
+    'ocr': None,           # None, 'drive' or 'tesseract'
+    'status': 'pending',   # pending -> capturing -> processing -> done | failed
+}
+
+
+def parse_action(action):
+    """Splits 'verb argument' and checks it. Returns (verb, argument); raises ValueError."""
+    verb, _, arg = action.strip().partition(" ")
+    arg = arg.strip()
+    if verb in ('press', 'type') and arg:
+        return verb, arg
+    if verb == 'hotkey' and arg:
+        return verb, [k.strip() for k in arg.split("+")]
+    if verb == 'click':
+        try:
+            x, y = (int(v) for v in arg.split(","))
+        except ValueError:
+            raise ValueError(f"click needs x,y: {action!r}")
+        return verb, (x, y)
+    if verb == 'wait':
+        try:
+            return verb, float(arg)
+        except ValueError:
+            raise ValueError(f"wait needs seconds: {action!r}")
+    raise ValueError(f"Unknown action {action!r} (press KEY / hotkey A+B / click X,Y / wait SECONDS / type TEXT)")
+
+
+def make_job(title, region, **settings):
+    """A queue job with defaults filled in. region: (x, y, width, height)."""
+    unknown = set(settings) - set(JOB_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown job settings: {', '.join(sorted(unknown))}")
+    if not title:
+        raise ValueError("A job needs a title")
+    if len(region) != 4:
+        raise ValueError(f"region must be x, y, width, height: {region!r}")
+    job = dict(JOB_DEFAULTS, title=title, region=[int(v) for v in region])
+    job.update(settings)
+    job['open_actions'] = list(job['open_actions'])
+    for action in job['open_actions']:
+        parse_action(action)
+    return job
+
+
+def load_queue(path=QUEUE_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [dict(JOB_DEFAULTS, **job) for job in json.load(f)]
+
+
+def save_queue(jobs, path=QUEUE_FILE):
+    # Write then rename, so an interrupted save never loses the queue
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(jobs, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ActionRunner:
+    """
+    Runs a job's open actions with pyautogui, one string per step:
+
+        press home          key press (any pyautogui key name)
+        hotkey ctrl+shift+l key combination
+        click 640,400       left click at screen coordinates
+        wait 2.5            pause in seconds
+        type 本のタイトル    text entry (e.g. into the library search box)
+
+    `type` pastes through the clipboard: pyautogui.write only sends keys in
+    its keyboard map and silently drops anything else, Japanese included,
+    and keys typed with the IME on would come out as kana anyway.
+    """
+    def run(self, actions):
+        # Imported lazily: pyautogui needs a display as soon as it is imported
+        import pyautogui
+        import pyperclip
+        for action in actions:
+            verb, arg = parse_action(action)
+            print(f"Open action: {action}")
+            if verb == 'press':
+                pyautogui.press(arg)
+            elif verb == 'hotkey':
+                pyautogui.hotkey(*arg)
+            elif verb == 'click':
+                pyautogui.click(*arg)
+            elif verb == 'wait':
+                time.sleep(arg)
+            elif verb == 'type':
+                pyperclip.copy(arg)
+                pyautogui.hotkey('command' if sys.platform == 'darwin' else 'ctrl', 'v')
+            time.sleep(0.2)
+
+
+class CaptureQueue:
+    """
+    Runs the pending jobs of a queue file one after another.
+
+    engine: CaptureEngine used for every book (its frame source and page
+        turner, so a replay source works for headless runs too).
+    actions: ActionRunner (or anything with run(actions)).
+    on_status: function(msg, count) for progress, like start_capture's.
+    Post-processing runs on one background thread, so PDF building and OCR
+    of a book overlap the capture of the next one without competing with
+    each other.
+    """
+    def __init__(self, engine, path=QUEUE_FILE, images_dir="captured_images", pdf_dir="output_pdfs",
+                 actions=None, on_status=None):
+        self.engine = engine
+        self.path = path
+        self.images_dir = images_dir
+        self.pdf_dir = pdf_dir
+        self.actions = actions or ActionRunner()
+        self.on_status = on_status or (lambda msg, count: print(msg))
+        self.jobs = load_queue(path)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def pending(self):
+        return [job for job in self.jobs if job['status'] not in ('done', 'failed')]
+
+    def stop(self):
+        """Stops after the current book (its post-processing still finishes)."""
+        self._stop.set()
+        self.engine.stop()
+
+    def _set(self, job, **changes):
+        with self._lock:
+            job.update(changes)
+            save_queue(self.jobs, self.path)
+
+    def run(self):
+        """Captures every pending job and waits for the post-processing. Returns the jobs."""
+        self._stop.clear()
+        todo = self.pending()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="postprocess") as post:
+            for n, job in enumerate(todo, 1):
+                if self._stop.is_set():
+                    break
+                prefix = f"[{n}/{len(todo)}] {job['title']}"
+                pages = self._capture(job, prefix)
+                if pages:
+                    self._set(job, status='processing', pages=len(pages))
+                    post.submit(self._postprocess, job, pages, prefix)
+                elif job['status'] == 'capturing':
+                    # Completed without a page; a stopped book stays pending so the next run redoes it
+                    self._set(job, status='failed', error="no pages captured")
+        done = sum(job['status'] == 'done' for job in todo)
+        self.on_status(f"キュー完了: {done}/{len(todo)} 冊", done)
+        return todo
+
+    def _capture(self, job, prefix):
+        self._set(job, status='capturing', started=time.time())
+        self.on_status(f"{prefix}: 本を開いています...", 0)
+        archive = None
+        try:
+            self.actions.run(job['open_actions'])
+            time.sleep(job['open_wait'])
+            self.engine.set_region(*job['region'])
+            if job['archive']:
+                archive = PageArchive(archive_path(self.images_dir, job['title']), 'w')
+            self.engine.start_capture(
+                direction=job['direction'],
+                wait_time=job['wait_ms'] / 1000.0,
+                callback_status=lambda msg, count: self.on_status(f"{prefix}: {msg}", count),
+                adaptive=job['adaptive'],
+                book_id=job['title'],
+                journal=journal_for_book(self.images_dir, job['title']),
+                spread=job['spread'],
+                archive=archive,
+            )
+        except Exception as e:
+            # e.g. pyautogui failsafe: give up on this book, keep going with the next
+            print(f"Capture of {job['title']} failed: {e}")
+            self._set(job, status='failed', error=str(e))
+            return []
+        end_reason = self.engine.instrument.settings.get('end_reason') if self.engine.instrument else None
+        if end_reason != 'completed':
+            # Stopped by the user or a grab error: the book is incomplete
+            self._set(job, status='failed' if end_reason == 'error' else 'pending', error=end_reason)
+            if end_reason == 'stopped':
+                self._stop.set()
+            return []
+        return list(self.engine.saved_files)
+
+    def _postprocess(self, job, pages, prefix):
+        try:
+            outputs = []
+            if job['pdf']:
+                from pdf_writer import PDFGenerator
+                outputs += PDFGenerator(self.pdf_dir).generate(pages, job['title'], job['author'],
+                                                               recompress=job['recompress'],
+                                                               auto_crop=job['auto_crop'])
+            if job['ocr']:
+                outputs.append(self._ocr(job))
+            self._set(job, status='done', outputs=outputs, finished=time.time())
+            self.on_status(f"{prefix}: 後処理完了 ({len(pages)} ページ)", len(pages))
+        except Exception as e:
+            print(f"Post-processing of {job['title']} failed: {e}")
+            self._set(job, status='failed', error=str(e))
+
+    def _ocr(self, job):
+        import ocr_processor
+        args = ocr_processor.add_arguments(argparse.ArgumentParser()).parse_args([])
+        base = os.path.join(self.pdf_dir, sanitize_filename(job['title']))
+        args.images, args.book, args.backend = self.images_dir, job['title'], job['ocr']
+        args.output, args.report = base + ".md", base + "_ocr_report.json"
+        if not ocr_processor.run(args):
+            raise RuntimeError("OCR failed")
+        return args.output
@@ -0,0 +1,305 @@
+"""
+Command-line entry point (no GUI).
+
+    python src/cli.py capture --title 本 --region 100,80,1200,1600 [--adaptive]
+    python src/cli.py capture --title 本 --resume
+    python src/cli.py pdf --title 本 [--recompress] [--auto-crop]
+    python src/cli.py ocr [--backend tesseract] [--book 本]
+    python src/cli.py all --title 本 --region 100,80,1200,1600
+    python src/cli.py queue add --title 本 --region 100,80,1200,1600 --open "press home"
+    python src/cli.py queue run
+
+Heavy modules (OpenCV, mss, pyautogui, Google API clients) are imported
+only by the subcommand (and option) that needs them, so `pdf` (without
+--recompress / --auto-crop) and `ocr` start quickly on servers and in
+scheduled jobs.
+"""
+import argparse
+import os
+import sys
+import time
+
+CAPTURE_DIR = "captured_images"
+PDF_DIR = "output_pdfs"
+
+# Same labels as the GUI menu; CaptureEngine and the session journal use these strings
+DIRECTIONS = {
+    'left': "左キー (縦書き本)",
+    'right': "右キー (横書き本)",
+    'pagedown': "PageDown (汎用)",
+}
+
+
+def _add_book_args(parser):
+    parser.add_argument('--title', required=True, help="本のタイトル")
+    parser.add_argument('--author', default="", help="著者 (任意)")
+    parser.add_argument('--images', default=CAPTURE_DIR, help="画像フォルダ (既定: %(default)s)")
+
+
+def _add_capture_args(parser):
+    parser.add_argument('--region', help="キャプチャ範囲 x,y,幅,高さ (--resume では記録から復元)")
+    parser.add_argument('--direction', choices=sorted(DIRECTIONS), default='left',
+                        help="ページめくりのキー (left: 縦書き本, right: 横書き本)")
+    parser.add_argument('--wait', type=int, default=500, help="ページめくり後の待機時間 (ミリ秒)")
+    parser.add_argument('--adaptive', action='store_true', help="ページ描画を自動検知 (待機時間は変化がない場合の上限)")
+    parser.add_argument('--spread', action='store_true', help="見開き表示で撮影 (2ページに自動分割)")
+    parser.add_argument('--countdown', type=int, default=5, help="開始までの秒数 (Kindleをアクティブにする時間)")
+    parser.add_argument('--archive', action='store_true',
+                        help="ページを1つのアーカイブファイルに保存 (<画像フォルダ>/archives/<タイトル>.pages)")
+    parser.add_argument('--stream-pdf', action='store_true', help="キャプチャ中にPDFを逐次作成")
+    parser.add_argument('--resume', action='store_true', help="中断したキャプチャを再開")
+    parser.add_argument('--profile', action='store_true', help="cProfile でプロファイルも取る")
+
+
+def _add_pdf_args(parser):
+    parser.add_argument('--output-dir', default=PDF_DIR, help="PDFの出力先 (既定: %(default)s)")
+    parser.add_argument('--balance', action='store_true', help="分割するPDFのサイズをそろえる")
+    parser.add_argument('--recompress', action='store_true', help="PDFを軽量化 (白黒/グレー/JPEGに自動変換)")
+    parser.add_argument('--auto-crop', action='store_true', help="余白を自動トリミング")
+
+
+def _parse_region(text):
+    try:
+        x, y, w, h = (int(v) for v in text.split(","))
+    except ValueError:
+        raise SystemExit(f"エラー: --region は x,y,幅,高さ の形式で指定してください: {text}")
+    return x, y, w, h
+
+
+def cmd_capture(args):
+    from session_journal import journal_for_book
+
+    journal = journal_for_book(args.images, args.title)
+    direction, wait_ms, adaptive, spread = DIRECTIONS[args.direction], args.wait, args.adaptive, args.spread
+    use_archive = args.archive
+    if args.resume:
+        if not journal.resumable or not journal.last_page():
+            print("再開できるキャプチャがありません。")
+            return 1
+        # Restore the settings of the interrupted session
+        region = journal.header['region']
+        region = (region['left'], region['top'], region['width'], region['height'])
+        direction = journal.header['direction']
+        wait_ms = int(journal.header['wait_time'] * 1000)
+        adaptive = journal.header.get('adaptive', False)
+        spread = journal.header.get('spread', False)
+        use_archive = journal.header.get('archive', False)
+    elif args.region:
+        region = _parse_region(args.region)
+    else:
+        print("エラー: --region を指定してください。")
+        return 1
+
+    from capture_engine import CaptureEngine
+    from page_archive import PageArchive, archive_path
+    from page_store import PageStore
+
+    store = PageStore(args.images)
+    engine = CaptureEngine(args.images, page_store=store)
+    engine.set_region(*region)
+    archive = None
+    if use_archive:
+        archive = PageArchive(archive_path(args.images, args.title), 'a' if args.resume else 'w')
+
+    pdf_stream = None
+    # A streamed PDF would only contain the pages of this run, so not when resuming
+    if getattr(args, 'stream_pdf', False) and not args.resume:
+        from pdf_writer import PDFGenerator
+        pdf_stream = PDFGenerator(args.output_dir).open_stream(args.title, args.author,
+                                                               recompress=args.recompress)
+
+    for i in range(args.countdown, 0, -1):
+        print(f"{i} 秒後に開始します... Kindleウィンドウをアクティブにしてください！")
+        time.sleep(1)
+
+    try:
+        engine.start_capture(
+            direction=direction,
+            wait_time=wait_ms / 1000.0,
+            callback_status=lambda msg, count: print(msg),
+            adaptive=adaptive,
+            on_page_saved=pdf_stream.add_page if pdf_stream else None,
+            book_id=args.title,
+            journal=journal,
+            resume=args.resume,
+            profile=args.profile,
+            spread=spread,
+            archive=archive,
+        )
+    except KeyboardInterrupt:
+        print("中断しました。--resume で続きから再開できます。")
+    except Exception as e:
+        # e.g. pyautogui failsafe: the journal keeps the pages so far for --resume
+        print(f"Capture aborted: {e}")
+    finally:
+        if pdf_stream:
+            pdf_stream.close()
+
+    print(f"{len(engine.saved_files)} ページ保存されました。")
+    return 0 if engine.saved_files else 1
+
+
+def cmd_pdf(args):
+    if not os.path.isdir(args.images):
+        print(f"エラー: 画像フォルダ {args.images} が見つかりません。")
+        return 1
+    from books import book_pages, loose_pages
+
+    pages = book_pages(args.images, args.title) or loose_pages(args.images)
+    if not pages:
+        print("処理対象の画像がありません。")
+        return 1
+
+    from pdf_writer import PDFGenerator
+
+    generator = PDFGenerator(args.output_dir)
+    pdfs = generator.generate(pages, args.title, args.author, balance=args.balance,
+                              recompress=args.recompress, auto_crop=args.auto_crop)
+    print(f"PDF生成完了: {len(pdfs)} 件作成しました ({args.output_dir}/)")
+    return 0 if pdfs else 1
+
+
+def cmd_ocr(args):
+    import ocr_processor
+
+    return 0 if ocr_processor.run(args) else 1
+
+
+def cmd_all(args):
+    import ocr_processor
+
+    status = cmd_capture(args)
+    if status:
+        return status
+    if not args.stream_pdf:
+        status = cmd_pdf(args)
+        if status:
+            return status
+    if args.skip_ocr:
+        return 0
+    ocr_args = ocr_processor.add_arguments(argparse.ArgumentParser()).parse_args([])
+    ocr_args.images = args.images
+    ocr_args.book = args.title
+    ocr_args.backend = args.ocr_backend
+    ocr_args.auto_crop = args.auto_crop
+    return cmd_ocr(ocr_args)
+
+
+def cmd_queue_add(args):
+    from capture_queue import load_queue, make_job, save_queue
+
+    try:
+        job = make_job(args.title, _parse_region(args.region), author=args.author,
+                       direction=DIRECTIONS[args.direction], wait_ms=args.wait, adaptive=args.adaptive,
+                       spread=args.spread, archive=args.archive, open_actions=args.open,
+                       open_wait=args.open_wait, recompress=args.recompress, auto_crop=args.auto_crop,
+                       pdf=not args.no_pdf, ocr=args.ocr_backend)
+    except ValueError as e:
+        print(f"エラー: {e}")
+        return 1
+    jobs = load_queue(args.queue)
+    jobs.append(job)
+    save_queue(jobs, args.queue)
+    print(f"キューに追加しました: {args.title} ({len(jobs)} 冊目)")
+    return 0
+
+
+def cmd_queue_list(args):
+    from capture_queue import load_queue
+
+    for n, job in enumerate(load_queue(args.queue), 1):
+        detail = job.get('error') or ", ".join(job.get('outputs', []))
+        print(f"{n:3d}. [{job['status']}] {job['title']} {detail}")
+    return 0
+
+
+def cmd_queue_run(args):
+    from capture_engine import CaptureEngine
+    from capture_queue import CaptureQueue
+    from page_store import PageStore
+
+    engine = CaptureEngine(args.images, page_store=PageStore(args.images))
+    queue = CaptureQueue(engine, args.queue, images_dir=args.images, pdf_dir=args.output_dir)
+    if not queue.pending():
+        print("キューに未処理の本がありません。")
+        return 1
+    for i in range(args.countdown, 0, -1):
+        print(f"{i} 秒後に開始します... Kindleウィンドウをアクティブにしてください！")
+        time.sleep(1)
+    try:
+        jobs = queue.run()
+    except KeyboardInterrupt:
+        print("中断しました。queue run で残りの本から再開できます。")
+        return 1
+    return 0 if all(job['status'] == 'done' for job in jobs) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Kindleキャプチャ to NotebookLM (コマンドライン版)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('capture', help="画面をキャプチャする")
+    _add_book_args(p)
+    _add_capture_args(p)
+    p.add_argument('--output-dir', default=PDF_DIR, help="--stream-pdf のPDFの出力先")
+    p.add_argument('--recompress', action='store_true', help="--stream-pdf のPDFを軽量化")
+    p.set_defaults(func=cmd_capture)
+
+    p = sub.add_parser('pdf', help="保存済みの画像からPDFを作る")
+    _add_book_args(p)
+    _add_pdf_args(p)
+    p.set_defaults(func=cmd_pdf)
+
+    import ocr_processor  # light: the Google clients are imported when first used
+    p = sub.add_parser('ocr', help="保存済みの画像をOCRでテキスト化する")
+    ocr_processor.add_arguments(p)
+    p.set_defaults(func=cmd_ocr)
+
+    p = sub.add_parser('all', help="キャプチャ → PDF → OCR を続けて実行")
+    _add_book_args(p)
+    _add_capture_args(p)
+    _add_pdf_args(p)
+    p.add_argument('--ocr-backend', choices=('drive', 'tesseract'), default=ocr_processor.OCR_ENGINE,
+                   help="OCRの方法")
+    p.add_argument('--skip-ocr', action='store_true', help="OCRを行わない")
+    p.set_defaults(func=cmd_all)
+
+    p = sub.add_parser('queue', help="複数の本を続けて無人でキャプチャする")
+    queue_sub = p.add_subparsers(dest='queue_command', required=True)
+    q = queue_sub.add_parser('add', help="本をキューに追加")
+    q.add_argument('--title', required=True, help="本のタイトル")
+    q.add_argument('--author', default="", help="著者 (任意)")
+    q.add_argument('--region', required=True, help="キャプチャ範囲 x,y,幅,高さ")
+    q.add_argument('--direction', choices=sorted(DIRECTIONS), default='left',
+                   help="ページめくりのキー (left: 縦書き本, right: 横書き本)")
+    q.add_argument('--wait', type=int, default=500, help="ページめくり後の待機時間 (ミリ秒)")
+    q.add_argument('--adaptive', action='store_true', help="ページ描画を自動検知 (待機時間は変化がない場合の上限)")
+    q.add_argument('--spread', action='store_true', help="見開き表示で撮影 (2ページに自動分割)")
+    q.add_argument('--archive', action='store_true', help="ページを1つのアーカイブファイルに保存")
+    q.add_argument('--recompress', action='store_true', help="PDFを軽量化 (白黒/グレー/JPEGに自動変換)")
+    q.add_argument('--auto-crop', action='store_true', help="余白を自動トリミング")
+    q.add_argument('--open', action='append', default=[], metavar="ACTION",
+                   help="本を開く操作 (繰り返し指定可): 'press KEY', 'hotkey A+B', 'click X,Y', 'wait 秒', 'type 文字'")
+    q.add_argument('--open-wait', type=float, default=3.0, help="本を開いてからキャプチャを始めるまでの秒数")
+    q.add_argument('--no-pdf', action='store_true', help="PDFを作らない")
+    q.add_argument('--ocr-backend', choices=('drive', 'tesseract'), help="キャプチャ後にOCRも行う")
+    q.set_defaults(func=cmd_queue_add)
+    q = queue_sub.add_parser('list', help="キューの内容と状態を表示")
+    q.set_defaults(func=cmd_queue_list)
+    q = queue_sub.add_parser('run', help="未処理の本を順にキャプチャ (PDF/OCRは次の本の撮影中に実行)")
+    q.add_argument('--images', default=CAPTURE_DIR, help="画像フォルダ (既定: %(default)s)")
+    q.add_argument('--output-dir', default=PDF_DIR, help="PDFの出力先 (既定: %(default)s)")
+    q.add_argument('--countdown', type=int, default=5, help="開始までの秒数")
+    q.set_defaults(func=cmd_queue_run)
+    for q in queue_sub.choices.values():
+        q.add_argument('--queue', default="capture_queue.json", help="キューファイル (既定: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import itertools
+import random
+import threading
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+class _Request:
+    def __init__(self, service, fn):
+        self._service = service
+        self._fn = fn
+
+    def execute(self):
+        return self._service._call(self._fn)
+
+
+class _Batch:
+    """Stand-in for BatchHttpRequest: every added request goes out in one round trip."""
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request_id or str(len(self._requests)), request, callback or self._callback))
+
+    def execute(self):
+        def run():
+            for request_id, request, callback in self._requests:
+                try:
+                    response, exception = request._fn(), None
+                except HttpError as e:
+                    response, exception = None, e
+                if callback:
+                    callback(request_id, response, exception)
+        self._service._call(run)
+
+
+class _Files:
+    def __init__(self, service):
+        self._service = service
+
+    def create(self, body=None, media_body=None, fields=None):
+        path = getattr(media_body, '_filename', None)
+        return _Request(self._service, lambda: self._service._create(body, path))
+
+    def export(self, fileId=None, mimeType=None):
+        return _Request(self._service, lambda: self._service._export(fileId))
+
+    def delete(self, fileId=None):
+        return _Request(self._service, lambda: self._service._delete(fileId))
+
+
+class _Documents:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, documentId=None, fields=None):
+        return _Request(self._service, lambda: self._service._document(documentId))
+
+
+class StubDriveService:
+    """
+    In-process stand-in for the Drive v3 endpoints ocr_processor uses
+    (files().create / export / delete and batch requests) and the Docs v1
+    documents().get, for testing the OCR pipeline offline. One instance can
+    serve as both services. stats['calls'] counts HTTP round trips.
+
+    "OCR" returns the uploaded file's name, so the output order can be checked.
+    latency: seconds each call takes. error_rate: fraction of calls failing
+    with one of error_statuses: an HTTP status, or an exception class raised
+    as is (e.g. ConnectionResetError or TimeoutError for a dropped connection). Calls beyond max_rate per second (shared by
+    every instance) fail with 429, like the real per-user quota.
+    """
+    _docs = {}
+    _ids = itertools.count(1)
+    _lock = threading.Lock()
+    _recent = []
+    stats = {'calls': 0, 'errors': 0, 'rate_limited': 0}
+
+    def __init__(self, latency=0.05, error_rate=0.0, error_statuses=(429, 503), max_rate=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.max_rate = max_rate
+        self._random = random.Random(seed)
+
+    def files(self):
+        return _Files(self)
+
+    def documents(self):
+        return _Documents(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+    def _call(self, fn):
+        now = time.monotonic()
+        with self._lock:
+            self.stats['calls'] += 1
+            status = None
+            if self.max_rate:
+                StubDriveService._recent = [t for t in self._recent if now - t < 1.0]
+                if len(self._recent) >= self.max_rate:
+                    status = 429
+                    self.stats['rate_limited'] += 1
+                else:
+                    self._recent.append(now)
+            if status is None and self._random.random() < self.error_rate:
+                status = self._random.choice(self.error_statuses)
+            if status is not None:
+                self.stats['errors'] += 1
+        time.sleep(self.latency)
+        if isinstance(status, type):
+            raise status("stub transport error")
+        if status is not None:
+            raise HttpError(httplib2.Response({'status': status}), b'{"error": "stub"}')
+        return fn()
+
+    def _create(self, body, path):
+        with self._lock:
+            doc_id = f"stub-{next(self._ids)}"
+            self._docs[doc_id] = f"{body.get('name', path)}\nPage 1\n"
+        return {'id': doc_id}
+
+    def _export(self, file_id):
+        with self._lock:
+            if file_id not in self._docs:
+                raise HttpError(httplib2.Response({'status': 404}), b'{"error": "not found"}')
+            return self._docs[file_id].encode('utf-8')
+
+    def _document(self, file_id):
+        with self._lock:
+            if file_id not in self._docs:
+                raise HttpError(httplib2.Response({'status': 404}), b'{"error": "not found"}')
+            text = self._docs[file_id]
+        # Like a converted image: the picture first, then one paragraph per line
+        content = [{'paragraph': {'paragraphStyle': {'namedStyleType': 'NORMAL_TEXT'},
+                                  'elements': [{'inlineObjectElement': {'inlineObjectId': 'kix.stub'}}]}}]
+        for line in text.split("\n"):
+            content.append({'paragraph': {'paragraphStyle': {'namedStyleType': 'NORMAL_TEXT'},
+                                          'elements': [{'textRun': {'content': line + "\n"}}]}})
+        return {'body': {'content': content}}
+
+    def _delete(self, file_id):
+        with self._lock:
+            self._docs.pop(file_id, None)
+        return ""
@@ -0,0 +1,8 @@
+def sanitize_filename(name):
+    """
+    File name stem for a book title (letters and digits of any script,
+    spaces, '-' and '_'). Every file named after a book goes through this:
+    PDFs, the page store index, the page archive and the session journal,
+    so they always agree on a title's name.
+    """
+    return "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).strip() or "untitled"
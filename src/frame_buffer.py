@@ -0,0 +1,77 @@
+import threading
+
+import cv2
+import numpy as np
+
+PNG_COMPRESSION = 6  # zlib level, same as mss.tools.to_png
+
+
+class ScratchBuffers:
+    """
+    Reusable destination arrays for full-frame conversions (BGRA -> BGR for
+    the PNG encoder, grayscale for full-resolution comparisons, diffs).
+
+    Each thread keeps one flat byte buffer per name. A request returns a
+    contiguous array over the start of it, so frames of any size up to the
+    largest seen so far (e.g. the two halves of a spread, whose widths move
+    with the detected gutter) reuse the same memory; the buffer only grows
+    when a larger frame arrives. `stats` counts the allocations; it stays at
+    a handful per thread however many pages are processed.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {'allocations': 0, 'allocated_bytes': 0}
+
+    def get(self, name, shape, dtype=np.uint8):
+        buffers = self._local.__dict__.setdefault('buffers', {})
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        buf = buffers.get(name)
+        if buf is None or buf.size < nbytes:
+            # Headroom, so sizes creeping up a little (a gutter a few columns off) don't regrow it
+            buf = buffers[name] = np.empty(nbytes + nbytes // 4, np.uint8)
+            with self._lock:
+                self.stats['allocations'] += 1
+                self.stats['allocated_bytes'] += buf.size
+        return buf[:nbytes].view(dtype).reshape(shape)
+
+
+SCRATCH = ScratchBuffers()
+
+
+def as_bgr(frame, name='bgr', scratch=SCRATCH):
+    """BGR view of a frame, converted into a reused buffer if it has an alpha channel."""
+    img = np.asarray(frame)
+    if img.ndim == 3 and img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_BGRA2BGR, dst=scratch.get(name, img.shape[:2] + (3,)))
+    return img
+
+
+def as_gray(frame, name='gray', scratch=SCRATCH):
+    """Grayscale version of a frame, converted into a reused buffer."""
+    img = np.asarray(frame)
+    if img.ndim == 2:
+        return img
+    code = cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+    return cv2.cvtColor(img, code, dst=scratch.get(name, img.shape[:2]))
+
+
+def encode_png(frame, compression=PNG_COMPRESSION):
+    """
+    Encodes a frame (BGRA/BGR array, mss ScreenShot or Frame, also a strided
+    view such as half of a spread) straight from its pixels to an 8-bit RGB
+    PNG. Returns the encoded bytes as a numpy array.
+    """
+    ok, data = cv2.imencode(".png", as_bgr(frame), [cv2.IMWRITE_PNG_COMPRESSION, compression])
+    if not ok:
+        raise OSError("PNG encoding failed")
+    return data
+
+
+def write_png(frame, path, compression=PNG_COMPRESSION):
+    """encode_png to a file. Returns the file size."""
+    data = encode_png(frame, compression)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
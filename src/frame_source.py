@@ -0,0 +1,211 @@
+import abc
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import mss
+import numpy as np
+
+Size = namedtuple("Size", ["width", "height"])
+
+
+class Frame:
+    """
+    Minimal stand-in for mss.screenshot.ScreenShot backed by a BGRA array.
+    Supports np.array(frame), frame.rgb and frame.size like the real thing.
+    """
+    def __init__(self, bgra):
+        self.bgra = bgra
+        self.size = Size(bgra.shape[1], bgra.shape[0])
+
+    @property
+    def rgb(self):
+        return np.ascontiguousarray(self.bgra[:, :, 2::-1]).tobytes()
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is not None and dtype != self.bgra.dtype:
+            return self.bgra.astype(dtype)
+        return self.bgra.copy() if copy else self.bgra
+
+
+class MssFrameSource:
+    """Grabs the live screen with mss (default source)."""
+    def __init__(self):
+        self._sct = None
+
+    def __enter__(self):
+        self._sct = mss.mss()
+        return self
+
+    def __exit__(self, *exc):
+        self._sct.close()
+        self._sct = None
+
+    def grab(self, region):
+        return self._sct.grab(region)
+
+
+class PyAutoGuiPageTurner:
+    """Turns pages by sending key presses to the focused window (default turner)."""
+    def __init__(self, hold_time=0.1):
+        self.hold_time = hold_time
+
+    def focus(self, region):
+        # Imported lazily: pyautogui needs a display as soon as it is imported
+        import pyautogui
+        # Click the center of the region once at the start to focus window
+        center_x = region['left'] + region['width'] // 2
+        center_y = region['top'] + region['height'] // 2
+        print(f"Clicking at {center_x}, {center_y} to focus window...")
+        pyautogui.click(center_x, center_y)
+        time.sleep(0.5)
+
+    def turn(self, key):
+        import pyautogui
+        print(f"Pressing {key}...")
+        pyautogui.keyDown(key)
+        time.sleep(self.hold_time)  # Hold key so Kindle registers the press
+        pyautogui.keyUp(key)
+
+
+class ReplaySource(abc.ABC):
+    """
+    Headless frame source + page turner that serves pre-rendered pages.
+    Each turn() advances to the next page; once the last page is reached the
+    same frame is served forever, which is what the end of a book looks like.
+
+    render_latency: seconds a page takes to "draw" after a turn. During that
+    time grabs return a partially drawn frame (top rows new, rest old page).
+    """
+    def __init__(self, render_latency=0.0):
+        self.render_latency = render_latency
+        self.index = 0
+        self.turns = 0
+        self._previous = None
+        self._turned_at = None
+
+    @abc.abstractmethod
+    def __len__(self):
+        """Number of pages in the book."""
+
+    @abc.abstractmethod
+    def page(self, index):
+        """Returns page `index` as a BGRA uint8 array."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def focus(self, region):
+        pass
+
+    def turn(self, key):
+        self.turns += 1
+        if self.index >= len(self) - 1:
+            return
+        self._previous = self.page(self.index)
+        self.index += 1
+        self._turned_at = time.monotonic()
+
+    def grab(self, region):
+        current = self.page(self.index)
+        if self._turned_at is not None and self.render_latency > 0:
+            progress = (time.monotonic() - self._turned_at) / self.render_latency
+            if progress < 1.0:
+                drawn = int(current.shape[0] * max(progress, 0.0))
+                partial = self._previous.copy()
+                partial[:drawn] = current[:drawn]
+                return Frame(partial)
+        return Frame(current)
+
+
+class DirectoryReplaySource(ReplaySource):
+    """Replays recorded page images (PNG/JPEG) from a directory in name order."""
+    def __init__(self, frames_dir, render_latency=0.0):
+        super().__init__(render_latency)
+        exts = ('.png', '.jpg', '.jpeg')
+        self.paths = [os.path.join(frames_dir, f) for f in sorted(os.listdir(frames_dir))
+                      if f.lower().endswith(exts)]
+        if not self.paths:
+            raise ValueError(f"No frames found in {frames_dir}")
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def page(self, index):
+        img = self._cache.get(index)
+        if img is None:
+            img = cv2.cvtColor(cv2.imread(self.paths[index], cv2.IMREAD_COLOR), cv2.COLOR_BGR2BGRA)
+            # Keep only the pages around the cursor in memory
+            self._cache = {k: v for k, v in self._cache.items() if abs(k - index) <= 1}
+            self._cache[index] = img
+        return img
+
+
+class SyntheticBookSource(ReplaySource):
+    """
+    Generates a book of text-like pages on the fly.
+    duplicate_rate: probability that a page is identical to the previous one
+    (e.g. consecutive blank pages), which the engine must skip without
+    mistaking it for the end of the book.
+    spread: every screen shows two pages side by side (left page first),
+    like Kindle's two-page view; `pages` then counts screens.
+    """
+    def __init__(self, pages=100, width=800, height=1200, render_latency=0.0,
+                 duplicate_rate=0.0, seed=0, spread=False):
+        super().__init__(render_latency)
+        self.pages = pages
+        self.width = width
+        self.height = height
+        rng = np.random.default_rng(seed)
+        # Page content ids: a duplicate page reuses the id of the previous page
+        self._content = [0]
+        for _ in range(1, pages):
+            dup = rng.random() < duplicate_rate
+            self._content.append(self._content[-1] if dup else self._content[-1] + 1)
+        self.seed = seed
+        self.spread = spread
+        self._cache = {}
+
+    @property
+    def distinct_pages(self):
+        """Number of pages the engine should save (consecutive duplicates collapse)."""
+        return (self._content[-1] + 1) * (2 if self.spread else 1)
+
+    def __len__(self):
+        return self.pages
+
+    def page(self, index):
+        content_id = self._content[index]
+        img = self._cache.get(content_id)
+        if img is None:
+            if self.spread:
+                img = np.hstack([self._render(2 * content_id), self._render(2 * content_id + 1)])
+            else:
+                img = self._render(content_id)
+            self._cache = {k: v for k, v in self._cache.items() if abs(k - content_id) <= 1}
+            self._cache[content_id] = img
+        return img
+
+    def _render(self, content_id):
+        rng = np.random.default_rng((self.seed, content_id))
+        h, w = self.height, self.width
+        img = np.full((h, w, 4), 255, dtype=np.uint8)
+        # Rows of dark "glyph" blocks inside a margin, like a page of text
+        margin_x, margin_y = w // 10, h // 12
+        line_h = max(h // 40, 4)
+        glyph_w = max(line_h * 3 // 4, 3)
+        for y in range(margin_y, h - margin_y - line_h, line_h * 3 // 2):
+            n = (w - 2 * margin_x) // glyph_w
+            mask = rng.random(n) < 0.85
+            row = np.repeat(mask, glyph_w)
+            x_end = margin_x + row.size
+            img[y:y + line_h - 2, margin_x:x_end, :3][:, row] = rng.integers(0, 80)
+        # Page number at the bottom makes every page unique
+        cv2.putText(img, str(content_id + 1), (w // 2, h - margin_y // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, max(h / 1200, 0.4), (0, 0, 0, 255), 2)
+        return img
@@ -1,9 +1,17 @@
 import customtkinter as ctk
 import tkinter as tk
+import os
+import shutil
 import threading
 import time
-from capture_engine import CaptureEngine
-from pdf_writer import PDFGenerator
+from progress import ProgressChannel, ThroughputMeter, format_duration
+from capture_queue import CaptureQueue, load_queue, make_job, save_queue
+from page_archive import ARCHIVE_EXT, PageArchive, archive_path, delete_archive
+from session_journal import journal_for_book
+
+# capture_engine, page_store and pdf_writer pull in OpenCV, mss and Pillow;
+# they are imported on first use so the window opens without waiting for them.
+CAPTURE_DIR = "captured_images"
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
@@ -95,11 +103,50 @@ class App(ctk.CTk):
         self.font_button = ("Yu Gothic UI", 12, "bold")
 
 
-        self.capture_engine = CaptureEngine()
-        self.pdf_generator = PDFGenerator()
+        # Created on first use (see the properties below)
+        self._page_store = None
+        self._capture_engine = None
+        self._pdf_generator = None
+        self._lazy_lock = threading.Lock()
+
+        # Worker threads never touch widgets; they post to this channel, drained on the Tk thread
+        self.progress = ProgressChannel(self, self._apply_progress)
+        self.meter = ThroughputMeter()
+        self._capturing = False
+        self._total_pages = None
+        self._queue = None  # CaptureQueue while a queue runs
         
         self._setup_ui()
-        
+        self.progress.start()
+        # Warm the heavy imports in the background once the window is up
+        self.after(200, lambda: threading.Thread(target=lambda: self.capture_engine, daemon=True).start())
+
+    @property
+    def page_store(self):
+        # Pages are stored content-addressed per book (captured_images/blobs, captured_images/books)
+        with self._lazy_lock:
+            if self._page_store is None:
+                from page_store import PageStore
+                self._page_store = PageStore(CAPTURE_DIR)
+            return self._page_store
+
+    @property
+    def capture_engine(self):
+        store = self.page_store
+        with self._lazy_lock:
+            if self._capture_engine is None:
+                from capture_engine import CaptureEngine
+                self._capture_engine = CaptureEngine(CAPTURE_DIR, page_store=store)
+            return self._capture_engine
+
+    @property
+    def pdf_generator(self):
+        with self._lazy_lock:
+            if self._pdf_generator is None:
+                from pdf_writer import PDFGenerator
+                self._pdf_generator = PDFGenerator()
+            return self._pdf_generator
+
     def _setup_ui(self):
         # 1. Inputs
         self.frame_inputs = ctk.CTkFrame(self)
@@ -143,6 +190,47 @@ class App(ctk.CTk):
         self.entry_wait.insert(0, "500")
         self.entry_wait.pack(fill="x", padx=5, pady=(0, 10))
 
+        # Total pages: only used for the remaining-time estimate
+        ctk.CTkLabel(self.frame_settings, text="総ページ数 (任意・残り時間の表示用):", font=self.font_label).pack(anchor="w", padx=5)
+        self.entry_total_pages = ctk.CTkEntry(self.frame_settings, font=self.font_entry)
+        self.entry_total_pages.pack(fill="x", padx=5, pady=(0, 10))
+
+        # Adaptive wait: capture as soon as the page has finished drawing
+        self.var_adaptive = ctk.BooleanVar(value=False)
+        self.chk_adaptive = ctk.CTkCheckBox(self.frame_settings, text="ページ描画を自動検知 (待機時間は変化がない場合の上限)",
+                                            variable=self.var_adaptive, font=self.font_label)
+        self.chk_adaptive.pack(anchor="w", padx=5, pady=(0, 10))
+
+        # Two-page spread: one turn captures two pages, split at the gutter
+        self.var_spread = ctk.BooleanVar(value=False)
+        self.chk_spread = ctk.CTkCheckBox(self.frame_settings, text="見開き表示で撮影 (2ページに自動分割)",
+                                          variable=self.var_spread, font=self.font_label)
+        self.chk_spread.pack(anchor="w", padx=5, pady=(0, 10))
+
+        # One archive file per book instead of thousands of PNG files
+        self.var_archive = ctk.BooleanVar(value=False)
+        self.chk_archive = ctk.CTkCheckBox(self.frame_settings, text="ページを1つのファイルにまとめて保存",
+                                           variable=self.var_archive, font=self.font_label)
+        self.chk_archive.pack(anchor="w", padx=5, pady=(0, 10))
+
+        # Streaming PDF: append each page to the PDF while capturing
+        self.var_stream_pdf = ctk.BooleanVar(value=False)
+        self.chk_stream_pdf = ctk.CTkCheckBox(self.frame_settings, text="キャプチャ中にPDFを逐次作成",
+                                              variable=self.var_stream_pdf, font=self.font_label)
+        self.chk_stream_pdf.pack(anchor="w", padx=5, pady=(0, 10))
+
+        # Recompress pages (bilevel / grayscale / JPEG) to shrink the PDF
+        self.var_recompress = ctk.BooleanVar(value=False)
+        self.chk_recompress = ctk.CTkCheckBox(self.frame_settings, text="PDFを軽量化 (白黒/グレー/JPEGに自動変換)",
+                                              variable=self.var_recompress, font=self.font_label)
+        self.chk_recompress.pack(anchor="w", padx=5, pady=(0, 10))
+
+        # Auto crop: trim blank margins before building the PDF
+        self.var_auto_crop = ctk.BooleanVar(value=False)
+        self.chk_auto_crop = ctk.CTkCheckBox(self.frame_settings, text="余白を自動トリミング (PDF生成時)",
+                                             variable=self.var_auto_crop, font=self.font_label)
+        self.chk_auto_crop.pack(anchor="w", padx=5, pady=(0, 10))
+
         # 3. Actions
         self.frame_actions = ctk.CTkFrame(self)
         self.frame_actions.pack(pady=10, padx=10, fill="x")
@@ -156,6 +244,21 @@ class App(ctk.CTk):
         self.btn_start = ctk.CTkButton(self.frame_actions, text="自動キャプチャ開始 (5秒後)", command=self.start_capture_flow, fg_color="#36D399", text_color="black", font=self.font_button)
         self.btn_start.pack(fill="x", padx=5, pady=10)
 
+        self.btn_resume = ctk.CTkButton(self.frame_actions, text="中断したキャプチャを再開", command=self.resume_capture_flow, fg_color="#FBBD23", text_color="black", font=self.font_button)
+        self.btn_resume.pack(fill="x", padx=5, pady=5)
+
+        # Queue: several books captured one after another, unattended
+        ctk.CTkLabel(self.frame_actions, text="次の本を開く操作 (キュー用・; 区切り 例: press home; wait 2):",
+                     font=self.font_label).pack(anchor="w", padx=5)
+        self.entry_open_actions = ctk.CTkEntry(self.frame_actions, font=self.font_entry)
+        self.entry_open_actions.pack(fill="x", padx=5, pady=(0, 5))
+
+        self.btn_queue_add = ctk.CTkButton(self.frame_actions, text="この本をキューに追加", command=self.add_to_queue, fg_color="#A6ADBB", text_color="black", font=self.font_button)
+        self.btn_queue_add.pack(fill="x", padx=5, pady=5)
+
+        self.btn_queue_run = ctk.CTkButton(self.frame_actions, text=self._queue_button_text(), command=self.run_queue, fg_color="#A6ADBB", text_color="black", font=self.font_button)
+        self.btn_queue_run.pack(fill="x", padx=5, pady=5)
+
         self.btn_stop = ctk.CTkButton(self.frame_actions, text="停止", command=self.stop_capture, fg_color="#F87272", text_color="black", state="disabled", font=self.font_button)
         self.btn_stop.pack(fill="x", padx=5, pady=5)
         
@@ -167,7 +270,10 @@ class App(ctk.CTk):
 
         # 4. Logs
         self.lbl_status = ctk.CTkLabel(self, text="準備完了", wraplength=430, font=self.font_label)
-        self.lbl_status.pack(pady=10)
+        self.lbl_status.pack(pady=(10, 0))
+
+        self.lbl_metrics = ctk.CTkLabel(self, text="", wraplength=430, text_color="gray", font=self.font_label)
+        self.lbl_metrics.pack(pady=(0, 10))
 
     def select_region(self):
         ratio = None
@@ -183,7 +289,31 @@ class App(ctk.CTk):
         self.capture_engine.set_region(x, y, w, h)
         self.lbl_region_status.configure(text=f"範囲: x={x}, y={y}, {w}x{h}")
 
-    def start_capture_flow(self):
+    def _journal_for(self, title):
+        return journal_for_book(CAPTURE_DIR, title)
+
+    def resume_capture_flow(self):
+        title = self.entry_title.get()
+        if not title:
+            self.lbl_status.configure(text="エラー: タイトルを入力してください！")
+            return
+        journal = self._journal_for(title)
+        if not journal.resumable or not journal.last_page():
+            self.lbl_status.configure(text="再開できるキャプチャがありません。")
+            return
+
+        # Restore the settings of the interrupted session
+        region = journal.header['region']
+        self._on_region_selected(region['left'], region['top'], region['width'], region['height'])
+        self.var_direction.set(journal.header['direction'])
+        self.entry_wait.delete(0, "end")
+        self.entry_wait.insert(0, str(int(journal.header['wait_time'] * 1000)))
+        self.var_adaptive.set(journal.header.get('adaptive', False))
+        self.var_spread.set(journal.header.get('spread', False))
+        self.var_archive.set(journal.header.get('archive', False))
+        self.start_capture_flow(resume=True)
+
+    def start_capture_flow(self, resume=False):
         if not self.entry_title.get():
             self.lbl_status.configure(text="エラー: タイトルを入力してください！")
             return
@@ -191,70 +321,219 @@ class App(ctk.CTk):
             self.lbl_status.configure(text="エラー: 先にキャプチャ範囲を選択してください！")
             return
 
+        try:
+            wait_ms = int(self.entry_wait.get())
+        except ValueError:
+            self.lbl_status.configure(text="エラー: 待機時間はミリ秒の数値で入力してください！")
+            return
+
         self.btn_start.configure(state="disabled")
+        self.btn_resume.configure(state="disabled")
         self.btn_region.configure(state="disabled")
         self.btn_stop.configure(state="normal")
         self.btn_pdf.configure(state="disabled")
+
+        # Read every setting here on the Tk thread; the capture thread only gets plain values
+        total = self.entry_total_pages.get().strip()
+        self._total_pages = int(total) if total.isdigit() else None
+        settings = {
+            'direction': self.var_direction.get(),
+            'wait_sec': wait_ms / 1000.0,
+            'adaptive': self.var_adaptive.get(),
+            'spread': self.var_spread.get(),
+            'archive': self.var_archive.get(),
+            'title': self.entry_title.get(),
+            'author': self.entry_author.get(),
+            'stream_pdf': self.var_stream_pdf.get(),
+            'recompress': self.var_recompress.get(),
+        }
+        self.meter = ThroughputMeter()
+        self._capturing = True
         
         # Countdown thread
-        threading.Thread(target=self._countdown_and_start).start()
+        threading.Thread(target=self._countdown_and_start, args=(settings, resume)).start()
 
-    def _countdown_and_start(self):
+    def _countdown_and_start(self, settings, resume=False):
         for i in range(5, 0, -1):
-            self.lbl_status.configure(text=f"{i} 秒後に開始します... Kindleウィンドウをアクティブにしてください！")
+            self.progress.post(f"{i} 秒後に開始します... Kindleウィンドウをアクティブにしてください！")
             time.sleep(1)
             
-        self.lbl_status.configure(text="キャプチャ中... (マウスを動かさないでください)")
+        self.progress.post("キャプチャ中... (マウスを動かさないでください)")
         
-        # Parse settings
-        direction = self.var_direction.get()
-        wait_ms = int(self.entry_wait.get())
-        wait_sec = wait_ms / 1000.0
+        direction = settings['direction']
+        wait_sec = settings['wait_sec']
         
         # If Right->Left (Vertical), we press LEFT key to go to next page?
         # Standard Kindle for PC: Left Arrow goes to Next Page in Vertical mode (Right-side binding).
         # We'll pass the string to engine and let it decide or key mapping
         
-        self.capture_engine.start_capture(
-            direction=direction,
-            wait_time=wait_sec,
-            callback_status=self._update_status
-        )
+        pdf_stream = None
+        # A streamed PDF would only contain the pages of this run, so not when resuming
+        if settings['stream_pdf'] and not resume:
+            pdf_stream = self.pdf_generator.open_stream(settings['title'], settings['author'],
+                                                        recompress=settings['recompress'])
+
+        try:
+            archive = None
+            if settings['archive']:
+                archive = PageArchive(archive_path(CAPTURE_DIR, settings['title']), 'a' if resume else 'w')
+            self.capture_engine.start_capture(
+                direction=direction,
+                wait_time=wait_sec,
+                callback_status=self._update_status,
+                adaptive=settings['adaptive'],
+                on_page_saved=pdf_stream.add_page if pdf_stream else None,
+                book_id=settings['title'],
+                journal=self._journal_for(settings['title']),
+                resume=resume,
+                spread=settings['spread'],
+                archive=archive,
+            )
+        except Exception as e:
+            # e.g. pyautogui failsafe: the journal keeps the pages so far for 再開
+            print(f"Capture aborted: {e}")
+
+        pdfs = pdf_stream.close() if pdf_stream else None
         
-        # After loop callback
-        self.after(0, self._on_capture_finished)
+        # After loop callback, run on the Tk thread by the progress channel
+        self.progress.call(self._on_capture_finished, pdfs)
 
     def _update_status(self, msg, count):
-        self.lbl_status.configure(text=f"{msg} (Total: {count})")
+        # Called from the capture thread once per page
+        self.progress.post(f"{msg} (Total: {count})", count)
+
+    def _apply_progress(self, message, count):
+        # Tk thread, at most every ProgressChannel.refresh_ms
+        if message is not None:
+            self.lbl_status.configure(text=message)
+        if not self._capturing:
+            return
+        snapshot = self.capture_engine.progress()
+        self.meter.update(snapshot['pages'])
+        parts = [f"{self.meter.pages_per_minute():.1f} ページ/分"]
+        if snapshot['turn_latency']:
+            parts.append(f"めくり {snapshot['turn_latency']:.2f} 秒")
+        parts.append(f"書き込み待ち {snapshot['encode_backlog']}")
+        try:
+            free = shutil.disk_usage(self.capture_engine.output_dir).free
+            parts.append(f"保存 {snapshot['bytes_written'] / 1e6:.0f} MB (空き {free / 1e9:.1f} GB)")
+        except OSError:
+            parts.append(f"保存 {snapshot['bytes_written'] / 1e6:.0f} MB")
+        if self._total_pages:
+            eta = self.meter.eta(self._total_pages)
+            parts.append(f"残り約 {format_duration(eta)}" if eta is not None else "残り時間: 計測中")
+        self.lbl_metrics.configure(text=" | ".join(parts))
 
     def stop_capture(self):
+        if self._queue:
+            self._queue.stop()
         self.capture_engine.stop()
 
-    def _on_capture_finished(self):
+    def _queue_button_text(self):
+        try:
+            pending = [job for job in load_queue() if job['status'] not in ('done', 'failed')]
+        except (OSError, ValueError) as e:
+            print(f"Could not read the capture queue: {e}")
+            return "キューを実行"
+        return f"キューを実行 ({len(pending)} 冊)"
+
+    def add_to_queue(self):
+        title = self.entry_title.get()
+        region = self.capture_engine.region
+        if not title or not region:
+            self.lbl_status.configure(text="エラー: タイトルとキャプチャ範囲を設定してください！")
+            return
+        try:
+            job = make_job(
+                title, (region['left'], region['top'], region['width'], region['height']),
+                author=self.entry_author.get(),
+                direction=self.var_direction.get(),
+                wait_ms=int(self.entry_wait.get()),
+                adaptive=self.var_adaptive.get(),
+                spread=self.var_spread.get(),
+                archive=self.var_archive.get(),
+                open_actions=[a.strip() for a in self.entry_open_actions.get().split(";") if a.strip()],
+                recompress=self.var_recompress.get(),
+                auto_crop=self.var_auto_crop.get(),
+            )
+        except ValueError as e:
+            self.lbl_status.configure(text=f"エラー: {e}")
+            return
+        jobs = load_queue()
+        jobs.append(job)
+        save_queue(jobs)
+        self.btn_queue_run.configure(text=self._queue_button_text())
+        self.lbl_status.configure(text=f"キューに追加しました: {title}")
+
+    def run_queue(self):
+        queue = CaptureQueue(self.capture_engine, images_dir=CAPTURE_DIR, on_status=self._update_status)
+        if not queue.pending():
+            self.lbl_status.configure(text="キューに未処理の本がありません。")
+            return
+        for button in (self.btn_start, self.btn_resume, self.btn_region, self.btn_pdf,
+                       self.btn_queue_add, self.btn_queue_run):
+            button.configure(state="disabled")
+        self.btn_stop.configure(state="normal")
+        self._queue = queue
+        self._total_pages = None
+        self.meter = ThroughputMeter()
+        self._capturing = True
+        threading.Thread(target=self._run_queue_worker, args=(queue,)).start()
+
+    def _run_queue_worker(self, queue):
+        for i in range(5, 0, -1):
+            self.progress.post(f"{i} 秒後にキューを開始します... Kindleウィンドウをアクティブにしてください！")
+            time.sleep(1)
+        try:
+            queue.run()
+        except Exception as e:
+            print(f"Queue aborted: {e}")
+            self.progress.post(f"キューが中断しました: {e}")
+        self.progress.call(self._on_queue_finished)
+
+    def _on_queue_finished(self):
+        self._queue = None
+        self._capturing = False
+        for button in (self.btn_start, self.btn_resume, self.btn_region, self.btn_queue_add, self.btn_queue_run):
+            button.configure(state="normal")
+        self.btn_stop.configure(state="disabled")
+        self.btn_queue_run.configure(text=self._queue_button_text())
+
+    def _on_capture_finished(self, pdfs=None):
+        self._capturing = False
         self.btn_start.configure(state="normal")
+        self.btn_resume.configure(state="normal")
         self.btn_region.configure(state="normal")
         self.btn_stop.configure(state="disabled")
         
         saved = len(self.capture_engine.saved_files)
         if saved > 0:
             self.btn_pdf.configure(state="normal")
-            self.lbl_status.configure(text=f"キャプチャ完了。 {saved} ページ保存されました。PDF生成可能です。")
+            # Through the channel, so status lines still queued from the capture thread cannot overwrite it
+            if pdfs:
+                self.progress.post(f"キャプチャ完了。 {saved} ページ保存、PDF {len(pdfs)} 件作成しました (output_pdfs/)")
+            else:
+                self.progress.post(f"キャプチャ完了。 {saved} ページ保存されました。PDF生成可能です。")
         else:
-            self.lbl_status.configure(text="キャプチャ終了。 保存されたページはありません。")
+            self.progress.post("キャプチャ終了。 保存されたページはありません。")
 
     def generate_pdf(self):
-        self.lbl_status.configure(text="PDF生成中...")
-        threading.Thread(target=self._generate_pdf_worker).start()
-
-    def _generate_pdf_worker(self):
-        files = self.capture_engine.saved_files
-        title = self.entry_title.get()
-        author = self.entry_author.get()
+        self.progress.post("PDF生成中...")
+        threading.Thread(target=self._generate_pdf_worker,
+                         args=(self.entry_title.get(), self.entry_author.get(),
+                               self.var_recompress.get(), self.var_auto_crop.get())).start()
+
+    def _generate_pdf_worker(self, title, author, recompress, auto_crop):
+        # The archive or book index holds the whole book, including pages from earlier (overlapping) runs
+        archive = archive_path(CAPTURE_DIR, title)
+        files = ((PageArchive(archive).refs() if os.path.exists(archive) else None)
+                 or self.page_store.book_pages(title) or self._journal_for(title).page_paths()
+                 or self.capture_engine.saved_files)
         
-        pdfs = self.pdf_generator.generate(files, title, author)
+        pdfs = self.pdf_generator.generate(files, title, author, recompress=recompress, auto_crop=auto_crop)
         
         msg = f"PDF生成完了: {len(pdfs)} 件作成しました (output_pdfs/)"
-        self.lbl_status.configure(text=msg)
+        self.progress.post(msg)
         print(msg)
 
     def clear_images(self):
@@ -263,14 +542,38 @@ class App(ctk.CTk):
         import os
         import glob
         
-        files = glob.glob(os.path.join(self.capture_engine.output_dir, "*"))
-        count = 0
-        for f in files:
-            try:
-                os.remove(f)
+        title = self.entry_title.get()
+        if title:
+            # Only this book: its archive is one file; otherwise drop its index, then the pages no other book uses
+            archive = archive_path(CAPTURE_DIR, title)
+            count = 1 if os.path.exists(archive) else 0
+            delete_archive(archive)
+            self.page_store.delete_book(title)
+            count += self.page_store.gc()
+            # Without its pages the session cannot be resumed any more
+            self._journal_for(title).delete()
+        else:
+            files = glob.glob(os.path.join(self.capture_engine.output_dir, "*.png"))
+            count = 0
+            for f in files:
+                try:
+                    os.remove(f)
+                    count += 1
+                except Exception as e:
+                    print(f"Error deleting {f}: {e}")
+            for book_id in self.page_store.books():
+                self.page_store.delete_book(book_id)
+            count += self.page_store.gc()
+            for path in glob.glob(os.path.join(CAPTURE_DIR, "archives", "*" + ARCHIVE_EXT)):
+                delete_archive(path)
                 count += 1
-            except Exception as e:
-                print(f"Error deleting {f}: {e}")
+            # Journals and run reports describe the pages just deleted
+            for path in (glob.glob(os.path.join(CAPTURE_DIR, "sessions", "*.jsonl"))
+                         + glob.glob(os.path.join(self.capture_engine.report_dir, "capture_*"))):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Error deleting {path}: {e}")
         
         self.capture_engine.saved_files = [] 
         self.lbl_status.configure(text=f"画像を削除しました ({count} ファイル)")
@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+
+from frame_buffer import encode_png, write_png
+
+
+class ImageWriterPool:
+    """
+    Encodes and writes captured frames to PNG on background threads.
+
+    The capture loop only hands frames over with submit(); zlib compression
+    and the disk write happen here. The queue is bounded, so if the disk or
+    encoder cannot keep up, submit() blocks (backpressure) instead of letting
+    unwritten frames pile up in memory.
+
+    on_written: optional callback(filename), called once per successfully
+    written file in submission order (from a worker thread).
+    store: optional PageStore; frames are then stored content-addressed and
+    the filename passed to submit() is ignored (on_written gets the blob path).
+    archive: optional PageArchive; frames are encoded in parallel but appended
+    to the archive in submission order, and on_written gets the page reference.
+    instrument: optional Instrumentation; each encode + write is recorded as 'encode'.
+    """
+    def __init__(self, workers=2, max_queue=8, on_written=None, store=None, instrument=None, archive=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.on_written = on_written
+        self.store = store
+        self.archive = archive
+        self.instrument = instrument
+        self._submitted = 0
+        self._next_delivery = 0
+        self._done = {}  # seq -> (filename, ok, data) waiting for earlier files to finish
+        self._delivery_lock = threading.Lock()
+        self.failed = []  # filenames that could not be written
+        self.stats = {
+            'written': 0,
+            'encode_time': 0.0,      # total seconds spent in PNG encode + write
+            'encode_time_max': 0.0,
+            'blocked_time': 0.0,     # seconds submit() waited on a full queue
+            'max_queue_depth': 0,
+        }
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"png-writer-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def encode_time_avg(self):
+        written = self.stats['written']
+        return self.stats['encode_time'] / written if written else 0.0
+
+    def submit(self, filename, frame):
+        """
+        Queues `frame` (a BGRA array or anything numpy can view as one, e.g. an
+        mss ScreenShot) for writing. The frame is encoded from its own memory,
+        so it must not be modified until written.
+        """
+        start = time.perf_counter()
+        seq = self._submitted
+        self._submitted += 1
+        self._queue.put((seq, filename, frame))
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.stats['blocked_time'] += waited
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self._queue.qsize())
+
+    def flush(self):
+        """Blocks until every submitted frame has been written (or failed)."""
+        self._queue.join()
+
+    def close(self):
+        """Flushes and stops the worker threads."""
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            seq, filename, frame = item
+            start = time.perf_counter()
+            ok = False
+            data = None
+            try:
+                if self.archive is not None:
+                    data = encode_png(frame)  # appended in order by _deliver
+                elif self.store is not None:
+                    _, filename = self.store.put_frame(frame)
+                else:
+                    write_png(frame, filename)
+                ok = True
+            except Exception as e:
+                print(f"Failed to write {filename}: {e}")
+                with self._lock:
+                    self.failed.append(filename)
+            else:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.stats['written'] += 1
+                    self.stats['encode_time'] += elapsed
+                    self.stats['encode_time_max'] = max(self.stats['encode_time_max'], elapsed)
+                if self.instrument:
+                    self.instrument.observe('encode', elapsed)
+            finally:
+                self._deliver(seq, filename, ok, data)
+                self._queue.task_done()
+
+    def _deliver(self, seq, filename, ok, data=None):
+        # Workers finish out of order; hand files to on_written strictly in order
+        with self._delivery_lock:
+            self._done[seq] = (filename, ok, data)
+            while self._next_delivery in self._done:
+                filename, ok, data = self._done.pop(self._next_delivery)
+                self._next_delivery += 1
+                if ok and data is not None:
+                    try:
+                        filename = self.archive.append(data)
+                    except Exception as e:
+                        print(f"Failed to append {filename} to the archive: {e}")
+                        ok = False
+                        with self._lock:
+                            self.failed.append(filename)
+                if ok and self.on_written:
+                    try:
+                        self.on_written(filename)
+                    except Exception as e:
+                        print(f"on_written callback failed for {filename}: {e}")
@@ -0,0 +1,167 @@
+import bisect
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is open-ended)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+MAX_SAMPLES = 100000  # per timer, for percentiles
+
+
+class _Timer:
+    __slots__ = ('count', 'total', 'max', 'buckets', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.samples = []
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(BUCKETS_MS, seconds * 1000.0)] += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self):
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 6),
+            'mean_ms': round(self.total * 1000.0 / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.50) * 1000.0, 3),
+            'p90_ms': round(self.percentile(0.90) * 1000.0, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000.0, 3),
+            'max_ms': round(self.max * 1000.0, 3),
+            'histogram': {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class Instrumentation:
+    """
+    Per-stage timers, counters and latency histograms for one run of a
+    pipeline (capture loop, PDF generation, OCR), plus an optional cProfile.
+
+        instr = Instrumentation('capture', settings={...}, profile=False)
+        with instr.stage('grab'):
+            ...
+        instr.observe('page', seconds)   # a latency measured elsewhere
+        instr.count('duplicates')
+        instr.finish()
+        instr.write_report(path)         # JSON; instr.summary() for humans
+
+    Recording is a perf_counter pair and a dict update under a lock, so it
+    is cheap enough for the per-frame hot path and safe from worker threads.
+    """
+    def __init__(self, name, settings=None, profile=False):
+        self.name = name
+        self.settings = dict(settings or {})
+        self.timers = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.elapsed = None
+        self.profiler = cProfile.Profile() if profile else None
+        if self.profiler:
+            self.profiler.enable()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = _Timer()
+            timer.add(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self._start
+            if self.profiler:
+                self.profiler.disable()
+        return self
+
+    def report(self):
+        """Structured report of the run (finishes it if still running)."""
+        self.finish()
+        with self._lock:
+            stages = {name: timer.to_dict() for name, timer in self.timers.items()}
+            counters = dict(self.counters)
+        report = {
+            'name': self.name,
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'elapsed_s': round(self.elapsed, 3),
+            'machine': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'cpus': os.cpu_count(),
+            },
+            'settings': self.settings,
+            'stages': stages,
+            'counters': counters,
+        }
+        if self.profiler:
+            report['profile_top'] = self._profile_top()
+        return report
+
+    def _profile_top(self, limit=25):
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue().splitlines()
+
+    def summary(self):
+        """
+        Human-readable table of the stages, slowest total first. Stages run on
+        worker threads (e.g. encode) overlap the loop, so shares can exceed 100%.
+        """
+        report = self.report()
+        lines = [f"--- {self.name}: {report['elapsed_s']:.2f} s ---"]
+        stages = sorted(report['stages'].items(), key=lambda item: -item[1]['total_s'])
+        for name, s in stages:
+            share = s['total_s'] / report['elapsed_s'] * 100 if report['elapsed_s'] else 0.0
+            lines.append(f"{name:>14}: {s['count']:6d} x  mean {s['mean_ms']:8.2f} ms  p90 {s['p90_ms']:8.2f} ms"
+                         f"  max {s['max_ms']:8.2f} ms  total {s['total_s']:8.2f} s ({share:4.1f}%)")
+        for name, n in sorted(report['counters'].items()):
+            lines.append(f"{name:>14}: {n}")
+        return "\n".join(lines)
+
+    def write_report(self, path):
+        """Writes the JSON report (and the cProfile data next to it when profiling). Returns path."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        if self.profiler:
+            self.profiler.dump_stats(os.path.splitext(path)[0] + ".prof")
+        return path
+
+    def default_report_path(self, directory):
+        return os.path.join(directory, f"{self.name}_{datetime.fromtimestamp(self.started):%Y%m%d_%H%M%S}.json")
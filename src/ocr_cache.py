@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class OCRCache:
+    """
+    On-disk cache of raw OCR text (SQLite), keyed by page image hash plus
+    the OCR backend and its settings.
+
+    Only the raw backend output is stored; line cleanup runs on every read,
+    so changing the cleanup rules never requires re-OCRing a page. Entries
+    are evicted least-recently-used once the stored text exceeds max_bytes.
+    Safe to share between threads.
+    """
+    def __init__(self, path="ocr_cache.sqlite", max_bytes=200 * 1000 * 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ocr ("
+            " image_hash TEXT NOT NULL,"
+            " backend TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (image_hash, backend))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ocr_last_used ON ocr (last_used)")
+        self._db.commit()
+        # Running total of the stored text, so put() never has to sum the whole table
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr").fetchone()[0]
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+    def get(self, image_hash, backend):
+        """Cached raw text, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT text FROM ocr WHERE image_hash = ? AND backend = ?",
+                                   (image_hash, backend)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self._db.execute("UPDATE ocr SET last_used = ? WHERE image_hash = ? AND backend = ?",
+                             (time.time(), image_hash, backend))
+            self._db.commit()
+            self.stats['hits'] += 1
+            return row[0]
+
+    def put(self, image_hash, backend, text):
+        now = time.time()
+        size = len(text.encode('utf-8'))
+        with self._lock:
+            old = self._db.execute("SELECT size FROM ocr WHERE image_hash = ? AND backend = ?",
+                                   (image_hash, backend)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO ocr VALUES (?, ?, ?, ?, ?, ?)",
+                             (image_hash, backend, text, size, now, now))
+            self._total += size - (old[0] if old else 0)
+            self.stats['stored'] += 1
+            self._evict()
+            self._db.commit()
+
+    def _evict(self, batch=64):
+        # Oldest entries first, a batch at a time through the last_used index
+        while self._total > self.max_bytes:
+            rows = self._db.execute("SELECT image_hash, backend, size FROM ocr ORDER BY last_used LIMIT ?",
+                                    (batch,)).fetchall()
+            if not rows:
+                self._total = 0
+                break
+            doomed = []
+            for image_hash, backend, size in rows:
+                if self._total <= self.max_bytes:
+                    break
+                doomed.append((image_hash, backend))
+                self._total -= size
+            self._db.executemany("DELETE FROM ocr WHERE image_hash = ? AND backend = ?", doomed)
+            self.stats['evicted'] += len(doomed)
+
+    def summary(self):
+        """(entries, total text bytes) currently stored."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr").fetchone()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM ocr")
+            self._db.commit()
+            self._total = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
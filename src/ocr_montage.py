@@ -0,0 +1,85 @@
+"""
+Several pages in one OCR upload.
+
+Drive converts one image per call, so a book costs calls (and quota) in
+proportion to its pages. A montage stacks a few pages, downscaled and in
+grayscale, top to bottom in one image, each preceded by a separator band
+with a printed marker ("PAGEBREAK 1", "PAGEBREAK 2", ...). After
+conversion the paragraphs are split back at the markers. Markers have to
+come back as paragraphs of their own and in sequence; anything else
+(a marker misread or merged with page text, text above the first marker)
+makes the split ambiguous and the caller OCRs those pages one by one.
+"""
+import re
+
+import cv2
+import numpy as np
+
+from frame_buffer import PNG_COMPRESSION
+from page_archive import read_image
+
+MONTAGE_WIDTH = 1000     # px; pages are scaled down to this width (text stays well above 10 px)
+SEPARATOR_HEIGHT = 160   # px of blank band around each marker
+MARKER = "PAGEBREAK {}"  # at most 8 pages: single digits, no slashed zeros to misread
+_MARKER_RE = re.compile(r"^\W*PAGE\s*BREAK\W*(\d{1,2})\W*$", re.IGNORECASE)
+
+
+def _separator(number, width, height):
+    band = np.full((height, width), 255, np.uint8)
+    text = MARKER.format(number)
+    font, scale, thickness = cv2.FONT_HERSHEY_SIMPLEX, 2.0, 4
+    (text_w, text_h), _ = cv2.getTextSize(text, font, scale, thickness)
+    if text_w > width * 0.9:
+        scale *= width * 0.9 / text_w
+        (text_w, text_h), _ = cv2.getTextSize(text, font, scale, thickness)
+    origin = ((width - text_w) // 2, (height + text_h) // 2)
+    cv2.putText(band, text, origin, font, scale, 0, thickness, cv2.LINE_AA)
+    return band
+
+
+def _fit(page, width):
+    """Scales a grayscale page down to `width` (never up) and pads it to that width with white."""
+    h, w = page.shape
+    if w > width:
+        page = cv2.resize(page, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    elif w < width:
+        padded = np.full((h, width), 255, np.uint8)
+        padded[:, :w] = page
+        page = padded
+    return page
+
+
+def build_montage(paths, width=MONTAGE_WIDTH, separator_height=SEPARATOR_HEIGHT):
+    """
+    PNG bytes (numpy array) of the pages stacked top to bottom, each after
+    its marker band (numbered from 1). None if a page cannot be read.
+    paths: image paths or archive references.
+    """
+    parts = []
+    for number, path in enumerate(paths, 1):
+        page = read_image(path, cv2.IMREAD_GRAYSCALE)
+        if page is None:
+            return None
+        parts.append(_separator(number, width, separator_height))
+        parts.append(_fit(page, width))
+    ok, data = cv2.imencode(".png", np.vstack(parts), [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+    return data if ok else None
+
+
+def split_montage(paragraphs, count):
+    """
+    Splits the paragraphs ([[style, text], ...]) of a converted montage into
+    `count` per-page lists, in order. None if the split is ambiguous.
+    """
+    pages = []
+    for style, text in paragraphs:
+        match = _MARKER_RE.match(text.strip())
+        if match:
+            if int(match.group(1)) != len(pages) + 1:
+                return None  # a marker was missed or misread
+            pages.append([])
+        elif pages:
+            pages[-1].append([style, text])
+        elif text.strip():
+            return None  # text above the first marker belongs to no page
+    return pages if len(pages) == count else None
@@ -1,11 +1,20 @@
+import io
 import os
+import json
 import time
 import pickle
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.http import MediaFileUpload
-import urllib3
+import random
+import shutil
+import socket
+import ssl
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from books import book_pages, latest_book, loose_pages
+from instrument import Instrumentation
+from page_archive import open_page, page_digest, page_size, parse_ref
+
+# Google API のライブラリは Drive を使うときだけ読み込む (tesseract / PDFだけの実行を速く、認証なしで)
 
 # --- 設定 ---
 SCOPES = ['https://www.googleapis.com/auth/drive']
@@ -13,10 +22,134 @@ CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
 IMAGE_DIR = 'captured_images'
 OUTPUT_FILE = 'output.md'
+BOOK_ID = None  # 本のタイトル。None なら最後にキャプチャした本を処理
+AUTO_CROP = False  # True: 余白を自動トリミングしてからアップロード (転送量削減)
+OCR_ENGINE = 'drive'  # 'drive': Google ドライブ, 'tesseract': ローカルのTesseract (認証不要)
+CONCURRENCY = 4  # 同時に処理するページ数 (drive)
+MAX_RETRIES = 5  # 429/5xx・通信エラー時の再試行回数
+RETRY_BASE_DELAY = 1.0  # 最初の再試行までの待ち時間 (秒)。以降は倍々に延ばす (最大60秒)
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024  # これより大きい画像だけ再開可能アップロードを使う
+DELETE_BATCH_SIZE = 50  # 一時ドキュメントをまとめて削除する件数
+HTTP_TIMEOUT = 120  # 秒
+CACHE_FILE = 'ocr_cache.sqlite'  # OCR結果のキャッシュ (同じ画像は再アップロードしない)
+CACHE_MAX_MB = 200  # キャッシュの上限サイズ。超えたら古いものから削除
+REPORT_FILE = 'ocr_report.json'  # 工程ごとの処理時間レポート
+MONTAGE_PAGES = 1  # 2以上: その枚数のページを1枚の画像にまとめてOCR (API呼び出しと転送量を削減)
+MONTAGE_MAX_PAGES = 8
+MONTAGE_MAX_BYTES = 2 * 1000 * 1000  # ドライブのOCRは2MBまでの画像が対象。超えたら枚数を減らす
 # -------------
 
-def get_drive_service():
-    """Google Drive APIのサービスを取得する"""
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded')  # ドライブは 403 で返すこともある
+# キャッシュのキー。OCRの方法や設定を変えたらここも変える
+OCR_BACKEND = 'drive-v3:docs-v1:paragraphs'
+
+
+class OCRSetupError(Exception):
+    """APIが無効・権限がないなど、どのページでも同じく失敗する設定の問題。処理全体を止める"""
+
+
+class AdaptiveRateLimiter:
+    """
+    全スレッド共通のAPI呼び出しレート制御。
+    成功するたびに少しずつレートを上げ、429/5xx で半減させて一時停止する。
+    同時に失敗した複数スレッドで何度も半減しないよう、一時停止中の失敗は1回と数える。
+    """
+    def __init__(self, rate=2.0, min_rate=0.2, max_rate=10.0, increase=1.05, decrease=0.5):
+        self.rate = rate  # 1秒あたりの呼び出し回数
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'throttled': 0}
+
+    def acquire(self):
+        """次の呼び出し枠まで待つ"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+            self.stats['calls'] += 1
+        if slot > now:
+            time.sleep(slot - now)
+
+    def success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * self.increase)
+
+    def failure(self, pause):
+        """レートを下げ、pause 秒は誰も呼び出さないようにする"""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._paused_until:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._paused_until = max(self._paused_until, now + pause)
+            self._next_slot = max(self._next_slot, self._paused_until)
+            self.stats['throttled'] += 1
+
+
+def retry_reason(error):
+    """
+    再試行すべきエラーならその説明を返す (それ以外は None)。
+    429/5xx に加え、タイムアウト・接続切れなど通信途中の一時的なエラーも対象
+    """
+    import httplib2
+    from googleapiclient.errors import HttpError
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status in RETRYABLE_STATUS or (status == 403 and _is_rate_limit(error)):
+            return f"API制限/サーバーエラー ({status})"
+        return None
+    if isinstance(error, (socket.timeout, TimeoutError, ConnectionError, ssl.SSLError, httplib2.HttpLib2Error)):
+        return f"通信エラー ({type(error).__name__}: {error})"
+    return None
+
+def _is_rate_limit(error):
+    return any(reason in (error.content or b'') for reason in RATE_LIMIT_REASONS)
+
+def check_access(error, api_name):
+    """403 (レート制限以外) なら OCRSetupError にする: APIが無効なら全ページが同じく失敗するので続けない"""
+    from googleapiclient.errors import HttpError
+    if isinstance(error, HttpError) and error.resp.status == 403 and not _is_rate_limit(error):
+        raise OCRSetupError(
+            f"{api_name} を利用できません (403)。Google Cloud Console で認証情報のプロジェクトの "
+            f"{api_name} を有効にしてください (README の「テキスト化 (OCR)」参照)。詳細: {error}") from error
+
+def retry_pause(attempt):
+    """attempt 回目 (0から) の再試行までの待ち時間。ジッター付き指数バックオフ"""
+    return min(60.0, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def execute_with_retry(request, limiter=None, max_retries=MAX_RETRIES):
+    """APIリクエストを実行する。429/5xx と一時的な通信エラーはジッター付き指数バックオフで再試行"""
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            result = request.execute()
+        except Exception as e:
+            reason = retry_reason(e)
+            if reason is None or attempt == max_retries:
+                raise
+            pause = retry_pause(attempt)
+            print(f"{reason}。{pause:.1f} 秒後に再試行します...")
+            if limiter:
+                limiter.failure(pause)
+            else:
+                time.sleep(pause)
+            continue
+        if limiter:
+            limiter.success()
+        return result
+
+
+def get_credentials():
+    """OAuth認証情報を取得する (必要ならブラウザで認証)"""
+    import urllib3
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
     creds = None
     if os.path.exists(TOKEN_FILE):
         with open(TOKEN_FILE, 'rb') as token:
@@ -36,105 +169,522 @@ def get_drive_service():
         with open(TOKEN_FILE, 'wb') as token:
             pickle.dump(creds, token)
 
-    return build('drive', 'v3', credentials=creds)
+    return creds
+
+def get_drive_service(creds=None):
+    """
+    Google Drive APIのサービスを取得する。
+    サービスごとに keep-alive の認証済みHTTP接続を1本持つので、
+    スレッドごとに1回だけ作って実行中ずっと使い回す (TLSハンドシェイクは最初の1回のみ)。
+    """
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build
+    http = AuthorizedHttp(creds or get_credentials(), http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    return build('drive', 'v3', http=http, cache_discovery=False, static_discovery=True)
+
+def get_docs_service(creds=None):
+    """Google Docs APIのサービスを取得する (get_drive_service と同様にスレッドごとに作る)"""
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build
+    http = AuthorizedHttp(creds or get_credentials(), http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    return build('docs', 'v1', http=http, cache_discovery=False, static_discovery=True)
 
-def upload_image_for_ocr(service, file_path):
-    """画像をアップロードしてOCRを実行する"""
+def upload_image_for_ocr(service, file_path, limiter=None, data=None):
+    """
+    画像をアップロードしてOCRを実行する。
+    data: 画像のバイト列。指定するとそれを送り、file_path は名前にだけ使う (モンタージュ)
+    """
+    from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
     file_name = os.path.basename(file_path)
     file_metadata = {
         'name': file_name,
         'mimeType': 'application/vnd.google-apps.document'
     }
-    media = MediaFileUpload(file_path, mimetype='image/png', resumable=True)
+    # 小さい画像は1往復で済むマルチパート、大きい画像だけ再開可能アップロード
+    resumable = (len(data) if data is not None else page_size(file_path)) > RESUMABLE_THRESHOLD
+    if data is not None:
+        media = MediaIoBaseUpload(io.BytesIO(data), mimetype='image/png', resumable=resumable)
+    elif parse_ref(file_path):
+        # ページアーカイブ内のページはメモリから直接アップロード
+        media = MediaIoBaseUpload(open_page(file_path), mimetype='image/png', resumable=resumable)
+    else:
+        media = MediaFileUpload(file_path, mimetype='image/png', resumable=resumable)
     
     try:
-        file = service.files().create(
+        file = execute_with_retry(service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id'
-        ).execute()
+        ), limiter)
         return file.get('id')
     except Exception as e:
+        check_access(e, "Google Drive API")
         print(f"アップロードエラー ({file_name}): {e}")
         return None
 
-def get_text_from_doc(service, file_id):
-    """Googleドキュメントからテキストを取得する"""
+def get_doc_paragraphs(docs_service, file_id, limiter=None):
+    """
+    Docs API でドキュメントの段落を取得する (1回の呼び出し)。
+    戻り値: [[namedStyleType, テキスト], ...] (失敗時は None)
+    """
     try:
-        content = service.files().export(
-            fileId=file_id,
-            mimeType='text/plain'
-        ).execute()
-        return content.decode('utf-8')
+        doc = execute_with_retry(docs_service.documents().get(
+            documentId=file_id,
+            fields='body/content/paragraph(paragraphStyle/namedStyleType,elements/textRun/content)'
+        ), limiter)
     except Exception as e:
+        check_access(e, "Google Docs API")
         print(f"テキスト取得エラー (ID: {file_id}): {e}")
-        return ""
+        return None
+    paragraphs = []
+    for element in doc.get('body', {}).get('content', []):
+        # 画像 (inlineObjectElement) や区切り線は textRun を持たないので自然に除かれる
+        if 'paragraph' not in element:
+            continue
+        paragraph = element['paragraph']
+        style = paragraph.get('paragraphStyle', {}).get('namedStyleType', 'NORMAL_TEXT')
+        text = "".join(te['textRun']['content'] for te in paragraph.get('elements', []) if 'textRun' in te)
+        paragraphs.append([style, text.rstrip('\n')])
+    return paragraphs
 
-def delete_file(service, file_id):
+def delete_file(service, file_id, limiter=None):
     """ファイルを削除する"""
     try:
-        service.files().delete(fileId=file_id).execute()
+        execute_with_retry(service.files().delete(fileId=file_id), limiter)
     except Exception as e:
         print(f"削除エラー (ID: {file_id}): {e}")
 
-def main():
-    if not os.path.exists(CREDENTIALS_FILE):
+HEADING_PREFIX = {
+    'TITLE': '# ',
+    'SUBTITLE': '## ',
+    'HEADING_1': '# ',
+    'HEADING_2': '## ',
+    'HEADING_3': '### ',
+    'HEADING_4': '#### ',
+    'HEADING_5': '##### ',
+    'HEADING_6': '###### ',
+}
+
+def paragraphs_to_markdown(paragraphs):
+    """Docs API の段落 (get_doc_paragraphs の戻り値) をMarkdownにする"""
+    lines = []
+    for style, text in paragraphs:
+        stripped = text.strip()
+        # ページ番号のゴミを除去
+        if stripped.startswith("Page ") and len(stripped) < 10:
+            continue
+        prefix = HEADING_PREFIX.get(style)
+        if prefix and stripped:
+            # 見出しの前後は空行で区切る
+            if lines and lines[-1]:
+                lines.append("")
+            lines.append(prefix + stripped)
+            lines.append("")
+            continue
+        if not stripped:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        lines.append(text)
+    return "\n".join(lines).strip("\n")
+
+class DeleteBatcher:
+    """
+    一時ドキュメントの削除をまとめ、バッチリクエスト (1往復で最大100件) で送る。
+    add() はどのスレッドから呼んでもよい。最後に必ず flush() すること。
+    削除は後始末なので、add() / flush() は失敗してもログに残すだけで例外を出さない。
+    """
+    def __init__(self, service_factory, limiter=None, batch_size=DELETE_BATCH_SIZE):
+        self.service_factory = service_factory
+        self.limiter = limiter
+        self.batch_size = min(batch_size, 100)  # Drive API のバッチ上限
+        self._pending = []
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._service = None
+        self.stats = {'batches': 0, 'deleted': 0, 'failed': 0}
+
+    def add(self, file_id):
+        with self._lock:
+            self._pending.append(file_id)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            ids, self._pending = self._pending, []
+        if not ids:
+            return
+        with self._send_lock:
+            try:
+                if self._service is None:
+                    self._service = self.service_factory()
+                self._send(ids)
+            except Exception as e:
+                # 残るのはドライブ上の一時ドキュメントだけ: OCRの結果や処理の続行には影響させない
+                print(f"削除エラー ({len(ids)} 件): {e}")
+                self.stats['failed'] += len(ids)
+
+    def _send(self, ids):
+        for attempt in range(MAX_RETRIES + 1):
+            retry = []
+
+            def on_response(file_id, response, exception):
+                if exception is None:
+                    self.stats['deleted'] += 1
+                elif retry_reason(exception):
+                    retry.append(file_id)
+                else:
+                    print(f"削除エラー (ID: {file_id}): {exception}")
+                    self.stats['failed'] += 1
+
+            batch = self._service.new_batch_http_request(callback=on_response)
+            for file_id in ids:
+                batch.add(self._service.files().delete(fileId=file_id), request_id=file_id)
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                batch.execute()
+            except Exception as e:
+                if retry_reason(e) is None:
+                    raise
+                retry = ids
+            self.stats['batches'] += 1
+            if not retry:
+                if self.limiter:
+                    self.limiter.success()
+                return
+            ids = retry
+            pause = retry_pause(attempt)
+            if self.limiter:
+                self.limiter.failure(pause)
+            else:
+                time.sleep(pause)
+        print(f"削除エラー: {len(ids)} 件のドキュメントを削除できませんでした")
+        self.stats['failed'] += len(ids)
+
+def ocr_page(service, docs_service, image_path, limiter=None, deleter=None, data=None):
+    """
+    1ページ分: アップロード & OCR → 段落の取得 → 削除。
+    段落のJSON文字列を返す (失敗時は None)。キャッシュにはこの形で保存される。
+    deleter: DeleteBatcher。指定すると削除はまとめて後で送る。
+    data: 画像のバイト列 (upload_image_for_ocr を参照)
+    """
+    doc_id = upload_image_for_ocr(service, image_path, limiter, data)
+    if not doc_id:
+        return None
+    try:
+        paragraphs = get_doc_paragraphs(docs_service, doc_id, limiter)
+        return None if paragraphs is None else json.dumps(paragraphs, ensure_ascii=False)
+    finally:
+        # 後始末の失敗で、取得できたページの結果や全体の処理を失わないように (どちらも例外を出さない)
+        if deleter:
+            deleter.add(doc_id)
+        else:
+            delete_file(service, doc_id, limiter)
+
+class DriveOCRBackend:
+    """
+    Google ドライブの変換機能によるOCR。結果は Docs API で段落ごとに取得し、
+    見出しを含むMarkdownにする。
+    service_factory / docs_factory: スレッドごとに Drive / Docs サービスを作る関数
+    (googleapiclient のサービスはスレッドセーフではないため)。
+    montage: 2以上なら、その枚数のページを縮小・グレースケールで縦に並べた1枚の画像
+    (ocr_montage) として送り、結果をページごとに分け直す。区切りがうまく読めなかった
+    まとまりは1ページずつOCRし直すので、結果は montage=1 と同じくページ順に揃う。
+    """
+    def __init__(self, service_factory, docs_factory, concurrency=CONCURRENCY, limiter=None,
+                 montage=MONTAGE_PAGES):
+        self.service_factory = service_factory
+        self.docs_factory = docs_factory
+        self.concurrency = concurrency
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.deleter = DeleteBatcher(service_factory, self.limiter)
+        self.montage = max(1, min(montage, MONTAGE_MAX_PAGES))
+        # モンタージュの結果は縮小画像のOCRなので、通常の結果とはキャッシュを分ける
+        self.key = OCR_BACKEND if self.montage == 1 else f"{OCR_BACKEND}:montage{self.montage}"
+        self.montage_stats = {'uploads': 0, 'pages': 0, 'fallbacks': 0, 'bytes': 0}
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self.instrument = None
+
+    def _ocr(self, image_path, data=None, stage='ocr_page'):
+        start = time.perf_counter()
+        if not hasattr(self._local, 'service'):
+            self._local.service = self.service_factory()
+            self._local.docs = self.docs_factory()
+        raw = ocr_page(self._local.service, self._local.docs, image_path, self.limiter, self.deleter, data)
+        if self.instrument:
+            self.instrument.observe(stage, time.perf_counter() - start)
+        return raw
+
+    def _count(self, **counts):
+        with self._stats_lock:
+            for name, n in counts.items():
+                self.montage_stats[name] += n
+
+    def _ocr_montage(self, image_paths):
+        """数ページをまとめてOCRし、ページごとの生データのリストを返す"""
+        from ocr_montage import build_montage, split_montage
+        if len(image_paths) == 1:
+            return [self._ocr(image_paths[0])]
+        start = time.perf_counter()
+        data = build_montage(image_paths)
+        if self.instrument:
+            self.instrument.observe('montage_build', time.perf_counter() - start)
+        if data is not None and len(data) > MONTAGE_MAX_BYTES:
+            half = (len(image_paths) + 1) // 2
+            return self._ocr_montage(image_paths[:half]) + self._ocr_montage(image_paths[half:])
+        pages = None
+        if data is not None:
+            name = "montage_" + os.path.basename(image_paths[0])
+            raw = self._ocr(name, data.tobytes(), stage='ocr_montage')
+            self._count(uploads=1, bytes=len(data))
+            if raw is not None:
+                pages = split_montage(json.loads(raw), len(image_paths))
+        if pages is None:
+            # 区切りが読めない・本文とつながったなど、分け方が確かでないときは1ページずつ
+            print(f"モンタージュを分割できないため1ページずつOCRします: {os.path.basename(image_paths[0])} ほか")
+            self._count(fallbacks=1)
+            return [self._ocr(path) for path in image_paths]
+        self._count(pages=len(image_paths))
+        return [json.dumps(page, ensure_ascii=False) for page in pages]
+
+    @staticmethod
+    def render(raw):
+        """キャッシュされた生データ (段落のJSON) からページのMarkdownを作る"""
+        return paragraphs_to_markdown(json.loads(raw))
+
+    def ocr_many(self, image_paths):
+        """
+        各画像の生テキスト (失敗時は None) を入力順に返す。
+        OCRSetupError (APIが無効など) はそのまま送出し、まだ始まっていないページは取り消す
+        """
+        futures = []
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as pool:
+                try:
+                    if self.montage > 1:
+                        batches = [image_paths[i:i + self.montage] for i in range(0, len(image_paths), self.montage)]
+                        futures = [pool.submit(self._ocr_montage, batch) for batch in batches]
+                        for future in futures:
+                            yield from future.result()
+                        return
+                    futures = [pool.submit(self._ocr, path) for path in image_paths]
+                    # 投入順に結果を待つので、完了順に関係なくページ順になる
+                    for future in futures:
+                        yield future.result()
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            start = time.perf_counter()
+            self.deleter.flush()
+            if self.instrument:
+                self.instrument.observe('delete_flush', time.perf_counter() - start)
+
+    def report(self):
+        stats = self.limiter.stats
+        print(f"API呼び出し: {stats['calls']} 回 (削除バッチ {self.deleter.stats['batches']} 回で "
+              f"{self.deleter.stats['deleted']} 件), 制限による待機: {stats['throttled']} 回, "
+              f"最終レート: {self.limiter.rate:.2f} 回/秒")
+        if self.deleter.stats['failed']:
+            print(f"削除できなかった一時ドキュメント: {self.deleter.stats['failed']} 件 (ドライブから手動で削除してください)")
+        if self.montage > 1:
+            m = self.montage_stats
+            print(f"モンタージュ: {m['uploads']} 回のアップロードで {m['pages']} ページ "
+                  f"({m['bytes'] / 1000 / 1000:.1f} MB), 1ページずつにやり直し: {m['fallbacks']} 回")
+
+def process_images(image_paths, output_file, backend, cache=None, instrument=None):
+    """
+    backend で全ページをOCRし、結果はページ順に output_file へ書き込む。
+    backend: DriveOCRBackend / tesseract_ocr.TesseractOCRBackend など
+    (key 属性、入力順に生データを返す ocr_many(paths)、生データをテキストにする render(raw) を持つもの)。
+    cache: OCRCache。キャッシュ済みのページはOCRせず、整形 (render) だけやり直す。
+    instrument: instrument.Instrumentation。工程ごとの時間を記録する (省略時は記録のみで出力しない)
+    戻り値: 整形済みテキストのページごとのリスト (失敗したページは None)
+    """
+    instr = instrument or Instrumentation('ocr')
+    backend.instrument = instr  # ページごとのOCR時間 ('ocr_page') を backend 側で記録
+    total = len(image_paths)
+    key = backend.key if cache else None
+    with instr.stage('cache_lookup'):
+        hashes = [page_digest(path) for path in image_paths] if cache else [None] * total
+        cached = [cache.get(h, key) for h in hashes] if cache else [None] * total
+    todo = [path for path, raw in zip(image_paths, cached) if raw is None]
+    instr.count('pages', total)
+    instr.count('cache_hits', total - len(todo))
+    if cache:
+        print(f"キャッシュ済み {total - len(todo)} ページ, OCR対象 {len(todo)} ページ")
+    results = backend.ocr_many(todo)
+
+    texts = []
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for i, (image_path, image_hash, raw) in enumerate(zip(image_paths, hashes, cached)):
+                if raw is None:
+                    # 次のページの結果待ち (並列処理が追いついていない時間)
+                    with instr.stage('wait'):
+                        raw = next(results)
+                    if raw is None:
+                        instr.count('failed')
+                        texts.append(None)
+                        continue
+                    if cache:
+                        with instr.stage('cache_put'):
+                            cache.put(image_hash, key, raw)
+                    print(f"処理済み ({i+1}/{total}): {os.path.basename(image_path)}")
+                with instr.stage('render'):
+                    text = backend.render(raw)
+                texts.append(text)
+                with instr.stage('write'):
+                    f.write(text)
+                    f.write("\n\n") # ページ間の区切り
+    finally:
+        results.close()  # backend の後始末 (まとめて送る削除など) をここで確実に実行
+
+    if hasattr(backend, 'report'):
+        backend.report()
+    if cache:
+        entries, size = cache.summary()
+        print(f"OCRキャッシュ: ヒット {cache.stats['hits']} / ミス {cache.stats['misses']}, "
+              f"削除 {cache.stats['evicted']}, {entries} 件 ({size / 1000 / 1000:.1f} MB)")
+    return texts
+
+def add_arguments(parser):
+    """OCRのコマンドライン引数 (cli.py の ocr サブコマンドと共通)"""
+    parser.add_argument('--images', default=IMAGE_DIR, help="画像フォルダ (既定: %(default)s)")
+    parser.add_argument('--book', default=BOOK_ID,
+                        help="本のタイトル (省略時は最後にキャプチャした本)")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="出力するMarkdownファイル (既定: %(default)s)")
+    parser.add_argument('--auto-crop', action='store_true', default=AUTO_CROP,
+                        help="余白を自動トリミングしてからOCR (転送量削減)")
+    parser.add_argument('--backend', choices=('drive', 'tesseract'), default=OCR_ENGINE,
+                        help="drive: Google ドライブ (要認証), tesseract: ローカルのTesseract (オフライン)")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="同時に処理するページ数 (drive の既定は %d, tesseract の既定はCPUコア数)" % CONCURRENCY)
+    parser.add_argument('--montage', type=int, default=MONTAGE_PAGES, metavar='N',
+                        help="drive: N ページ (2〜%d) を1枚の画像にまとめてOCRし、API呼び出しを約 1/N にする" % MONTAGE_MAX_PAGES)
+    parser.add_argument('--layout', choices=('auto', 'vertical', 'horizontal'), default='auto',
+                        help="tesseract の文字方向 (auto: ページごとに縦書き/横書きを判定)")
+    parser.add_argument('--stub', action='store_true', help="Google Driveの代わりにローカルのスタブを使う (動作確認用)")
+    parser.add_argument('--no-cache', action='store_true', help="OCRキャッシュを使わずに全ページを処理し直す")
+    parser.add_argument('--pdf', action='store_true',
+                        help="OCRテキストから軽量なテキストPDFも作成する (output_pdfs/<タイトル>_text_part1.pdf)")
+    parser.add_argument('--pdf-images', action='store_true', help="テキストPDFに縮小したページ画像も入れる")
+    parser.add_argument('--report', default=REPORT_FILE, help="工程ごとの処理時間レポート (JSON) の出力先")
+    parser.add_argument('--profile', action='store_true', help="cProfile でプロファイルも取る (レポートと同じ場所に .prof)")
+    return parser
+
+def list_images(image_dir, book_id=None):
+    """
+    処理対象の画像をページ順に返す。本のタイトルがあればその本のページ
+    (ページアーカイブ・ページストア・キャプチャ記録の順に探す)。
+    タイトルがなければ最後にキャプチャした本 (フォルダ直下のPNGの方が新しければそちら)。
+    """
+    if book_id:
+        return book_pages(image_dir, book_id)
+    pages = loose_pages(image_dir)
+    latest = latest_book(image_dir)
+    if latest and (not pages or latest[1] > max(os.path.getmtime(p) for p in pages)):
+        print(f"--book の指定がないため、最後にキャプチャした本「{latest[0]}」を処理します")
+        return book_pages(image_dir, latest[0])
+    return pages
+
+def run(args):
+    """add_arguments の引数でOCRを実行する。成功したら True"""
+    use_drive = args.backend == 'drive'
+    if use_drive and not args.stub and not os.path.exists(CREDENTIALS_FILE):
         print(f"エラー: {CREDENTIALS_FILE} が見つかりません。Google Cloud Consoleからダウンロードしてください。")
-        return
+        return False
 
-    if not os.path.exists(IMAGE_DIR):
-        print(f"エラー: 画像フォルダ {IMAGE_DIR} が見つかりません。capture.pyを実行してください。")
-        return
+    if not os.path.exists(args.images):
+        print(f"エラー: 画像フォルダ {args.images} が見つかりません。capture.pyを実行してください。")
+        return False
 
-    service = get_drive_service()
+    if not use_drive:
+        from tesseract_ocr import TesseractOCRBackend
+        backend = TesseractOCRBackend(workers=args.concurrency, layout=args.layout)
+        error = backend.check()
+        if error:
+            print(f"エラー: {error}")
+            return False
+        concurrency = backend.workers
+    else:
+        if args.stub:
+            from drive_stub import StubDriveService
+            service_factory = docs_factory = StubDriveService
+        else:
+            creds = get_credentials()
+            service_factory = lambda: get_drive_service(creds)
+            docs_factory = lambda: get_docs_service(creds)
+        concurrency = args.concurrency or CONCURRENCY
+        backend = DriveOCRBackend(service_factory, docs_factory, concurrency, montage=args.montage)
     
     # 画像ファイルリストを取得してソート
-    images = sorted([f for f in os.listdir(IMAGE_DIR) if f.endswith('.png')])
+    image_paths = list_images(args.images, args.book)
     
-    if not images:
-        print("処理対象の画像がありません。")
-        return
-
-    print(f"{len(images)} 枚の画像を処理します...")
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        for i, image_name in enumerate(images):
-            image_path = os.path.join(IMAGE_DIR, image_name)
-            print(f"処理中 ({i+1}/{len(images)}): {image_name}")
-            
-            # 1. アップロード & OCR
-            doc_id = upload_image_for_ocr(service, image_path)
-            if not doc_id:
-                continue
-            
-            # 2. テキスト抽出
-            text = get_text_from_doc(service, doc_id)
-            
-            # 3. 書き込み (ページ番号などのゴミ除去)
-            lines = text.split('\n')
-            cleaned_lines = []
-            for line in lines:
-                stripped = line.strip()
-                # ページ番号や画像のゴミを除去
-                if stripped.startswith("Page ") and len(stripped) < 10:
-                    continue
-                if stripped == "________________":
-                    continue
-                if not stripped: # 空行はそのまま保持するか、調整する
-                    cleaned_lines.append("")
-                    continue
-                cleaned_lines.append(line)
-            
-            f.write("\n".join(cleaned_lines))
-            f.write("\n\n") # ページ間の区切り
-            
-            # 4. クリーンアップ
-            delete_file(service, doc_id)
-            
-            # API制限対策のウェイト
-            time.sleep(1)
-
-    print(f"完了しました。出力先: {OUTPUT_FILE}")
+    if not image_paths:
+        if args.book:
+            print(f"エラー: 本「{args.book}」のページが {args.images} にありません。タイトルを確認してください。")
+        else:
+            print(f"エラー: {args.images} に処理対象の画像がありません。--book で本のタイトルを指定してください。")
+        return False
+
+    print(f"{len(image_paths)} 枚の画像を処理します ({args.backend}, 同時 {concurrency} ページ)...")
+
+    crop_dir = None
+    if args.auto_crop:
+        from auto_crop import auto_crop_book
+        crop_dir = tempfile.mkdtemp(prefix="crop_")
+        image_paths = auto_crop_book(image_paths, crop_dir)
+
+    cache = None
+    if not args.no_cache and not args.stub:
+        from ocr_cache import OCRCache
+        cache = OCRCache(CACHE_FILE, CACHE_MAX_MB * 1000 * 1000)
+
+    start = time.time()
+    instr = Instrumentation('ocr', profile=args.profile, settings={
+        'backend': args.backend, 'concurrency': concurrency, 'pages': len(image_paths),
+        'cache': cache is not None, 'auto_crop': args.auto_crop,
+        'montage': args.montage if use_drive else 1,
+    })
+    try:
+        texts = process_images(image_paths, args.output, backend, cache=cache, instrument=instr)
+    except OCRSetupError as e:
+        print(f"エラー: {e}")
+        if crop_dir:
+            shutil.rmtree(crop_dir, ignore_errors=True)
+        return False
+    finally:
+        if cache:
+            cache.close()
+    failed = texts.count(None)
+    print(instr.summary())
+    print(f"処理時間レポート: {instr.write_report(args.report)}")
+
+    if args.pdf or args.pdf_images:
+        from pdf_writer import PDFGenerator
+        PDFGenerator().generate_text(texts, args.book or os.path.splitext(os.path.basename(args.output))[0],
+                                     image_paths=image_paths if args.pdf_images else None)
+
+    if crop_dir:
+        shutil.rmtree(crop_dir, ignore_errors=True)
+
+    if failed:
+        print(f"{failed} ページの処理に失敗しました。")
+    print(f"完了しました ({time.time() - start:.1f} 秒)。出力先: {args.output}")
+    return failed < len(image_paths)
+
+def main():
+    import argparse
+    parser = add_arguments(argparse.ArgumentParser(description="キャプチャ画像をOCRでテキスト化します"))
+    run(parser.parse_args())
 
 if __name__ == '__main__':
     main()
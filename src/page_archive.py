@@ -0,0 +1,277 @@
+import hashlib
+import io
+import mmap
+import os
+import struct
+import threading
+
+from filenames import sanitize_filename
+from session_journal import file_digest
+
+ARCHIVE_EXT = ".pages"
+_MAGIC = b"KPGARC01"
+_FOOTER_MAGIC = b"KPGAEND1"
+_RECORD = struct.Struct('<4sI16s')  # tag, data length, blake2b digest of the data
+_ENTRY = struct.Struct('<QI16s')    # index entry: data offset, length, digest
+_FOOTER = struct.Struct('<Q8s')     # offset of the index record, magic
+_REF_SEP = "::"
+
+
+class PageArchive:
+    """
+    One file per book holding every encoded page, instead of thousands of
+    loose PNGs:
+
+        KPGARC01
+        PAGE <len> <digest> <png bytes>     one record per page, appended in order
+        ...
+        INDX <len> <0 * 16> <entries>       offset/length/digest of every page
+        <index offset> KPGAEND1             footer, written by close()
+
+    Pages are appended and flushed one by one, so readers (even in other
+    processes) see them as soon as append() returns. The index is rewritten
+    at the end by close(); reopening for append drops it and continues after
+    the last page, and a file without a valid footer (crash) is recovered by
+    walking the records, ignoring a torn last one. Reads go through a
+    read-only mmap, so random access to any page is a slice.
+
+    Pages are addressed elsewhere by reference strings "<archive path>::<index>"
+    (see page_ref), which can stand in for image paths throughout the
+    pipeline via open_page / read_image / page_digest.
+
+    mode: 'r' read, 'a' append (created if missing), 'w' start over.
+    """
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        self._entries = []  # (offset, length, digest)
+        self._scan_end = len(_MAGIC)
+        self._lock = threading.Lock()
+        self._mm = None
+        self._f = None
+        if mode in ('a', 'w'):
+            close_readers(path)  # a mapped file cannot be truncated or replaced on Windows
+        if mode == 'w' or (mode == 'a' and not os.path.exists(path)):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._f = open(path, 'w+b')
+            self._f.write(_MAGIC)
+            self._f.flush()
+        elif mode == 'a':
+            self._f = open(path, 'r+b')
+            self._load(self._f)
+            # Drop the old index (and any torn tail): new pages and a new index follow the last page
+            self._f.truncate(self._scan_end)
+            self._f.seek(self._scan_end)
+        elif mode == 'r':
+            with open(path, 'rb') as f:
+                self._load(f)
+        else:
+            raise ValueError(f"Invalid mode: {mode}")
+
+    # --- Loading ---
+
+    def _load(self, f):
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"Not a page archive: {self.path}")
+        size = f.seek(0, os.SEEK_END)
+        if size >= len(_MAGIC) + _FOOTER.size:
+            f.seek(size - _FOOTER.size)
+            index_offset, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if magic == _FOOTER_MAGIC and self._read_index(f, index_offset):
+                return
+        self._scan(f)
+
+    def _read_index(self, f, index_offset):
+        f.seek(index_offset)
+        header = f.read(_RECORD.size)
+        if len(header) < _RECORD.size:
+            return False
+        tag, length, _ = _RECORD.unpack(header)
+        data = f.read(length)
+        if tag != b'INDX' or len(data) != length or length % _ENTRY.size:
+            return False
+        self._entries = [_ENTRY.unpack_from(data, i) for i in range(0, length, _ENTRY.size)]
+        self._scan_end = index_offset
+        return True
+
+    def _scan(self, f):
+        """Walks the records from where the last scan stopped (recovery, or pages appended by a writer)."""
+        f.seek(self._scan_end)
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                break
+            tag, length, digest = _RECORD.unpack(header)
+            start = f.tell()
+            if tag not in (b'PAGE', b'INDX') or f.seek(length, os.SEEK_CUR) > os.fstat(f.fileno()).st_size:
+                break  # torn write at the end of a crashed session
+            if tag == b'PAGE':
+                self._entries.append((start, length, digest))
+            self._scan_end = start + length
+
+    # --- Writing ---
+
+    def append(self, data):
+        """Appends one encoded page (bytes-like). Returns its reference. Thread-safe."""
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        with self._lock:
+            offset = self._f.tell()
+            self._f.write(_RECORD.pack(b'PAGE', len(data), digest))
+            self._f.write(data)
+            self._f.flush()
+            self._entries.append((offset + _RECORD.size, len(data), digest))
+            self._scan_end = self._f.tell()
+            return page_ref(self.path, len(self._entries) - 1)
+
+    def close(self):
+        """Writes the index and footer (when writing) and releases the file."""
+        with self._lock:
+            self._unmap()
+            if self._f is not None:
+                index = b"".join(_ENTRY.pack(*entry) for entry in self._entries)
+                index_offset = self._f.tell()
+                self._f.write(_RECORD.pack(b'INDX', len(index), bytes(16)))
+                self._f.write(index)
+                self._f.write(_FOOTER.pack(index_offset, _FOOTER_MAGIC))
+                self._f.close()
+                self._f = None
+
+    # --- Reading ---
+
+    def __len__(self):
+        return len(self._entries)
+
+    def refs(self):
+        return [page_ref(self.path, i) for i in range(len(self._entries))]
+
+    def digest(self, index):
+        """Hex digest of a page's bytes; equals file_digest() of the same PNG as a loose file."""
+        return self._entry(index)[2].hex()
+
+    def size(self, index):
+        return self._entry(index)[1]
+
+    def read(self, index):
+        """Bytes of page `index` as a zero-copy memoryview of the mapped file."""
+        offset, length, _ = self._entry(index)
+        with self._lock:
+            if self._mm is None or len(self._mm) < offset + length:
+                # Map (again) to cover pages appended since the last mapping
+                self._unmap()
+                if self._f is not None:
+                    self._f.flush()
+                with open(self.path, 'rb') as f:
+                    self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(self._mm)[offset:offset + length]
+
+    def _unmap(self):
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # pages still being read keep the old mapping alive until they are released
+            self._mm = None
+
+    def _entry(self, index):
+        if index >= len(self._entries) and self.mode == 'r':
+            with self._lock, open(self.path, 'rb') as f:
+                self._scan(f)  # a writer may have appended since we loaded
+        return self._entries[index]
+
+
+def archive_path(root, book_id):
+    """Archive of a book: <root>/archives/<book_id>.pages"""
+    return os.path.join(root, "archives", sanitize_filename(book_id) + ARCHIVE_EXT)
+
+
+def page_ref(path, index):
+    return f"{path}{_REF_SEP}{index}"
+
+
+def parse_ref(ref):
+    """(archive path, index) for a page reference, or None for a plain file path."""
+    path, sep, index = ref.rpartition(_REF_SEP)
+    if not sep or not path.endswith(ARCHIVE_EXT) or not index.isdigit():
+        return None
+    return path, int(index)
+
+
+# Readers shared per process (worker processes open their own on first use)
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def _reader(path):
+    with _readers_lock:
+        archive = _readers.get(path)
+        if archive is None:
+            archive = _readers[path] = PageArchive(path)
+        return archive
+
+
+def close_readers(path=None):
+    """Unmaps cached readers (of one archive, or all), e.g. before deleting the file."""
+    with _readers_lock:
+        for key in [path] if path else list(_readers):
+            archive = _readers.pop(key, None)
+            if archive is not None:
+                archive.close()
+
+
+def delete_archive(path):
+    """Deletes a book's archive: one file instead of one per page."""
+    close_readers(path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# --- Page access for both plain image paths and archive references ---
+
+def open_page(path):
+    """Binary file object for a page (a loose file or an archive page)."""
+    parsed = parse_ref(path)
+    if parsed is None:
+        return open(path, 'rb')
+    return io.BytesIO(_reader(parsed[0]).read(parsed[1]))
+
+
+def read_image(path, flags=None):
+    """cv2.imread (default IMREAD_COLOR) that also understands archive references (None if unreadable)."""
+    import cv2  # imported here so ocr_processor / cli start without OpenCV
+    import numpy as np
+    if flags is None:
+        flags = cv2.IMREAD_COLOR
+    parsed = parse_ref(path)
+    if parsed is None:
+        return cv2.imread(path, flags)
+    try:
+        data = _reader(parsed[0]).read(parsed[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+
+
+def page_size(path):
+    parsed = parse_ref(path)
+    if parsed is None:
+        return os.path.getsize(path)
+    return _reader(parsed[0]).size(parsed[1])
+
+
+def page_exists(path):
+    parsed = parse_ref(path)
+    if parsed is None:
+        return os.path.exists(path)
+    try:
+        _reader(parsed[0]).size(parsed[1])
+    except (OSError, ValueError, IndexError):
+        return False
+    return True
+
+
+def page_digest(path):
+    """file_digest() of a page; archive pages carry it in their record."""
+    parsed = parse_ref(path)
+    if parsed is None:
+        return file_digest(path)
+    return _reader(parsed[0]).digest(parsed[1])
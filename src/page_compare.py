@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+from frame_buffer import SCRATCH, as_gray
+
+
+class PageComparator:
+    """
+    Cheap "did the page change?" check for the capture loop.
+
+    Every frame is reduced to a small grayscale thumbnail (one INTER_AREA
+    pass over a subset of rows, no full-size intermediate). Thumbnails that
+    clearly differ mean a new page. Only when thumbnails look alike, which in
+    practice means a real duplicate or the end of the book, the full-res
+    frames are compared to confirm, so a page is never dropped because two
+    pages of text happen to look alike when shrunk.
+
+    threshold: fraction of pixels that must be unchanged for a duplicate.
+        The remaining (1 - threshold) absorbs cursor and progress-bar noise.
+    pixel_tolerance: gray-level difference below which a pixel counts as unchanged.
+    ambiguity: thumbnails whose similarity is within this margin below
+        `threshold` are also confirmed at full resolution.
+    """
+    def __init__(self, threshold=0.99, thumb_width=160, pixel_tolerance=24, ambiguity=0.01):
+        self.threshold = threshold
+        self.thumb_width = thumb_width
+        self.pixel_tolerance = pixel_tolerance
+        self.ambiguity = ambiguity
+        self.full_checks = 0
+
+    def fingerprint(self, frame):
+        """Returns the grayscale thumbnail of a BGRA (or BGR) frame."""
+        img = np.asarray(frame)
+        h, w = img.shape[:2]
+        # Integer scale factor keeps INTER_AREA on its fast path. Reading only
+        # every (k // 2)-th row cuts memory traffic and still hits every line of text.
+        k = max(1, w // self.thumb_width)
+        tw, th = max(1, w // k), max(1, h // k)
+        small = cv2.resize(img[::max(1, k // 2)], (tw, th), interpolation=cv2.INTER_AREA)
+        code = cv2.COLOR_BGRA2GRAY if small.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(small, code)
+
+    def similarity(self, fp_a, fp_b):
+        """Fraction of thumbnail pixels that did not change (0.0 if shapes differ)."""
+        if fp_a is None or fp_b is None or fp_a.shape != fp_b.shape:
+            return 0.0
+        changed = np.count_nonzero(cv2.absdiff(fp_a, fp_b) > self.pixel_tolerance)
+        return 1 - changed / fp_a.size
+
+    def differs(self, fp_a, fp_b):
+        """Thumbnail-only check, used while polling for a page to finish drawing."""
+        return self.similarity(fp_a, fp_b) < self.threshold
+
+    def is_duplicate(self, frame, fp, prev_frame, prev_fp):
+        """Returns (is_duplicate, similarity) for `frame` against the previous page."""
+        similarity = self.similarity(fp, prev_fp)
+        if similarity < self.threshold - self.ambiguity:
+            return False, similarity
+        # Thumbnails look alike: confirm on the full-resolution frames
+        self.full_checks += 1
+        similarity = self._full_similarity(frame, prev_frame)
+        return similarity >= self.threshold, similarity
+
+    def _full_similarity(self, frame, prev_frame):
+        a = np.asarray(frame)
+        b = np.asarray(prev_frame)
+        if a.shape != b.shape:
+            return 0.0
+        # Grays, diff and mask all go to reused buffers: no full-size allocations per check
+        gray_a, gray_b = as_gray(a, 'compare_a'), as_gray(b, 'compare_b')
+        diff = cv2.absdiff(gray_a, gray_b, dst=SCRATCH.get('compare_diff', gray_a.shape))
+        cv2.threshold(diff, self.pixel_tolerance, 255, cv2.THRESH_BINARY, dst=diff)
+        changed = cv2.countNonZero(diff)
+        return 1 - changed / diff.size
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import shutil
+import threading
+
+from filenames import sanitize_filename
+
+SPLICE_OVERLAP = 3  # pages a new run must repeat from the end of a book to continue it
+
+
+class PageStore:
+    """
+    Content-addressed storage for captured pages.
+
+        <root>/blobs/ab/ab12...ef.png   one PNG per distinct page (key = pixel hash)
+        <root>/books/<book_id>.txt      ordered page hashes of a book, one per line
+
+    Identical pages, whether re-captured in a later run or shared between
+    overlapping runs, are stored once and never re-encoded. Several books
+    can live side by side; deleting a book only drops its index, and gc()
+    removes blobs no book refers to any more.
+    """
+    def __init__(self, root="captured_images"):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.book_dir = os.path.join(root, "books")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.book_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {'stored': 0, 'reused': 0}
+
+    @staticmethod
+    def frame_hash(frame):
+        """Hash of the raw pixels of a frame (BGRA array, mss ScreenShot or Frame)."""
+        # numpy / OpenCV are imported by the capture-side methods only, so reading a
+        # book's index (cli.py pdf) does not load them
+        import numpy as np
+        pixels = np.asarray(frame)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(np.asarray(pixels.shape, dtype=np.int64).tobytes())
+        if pixels.flags.c_contiguous:
+            h.update(memoryview(pixels).cast('B'))
+        else:
+            # e.g. half of a spread: hash row by row (same digest, no contiguous copy)
+            for row in pixels:
+                h.update(memoryview(np.ascontiguousarray(row)).cast('B'))
+        return h.hexdigest()
+
+    @staticmethod
+    def digest_of(path):
+        """Digest of a blob from its path."""
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest + ".png")
+
+    def put_frame(self, frame):
+        """Stores a frame (BGRA array, mss ScreenShot or Frame) unless already present. Returns (digest, path)."""
+        digest = self.frame_hash(frame)
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            with self._lock:
+                self.stats['reused'] += 1
+            return digest, path
+        from frame_buffer import write_png
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name so a crash never leaves a truncated blob behind
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        write_png(frame, tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats['stored'] += 1
+        return digest, path
+
+    # --- Book index ---
+
+    def _book_path(self, book_id):
+        return os.path.join(self.book_dir, sanitize_filename(book_id) + ".txt")
+
+    def books(self):
+        return sorted(f[:-4] for f in os.listdir(self.book_dir) if f.endswith(".txt"))
+
+    def book_hashes(self, book_id):
+        path = self._book_path(book_id)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def book_pages(self, book_id):
+        """Ordered PNG paths of a book."""
+        return [self.blob_path(d) for d in self.book_hashes(book_id)]
+
+    def append_page(self, book_id, digest):
+        with self._lock:
+            with open(self._book_path(book_id), 'a', encoding='utf-8') as f:
+                f.write(digest + "\n")
+
+    def splice_point(self, book_id, digests, final=False, min_overlap=SPLICE_OVERLAP):
+        """
+        Where a new run whose first pages are `digests` continues the book.
+        The run overlaps the book from position p when every page from p to
+        the end of the book comes back, in order, at the start of the run, and
+        there are at least min_overlap of them (one matching page proves
+        nothing: blank and separator pages repeat). Returns the smallest such
+        p, len(book) when there is no overlap (the run is appended), or None
+        while a longer overlap is still possible and more pages are to come
+        (final=False).
+        """
+        hashes = self.book_hashes(book_id)
+        undecided = False
+        for p in range(len(hashes) - min_overlap + 1):
+            tail = hashes[p:]
+            if tail[:len(digests)] != digests[:len(tail)]:
+                continue
+            if len(digests) < len(tail):
+                undecided = True
+            elif not undecided or final:
+                return p
+            else:
+                return None
+        return None if undecided and not final else len(hashes)
+
+    def splice_book(self, book_id, keep, digests):
+        """
+        Keeps the first `keep` pages of a book's index and appends `digests`.
+        The index is replaced atomically, so a crash leaves either version.
+        """
+        hashes = self.book_hashes(book_id)[:keep] + list(digests)
+        path = self._book_path(book_id)
+        with self._lock:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(d + "\n" for d in hashes)
+            os.replace(tmp_path, path)
+
+    def delete_book(self, book_id):
+        path = self._book_path(book_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def gc(self):
+        """Deletes blobs not referenced by any book. Returns the number removed."""
+        referenced = set()
+        for book_id in self.books():
+            referenced.update(self.book_hashes(book_id))
+        removed = 0
+        for sub in os.listdir(self.blob_dir):
+            sub_dir = os.path.join(self.blob_dir, sub)
+            for name in os.listdir(sub_dir):
+                if name.split(".")[0] not in referenced:
+                    os.remove(os.path.join(sub_dir, name))
+                    removed += 1
+            if not os.listdir(sub_dir):
+                shutil.rmtree(sub_dir, ignore_errors=True)
+        return removed
@@ -1,55 +1,608 @@
 import os
-import img2pdf
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from PIL import Image
+
+# OpenCV / numpy are only needed by recompression and auto crop, and imported there,
+# so plain PDF building (cli.py pdf) starts without them
+from filenames import sanitize_filename
+from instrument import Instrumentation
+from page_archive import open_page, page_size
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+DEFAULT_DPI = 96.0  # Same default as img2pdf for images without resolution info
+
+# Everything needed to embed one image as a PDF image XObject
+ImagePayload = namedtuple("ImagePayload", ["width", "height", "colorspace", "bits", "filter", "decode_parms", "data"])
+
+
+def load_image_payload(path):
+    """
+    Reads an image file into an ImagePayload without recompressing if possible:
+    8-bit RGB/gray non-interlaced PNG (what mss writes) reuses the IDAT stream
+    with a PNG predictor, JPEG is embedded as-is, and single-strip CCITT G4
+    TIFF is embedded as CCITTFaxDecode. Anything else is decoded with Pillow
+    and Flate-compressed. path may also be a page archive reference.
+    """
+    with open_page(path) as f:
+        head = f.read(8)
+        if head == PNG_SIGNATURE:
+            payload = _read_png(f)
+            if payload is not None:
+                return payload
+        elif head[:4] in (b'II*\x00', b'MM\x00*'):
+            payload = _read_g4_tiff(f)
+            if payload is not None:
+                return payload
+        elif head[:3] == b'\xff\xd8\xff':
+            f.seek(0)
+            with Image.open(f) as img:
+                if img.mode in ('RGB', 'L'):
+                    f.seek(0)
+                    colorspace = '/DeviceRGB' if img.mode == 'RGB' else '/DeviceGray'
+                    return ImagePayload(img.width, img.height, colorspace, 8, '/DCTDecode', None, f.read())
+        f.seek(0)
+        return _read_generic(f)
+
+
+def _read_png(f):
+    chunks = []
+    header = None
+    while True:
+        length_type = f.read(8)
+        if len(length_type) < 8:
+            break
+        length, ctype = struct.unpack('>I4s', length_type)
+        if ctype == b'IDAT':
+            chunks.append(f.read(length))
+            f.seek(4, os.SEEK_CUR)  # CRC
+        elif ctype == b'IHDR':
+            header = struct.unpack('>IIBBBBB', f.read(length))
+            f.seek(4, os.SEEK_CUR)
+        elif ctype == b'IEND':
+            break
+        else:
+            f.seek(length + 4, os.SEEK_CUR)
+    if header is None:
+        return None
+    width, height, bits, color_type, _, _, interlace = header
+    if bits != 8 or interlace != 0 or color_type not in (0, 2):
+        return None  # palette / alpha / 16-bit / interlaced: decode instead
+    colors = 3 if color_type == 2 else 1
+    colorspace = '/DeviceRGB' if colors == 3 else '/DeviceGray'
+    parms = f"<< /Predictor 15 /Colors {colors} /BitsPerComponent 8 /Columns {width} >>"
+    return ImagePayload(width, height, colorspace, 8, '/FlateDecode', parms, b''.join(chunks))
+
+
+def _read_g4_tiff(f):
+    f.seek(0)
+    with Image.open(f) as img:
+        tags = img.tag_v2
+        offsets, counts = tags.get(273), tags.get(279)
+        if tags.get(259) != 4 or not offsets or len(offsets) != 1:
+            return None  # not G4, or several strips that cannot be concatenated
+        width, height = img.width, img.height
+        # PhotometricInterpretation 1 (BlackIsZero) means coded "black" runs are white pixels
+        black_is_1 = 'true' if tags.get(262) == 1 else 'false'
+    f.seek(offsets[0])
+    data = f.read(counts[0])
+    parms = f"<< /K -1 /Columns {width} /Rows {height} /BlackIs1 {black_is_1} >>"
+    return ImagePayload(width, height, '/DeviceGray', 1, '/CCITTFaxDecode', parms, data)
+
+
+def _read_generic(f):
+    with Image.open(f) as img:
+        img = img.convert('L' if img.mode in ('1', 'L', 'LA') else 'RGB')
+        colorspace = '/DeviceGray' if img.mode == 'L' else '/DeviceRGB'
+        return ImagePayload(img.width, img.height, colorspace, 8, '/FlateDecode', None, zlib.compress(img.tobytes(), 6))
+
+
+def analyze_page(rgb, color_threshold=0.01, bilevel_max_midtones=0.06):
+    """
+    Picks the cheapest representation for a page from its pixels.
+    Returns 'jpeg' (noticeable color), 'bilevel' (black text on white, only
+    anti-aliasing in between) or 'gray' (grayscale illustrations/photos).
+    """
+    import cv2
+    import numpy as np
+    chroma = rgb.max(axis=2) - rgb.min(axis=2)
+    if np.count_nonzero(chroma > 32) > color_threshold * chroma.size:
+        return 'jpeg'
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    hist = np.bincount(gray.ravel(), minlength=256)
+    if hist[48:208].sum() <= bilevel_max_midtones * gray.size:
+        return 'bilevel'
+    return 'gray'
+
+
+def recompress_page(src_path, dst_base, jpeg_quality=80, color_threshold=0.01, bilevel_max_midtones=0.06):
+    """
+    Writes src_path in its cheapest suitable form next to dst_base
+    (dst_base + '.tif' G4, '.png' 8-bit gray, or '.jpg') and returns (path, kind).
+    Runs in a worker process.
+    """
+    import cv2
+    import numpy as np
+    with open_page(src_path) as f, Image.open(f) as img:
+        rgb = np.asarray(img.convert('RGB'))
+    kind = analyze_page(rgb, color_threshold, bilevel_max_midtones)
+    if kind == 'jpeg':
+        dst = dst_base + '.jpg'
+        Image.fromarray(rgb).save(dst, 'JPEG', quality=jpeg_quality, optimize=True)
+        return dst, kind
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    if kind == 'bilevel':
+        _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        dst = dst_base + '.tif'
+        # One strip for the whole page so the G4 data can be embedded as a single stream
+        Image.fromarray(bw).convert('1').save(dst, 'TIFF', compression='group4', tiffinfo={278: bw.shape[0]})
+        return dst, kind
+    dst = dst_base + '.png'
+    cv2.imwrite(dst, gray, [cv2.IMWRITE_PNG_COMPRESSION, 6])
+    return dst, kind
+
+
+class PageRecompressor:
+    """
+    Parallel recompression stage run before PDF assembly.
+    Each page goes through recompress_page in a process pool (the analysis
+    and encoders are CPU bound); results are written to a temporary folder
+    and returned in input order.
+    """
+    def __init__(self, workers=None, jpeg_quality=80, color_threshold=0.01, bilevel_max_midtones=0.06):
+        self.workers = workers or os.cpu_count() or 1
+        self.jpeg_quality = jpeg_quality
+        self.color_threshold = color_threshold
+        self.bilevel_max_midtones = bilevel_max_midtones
+        self.stats = {}
+
+    def process(self, image_paths, work_dir):
+        """Returns the recompressed file paths (same order as image_paths)."""
+        dst_bases = [os.path.join(work_dir, f"page_{i:05d}") for i in range(len(image_paths))]
+        n = len(image_paths)
+        settings = ([self.jpeg_quality] * n, [self.color_threshold] * n, [self.bilevel_max_midtones] * n)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(recompress_page, image_paths, dst_bases, *settings, chunksize=4))
+        kinds = [kind for _, kind in results]
+        self.stats = {
+            'pages': n,
+            'bilevel': kinds.count('bilevel'),
+            'gray': kinds.count('gray'),
+            'jpeg': kinds.count('jpeg'),
+            'bytes_in': sum(page_size(p) for p in image_paths),
+            'bytes_out': sum(os.path.getsize(p) for p, _ in results),
+        }
+        print(f"Recompressed {n} pages: {self.stats['bilevel']} bilevel, {self.stats['gray']} gray, "
+              f"{self.stats['jpeg']} jpeg, {self.stats['bytes_in'] / 1e6:.1f} MB -> {self.stats['bytes_out'] / 1e6:.1f} MB")
+        return [p for p, _ in results]
+
+
+class _CountingSink:
+    """File stand-in for dry runs: counts bytes instead of writing them."""
+    def __init__(self):
+        self._pos = 0
+
+    def write(self, data):
+        self._pos += len(data)
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        pass
+
+
+class _DataSize:
+    """Placeholder for image data of known length, used when planning splits."""
+    def __init__(self, length):
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+
+class StreamingPDFWriter:
+    """
+    Writes a PDF one page at a time straight to disk.
+    Only the page being added is held in memory; the page tree, xref table
+    and trailer are written by close().
+
+    The exact size of the finished file is known at every step (see
+    size_with), so callers can split at a hard byte limit. With path=None
+    nothing is written and only sizes are tracked.
+    """
+    def __init__(self, path, dpi=DEFAULT_DPI):
+        self.path = path
+        self.dpi = dpi
+        self.page_count = 0
+        self._f = open(path, 'wb') if path else _CountingSink()
+        self._offsets = {}
+        self._page_ids = []
+        self._kids_len = 0  # length of the "/Kids [...]" contents written on close
+        self._next_id = 3  # 1: catalog, 2: page tree (both written on close)
+        self._f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    @property
+    def size(self):
+        """Bytes written so far."""
+        return self._f.tell()
+
+    def final_size(self):
+        """Exact size of the file if it were closed now."""
+        return self._closing_size(self.size, self.page_count, self._kids_len, self._next_id)
+
+    def size_with(self, payload):
+        """Exact size of the file if `payload` were added and then the file closed."""
+        return self._size_with_pages([self._page_objects(payload, self._next_id)])
+
+    def add_image(self, path):
+        self.add_payload(load_image_payload(path))
+
+    def add_payload(self, payload):
+        self._add_pages([self._page_objects(payload, self._next_id)])
+
+    def _size_with_pages(self, pages):
+        """
+        Exact final size after adding `pages`: a list of [(obj_id, [chunks]), ...]
+        per page with consecutive ids starting at _next_id, page object last.
+        """
+        size, kids_len, page_count = self.size, self._kids_len, self.page_count
+        for objects in pages:
+            size += sum(len(part) for _, parts in objects for part in parts)
+            kids_len += len(f"{objects[-1][0]} 0 R") + (1 if page_count else 0)
+            page_count += 1
+        return self._closing_size(size, page_count, kids_len, pages[-1][-1][0] + 1)
+
+    def _add_pages(self, pages):
+        for objects in pages:
+            for obj_id, parts in objects:
+                self._offsets[obj_id] = self._f.tell()
+                for part in parts:
+                    self._f.write(part)
+            page_id = objects[-1][0]
+            self._kids_len += len(f"{page_id} 0 R") + (1 if self.page_count else 0)
+            self._next_id = page_id + 1
+            self._page_ids.append(page_id)
+            self.page_count += 1
+
+    def _page_objects(self, payload, first_id):
+        """Serialized (obj_id, [chunks]) for the image, content stream and page objects."""
+        image_id, content_id, page_id = first_id, first_id + 1, first_id + 2
+        w_pt = payload.width * 72.0 / self.dpi
+        h_pt = payload.height * 72.0 / self.dpi
+
+        parms = f" /DecodeParms {payload.decode_parms}" if payload.decode_parms else ""
+        image = self._stream_chunks(image_id,
+                                    f"<< /Type /XObject /Subtype /Image /Width {payload.width} /Height {payload.height}"
+                                    f" /ColorSpace {payload.colorspace} /BitsPerComponent {payload.bits}"
+                                    f" /Filter {payload.filter}{parms} /Length {len(payload.data)} >>",
+                                    payload.data)
+        content = f"q {w_pt:.4f} 0 0 {h_pt:.4f} 0 0 cm /Im0 Do Q".encode('ascii')
+        content_obj = self._stream_chunks(content_id, f"<< /Length {len(content)} >>", content)
+        page = self._object_chunks(page_id,
+                                   f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w_pt:.4f} {h_pt:.4f}]"
+                                   f" /Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>")
+        return [(image_id, image), (content_id, content_obj), (page_id, page)]
+
+    @staticmethod
+    def _closing_size(size, page_count, kids_len, count):
+        # Mirrors close(): page tree, catalog, xref table (20 bytes per entry), trailer
+        pages = len("2 0 obj\n<< /Type /Pages /Kids [") + kids_len + len(f"] /Count {page_count} >>\nendobj\n")
+        catalog = len("1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+        xref_offset = size + pages + catalog
+        xref = len(f"xref\n0 {count}\n") + 20 * count
+        trailer = len(f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        return xref_offset + xref + trailer
+
+    def close(self):
+        kids = " ".join(f"{i} 0 R" for i in self._page_ids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        self._write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        xref_offset = self._f.tell()
+        count = self._next_id
+        lines = [f"xref\n0 {count}\n", "0000000000 65535 f \n"]
+        lines += [f"{self._offsets[i]:010d} 00000 n \n" for i in range(1, count)]
+        lines.append(f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._f.write("".join(lines).encode('ascii'))
+        self._f.close()
+
+    def abort(self):
+        """Closes and deletes an unfinished file."""
+        self._f.close()
+        os.remove(self.path)
+
+    def _write_object(self, obj_id, body):
+        self._offsets[obj_id] = self._f.tell()
+        for part in self._object_chunks(obj_id, body):
+            self._f.write(part)
+
+    @staticmethod
+    def _object_chunks(obj_id, body):
+        return [f"{obj_id} 0 obj\n{body}\nendobj\n".encode('ascii')]
+
+    @staticmethod
+    def _stream_chunks(obj_id, dictionary, data):
+        return [f"{obj_id} 0 obj\n{dictionary}\nstream\n".encode('ascii'), data, b"\nendstream\nendobj\n"]
+
+
 class PDFGenerator:
     def __init__(self, output_dir="output_pdfs"):
         self.output_dir = output_dir
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
+        # Part sizes are exact (see StreamingPDFWriter.size_with)
         self.max_size_bytes = 190 * 1024 * 1024  # 190 MB (keeping safety margin for 200MB limit)
+        self.recompressor = PageRecompressor()
+        # Per-stage timings of the last generate() (see instrument.py); JSON reports go to
+        # report_dir when set, profile=True adds cProfile data
+        self.report_dir = None
+        self.profile = False
+        self.instrument = None
 
-    def generate(self, image_paths, title, author=""):
+    def base_filename(self, title, author=""):
+        base_filename = f"{title}_{author}" if author else title
+        # Sanitize filename
+        return sanitize_filename(base_filename)
+
+    def generate(self, image_paths, title, author="", balance=False, recompress=False, auto_crop=False):
+        """
+        Writes image_paths into as few PDF parts as fit under max_size_bytes.
+        Parts are planned from a sizing pass over all images (page data is
+        embedded as-is, so its length is known without decoding) with the
+        exact sizes of StreamingPDFWriter, which then writes each part one
+        page at a time: no part is held in memory or written twice.
+        balance: keep the same number of parts but make them similar in size.
+        recompress: convert each page to bilevel G4 / grayscale / JPEG first
+            (see PageRecompressor); the split sizes account for the result.
+        auto_crop: trim the book's blank margins first (see auto_crop.py).
+        """
         if not image_paths:
             print("No images to convert.")
             return []
 
-        base_filename = f"{title}_{author}" if author else title
-        # Sanitize filename
-        base_filename = "".join([c for c in base_filename if c.isalpha() or c.isdigit() or c in (' ', '-', '_')]).rstrip()
-        
-        pdf_files = []
-        current_batch = []
-        current_batch_size = 0
-        part_num = 1
+        instr = self.instrument = Instrumentation('pdf', profile=self.profile, settings={
+            'pages': len(image_paths), 'balance': balance, 'recompress': recompress,
+            'auto_crop': auto_crop, 'max_size_bytes': self.max_size_bytes,
+        })
+        try:
+            return self._generate(image_paths, title, author, balance, recompress, auto_crop)
+        finally:
+            instr.finish()
+            print(instr.summary())
+            if self.report_dir:
+                try:
+                    print(f"PDF report: {instr.write_report(instr.default_report_path(self.report_dir))}")
+                except OSError as e:
+                    print(f"Failed to write PDF report: {e}")
+
+    def _generate(self, image_paths, title, author, balance, recompress, auto_crop):
+        instr = self.instrument
+        if auto_crop:
+            from auto_crop import auto_crop_book
+            work_dir = tempfile.mkdtemp(prefix="crop_", dir=self.output_dir)
+            try:
+                with instr.stage('auto_crop'):
+                    pages = auto_crop_book(image_paths, work_dir)
+                return self._generate(pages, title, author, balance, recompress, False)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        if recompress:
+            work_dir = tempfile.mkdtemp(prefix="recompress_", dir=self.output_dir)
+            try:
+                with instr.stage('recompress'):
+                    pages = self.recompressor.process(image_paths, work_dir)
+                return self._generate(pages, title, author, balance, False, False)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
 
+        # Sizing pass: only the length of each page's image data is kept
+        paths, sized = [], []
         for img_path in image_paths:
             try:
-                size = os.path.getsize(img_path)
-                # If adding this image exceeds limit, write current batch first
-                if current_batch and (current_batch_size + size > self.max_size_bytes):
-                    self._write_pdf(current_batch, base_filename, part_num, pdf_files)
-                    current_batch = []
-                    current_batch_size = 0
-                    part_num += 1
-                
-                current_batch.append(img_path)
-                current_batch_size += size
-            except OSError as e:
+                with instr.stage('size_pass'):
+                    payload = load_image_payload(img_path)
+            except (OSError, ValueError) as e:
                 print(f"Error accessing file {img_path}: {e}")
+                continue
+            paths.append(img_path)
+            sized.append(payload._replace(data=_DataSize(len(payload.data))))
+        if not paths:
+            return []
 
-        # Write remaining
-        if current_batch:
-            self._write_pdf(current_batch, base_filename, part_num, pdf_files)
+        with instr.stage('plan'):
+            parts = self.plan_parts(sized, balance=balance)
+        base_name = self.base_filename(title, author)
+        pdf_files = []
+        for start, end in parts:
+            path = self.part_path(base_name, len(pdf_files) + 1)
+            # Pages are streamed to disk one at a time; the plan used the same writer's exact sizes
+            with instr.stage('write'):
+                try:
+                    writer = StreamingPDFWriter(path)
+                except OSError as e:
+                    print(f"Failed to create PDF {path}: {e}")
+                    continue
+                try:
+                    for img_path in paths[start:end]:
+                        writer.add_image(img_path)
+                    writer.close()
+                except (OSError, ValueError) as e:
+                    print(f"Failed to create PDF {path}: {e}")
+                    writer.abort()
+                    continue
+            size = os.path.getsize(path)
+            if size > self.max_size_bytes:
+                print(f"Warning: {paths[start]} alone exceeds the PDF size limit")
+            pdf_files.append(path)
+            print(f"Created PDF: {path} ({size / 1e6:.1f} MB)")
+        return pdf_files
 
+    def generate_text(self, page_texts, title, author="", image_paths=None, headings=True):
+        """
+        Text-first output: builds the PDF from OCR text instead of page images
+        (see text_pdf.TextPDFWriter), typically a few KB per page.
+        page_texts: text of each book page in order (None for pages without text).
+        image_paths: optional page images, same order; each page then shows a
+            downscaled scan with the text laid over it invisibly.
+        headings: print "p. N" at the top of each page.
+        """
+        from text_pdf import TextPDFWriter, preview_payload
+
+        base_name = self.base_filename(title, author) + "_text"
+        pdf_files = []
+        writer = None
+        part_num = 0
+        for i, text in enumerate(page_texts):
+            image = preview_payload(image_paths[i]) if image_paths else None
+            if text is None and image is None:
+                continue
+            text = text or ""
+            heading = f"p. {i + 1}" if headings else None
+            if writer and writer.page_count and \
+                    writer.size_with_text(text, heading, image) > self.max_size_bytes:
+                writer.close()
+                pdf_files.append(writer.path)
+                writer = None
+            if writer is None:
+                part_num += 1
+                writer = TextPDFWriter(self.part_path(base_name, part_num))
+            writer.add_text_page(text, heading, image)
+        if writer is None:
+            print("No pages to convert.")
+            return []
+        writer.close()
+        pdf_files.append(writer.path)
+        for path in pdf_files:
+            print(f"Created PDF: {path} ({os.path.getsize(path) / 1e6:.2f} MB)")
         return pdf_files
 
-    def _write_pdf(self, images, base_name, part_num, pdf_files_list):
-        output_path = os.path.join(self.output_dir, f"{base_name}_part{part_num}.pdf")
+    def plan_parts(self, payloads, balance=False):
+        """
+        Splits payloads (data may be a _DataSize) into [(start, end), ...] page ranges.
+        Greedy filling gives the minimum number of parts for the limit. With
+        balance, binary-search the smallest per-part cap that still needs no
+        more parts, which evens out the part sizes.
+        """
+        parts = self._greedy_parts(payloads, self.max_size_bytes)
+        if not balance or len(parts) < 2:
+            return parts
+        low = max(self._part_size(payloads[i:i + 1]) for i in range(len(payloads)))
+        high = self.max_size_bytes
+        while low < high:
+            cap = (low + high) // 2
+            if len(self._greedy_parts(payloads, cap)) <= len(parts):
+                high = cap
+            else:
+                low = cap + 1
+        return self._greedy_parts(payloads, high)
+
+    @staticmethod
+    def _greedy_parts(payloads, limit):
+        parts = []
+        start = 0
+        writer = StreamingPDFWriter(None)
+        for i, payload in enumerate(payloads):
+            if writer.page_count and writer.size_with(payload) > limit:
+                parts.append((start, i))
+                start = i
+                writer = StreamingPDFWriter(None)
+            writer.add_payload(payload)
+        parts.append((start, len(payloads)))
+        return parts
+
+    @staticmethod
+    def _part_size(payloads):
+        writer = StreamingPDFWriter(None)
+        for payload in payloads:
+            writer.add_payload(payload)
+        return writer.final_size()
+
+    def open_stream(self, title, author="", recompress=False):
+        """
+        Returns a PDFStream that appends pages to the output as they arrive,
+        e.g. from CaptureEngine's on_page_saved callback during capture.
+        recompress: recompress each page as it arrives (in the calling thread).
+        """
+        return PDFStream(self, self.base_filename(title, author), recompress=recompress)
+
+    def part_path(self, base_name, part_num):
+        return os.path.join(self.output_dir, f"{base_name}_part{part_num}.pdf")
+
+
+class PDFStream:
+    """
+    Incrementally built, size-split PDF output.
+    add_page() writes the page to the current part right away, so memory use
+    stays at about one page and the PDF is done moments after the last page.
+    """
+    def __init__(self, generator, base_name, recompress=False):
+        self.generator = generator
+        self.base_name = base_name
+        self.recompress = recompress
+        self.pdf_files = []
+        self._writer = None
+        self._part_num = 0
+        self._lock = threading.Lock()
+        self._work_dir = tempfile.mkdtemp(prefix="recompress_", dir=generator.output_dir) if recompress else None
+        self.instrument = None  # optional Instrumentation: 'load' and 'write' per page
+
+    def _load(self, img_path):
+        if not self.recompress:
+            return load_image_payload(img_path)
+        rc = self.generator.recompressor
+        tmp_path, _ = recompress_page(img_path, os.path.join(self._work_dir, "page"),
+                                      rc.jpeg_quality, rc.color_threshold, rc.bilevel_max_midtones)
+        try:
+            return load_image_payload(tmp_path)
+        finally:
+            os.remove(tmp_path)
+
+    def add_page(self, img_path):
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                payload = self._load(img_path)
+            except (OSError, ValueError) as e:
+                print(f"Error accessing file {img_path}: {e}")
+                return
+            loaded = time.perf_counter()
+            # If adding this page would push the finished part over the limit, finish the current part first
+            if self._writer and self._writer.page_count and \
+                    self._writer.size_with(payload) > self.generator.max_size_bytes:
+                self._finish_part()
+            if self._writer is None:
+                self._part_num += 1
+                self._writer = StreamingPDFWriter(self.generator.part_path(self.base_name, self._part_num))
+            self._writer.add_payload(payload)
+            if self.instrument:
+                self.instrument.observe('load', loaded - start)
+                self.instrument.observe('write', time.perf_counter() - loaded)
+            if self._writer.page_count == 1 and self._writer.final_size() > self.generator.max_size_bytes:
+                print(f"Warning: {img_path} alone exceeds the PDF size limit")
+
+    def close(self):
+        """Finishes the last part and returns the list of written PDF paths."""
+        with self._lock:
+            if self._writer is not None:
+                self._finish_part()
+            if self._work_dir:
+                shutil.rmtree(self._work_dir, ignore_errors=True)
+            return list(self.pdf_files)
+
+    def _finish_part(self):
+        writer, self._writer = self._writer, None
         try:
-            with open(output_path, "wb") as f:
-                f.write(img2pdf.convert(images))
-            pdf_files_list.append(output_path)
-            print(f"Created PDF: {output_path}")
+            writer.close()
+            self.pdf_files.append(writer.path)
+            print(f"Created PDF: {writer.path} ({os.path.getsize(writer.path) / 1e6:.1f} MB)")
         except Exception as e:
-            print(f"Failed to create PDF {output_path}: {e}")
+            print(f"Failed to create PDF {writer.path}: {e}")
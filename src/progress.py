@@ -0,0 +1,102 @@
+import collections
+import queue
+import time
+
+
+class ThroughputMeter:
+    """Pages per minute over a sliding window, and the time left for a known page total."""
+    def __init__(self, window=60.0):
+        self.window = window
+        self._samples = collections.deque()  # (time, pages)
+
+    def update(self, pages, now=None):
+        now = time.monotonic() if now is None else now
+        if self._samples and pages < self._samples[-1][1]:
+            self._samples.clear()  # a new run started
+        self._samples.append((now, pages))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+    def pages_per_minute(self):
+        if len(self._samples) < 2:
+            return 0.0
+        (t0, p0), (t1, p1) = self._samples[0], self._samples[-1]
+        return (p1 - p0) * 60.0 / (t1 - t0) if t1 > t0 else 0.0
+
+    def eta(self, total_pages):
+        """Seconds until total_pages at the current rate, or None if unknown."""
+        rate = self.pages_per_minute()
+        if not total_pages or not self._samples or rate <= 0:
+            return None
+        return max(0, total_pages - self._samples[-1][1]) * 60.0 / rate
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}時間{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    return f"{seconds}秒"
+
+
+class ProgressChannel:
+    """
+    Hands status updates from worker threads to the Tk main loop.
+
+    Worker threads only post() into a queue; the main loop drains it with
+    after() every refresh_ms and calls on_update once per tick with the
+    latest message (older ones are coalesced away), so Tk is only touched
+    from its own thread and at a fixed rate however fast pages arrive.
+    on_update(message, count) is also called on ticks without new messages
+    (message None) so live metrics keep refreshing. call() hands whole
+    callbacks (e.g. "capture finished") to the main loop the same way.
+    """
+    def __init__(self, widget, on_update, refresh_ms=250):
+        self.widget = widget
+        self.on_update = on_update
+        self.refresh_ms = refresh_ms
+        self._queue = queue.SimpleQueue()
+        self._calls = queue.SimpleQueue()
+        self._job = None
+
+    def post(self, message, count=None):
+        self._queue.put((message, count))
+
+    def call(self, fn, *args):
+        """Runs fn(*args) on the Tk thread at the next tick, after the messages posted before it."""
+        self._calls.put((fn, args))
+
+    def start(self):
+        if self._job is None:
+            self._job = self.widget.after(self.refresh_ms, self._pump)
+
+    def stop(self):
+        """Delivers what is still queued and stops the periodic refresh (main thread only)."""
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        self._drain()
+
+    def _drain(self):
+        latest = None
+        while True:
+            try:
+                latest = self._queue.get_nowait()
+            except queue.Empty:
+                break
+        message, count = latest if latest else (None, None)
+        self.on_update(message, count)
+        while True:
+            try:
+                fn, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            fn(*args)
+
+    def _pump(self):
+        try:
+            self._drain()
+        except Exception as e:
+            print(f"Progress update failed: {e}")
+        self._job = self.widget.after(self.refresh_ms, self._pump)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import time
+
+from filenames import sanitize_filename
+
+
+def file_digest(path):
+    """blake2b of a file's bytes (used when pages are not in a PageStore)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def journal_for_book(output_dir, title):
+    """Journal of a book's capture session: <output_dir>/sessions/<title>.jsonl."""
+    return SessionJournal(os.path.join(output_dir, "sessions", sanitize_filename(title) + ".jsonl"))
+
+
+class SessionJournal:
+    """
+    Append-only, crash-safe record of one capture session (JSON lines).
+
+        {"type": "session", "region": {...}, "direction": ..., "wait_time": ..., ...}
+        {"type": "page", "index": 1, "path": ..., "hash": ...}
+        {"type": "end", "reason": "completed" | "stopped" | "error"}
+
+    Every line is flushed and fsynced, so after a crash, sleep or pyautogui
+    failsafe the journal still lists every page that reached the disk. A
+    torn last line is ignored on load.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.header = None
+        self.pages = []
+        self.end = None
+        self._f = None
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write at the end of a crashed session
+                kind = record.get('type')
+                if kind == 'session':
+                    self.header, self.pages, self.end = record, [], None
+                elif kind == 'page':
+                    self.pages.append(record)
+                elif kind == 'end':
+                    self.end = record
+                elif kind == 'resume':
+                    self.end = None
+
+    @property
+    def resumable(self):
+        """True if a session was started and did not reach the end of the book."""
+        return self.header is not None and (self.end is None or self.end.get('reason') != 'completed')
+
+    def page_paths(self):
+        """Saved page files in order (pages whose file has since disappeared are skipped)."""
+        from page_archive import page_exists  # paths may be page archive references
+        return [p['path'] for p in self.pages if page_exists(p['path'])]
+
+    def last_page(self):
+        return self.pages[-1] if self.pages else None
+
+    def start(self, **settings):
+        """Begins a new session, replacing any previous one in this file."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.close()
+        self._f = open(self.path, 'w', encoding='utf-8')
+        self.header = dict(type='session', started=time.time(), **settings)
+        self.pages, self.end = [], None
+        self._append(self.header)
+
+    def resume(self):
+        """Reopens the journal to continue its session."""
+        self.close()
+        self._f = open(self.path, 'a', encoding='utf-8')
+        self.end = None
+        self._append({'type': 'resume', 'time': time.time(), 'pages': len(self.pages)})
+
+    def record_page(self, path, digest):
+        record = {'type': 'page', 'index': len(self.pages) + 1, 'path': path, 'hash': digest}
+        self.pages.append(record)
+        self._append(record)
+
+    def record_end(self, reason):
+        self.end = {'type': 'end', 'reason': reason, 'time': time.time(), 'pages': len(self.pages)}
+        self._append(self.end)
+        self.close()
+
+    def delete(self):
+        """Removes the journal, e.g. when the book's pages are deleted: there is nothing left to resume."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.header, self.pages, self.end = None, [], None
+
+    def close(self):
+        if self._f:
+            self._f.close()
+            self._f = None
+
+    def _append(self, record):
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+
+from frame_source import Frame
+
+
+class SpreadSplitter:
+    """
+    Splits a two-page spread (Kindle's two-column view) into its pages.
+
+    The gutter is found from the column ink profile: every column of a
+    row-subsampled grayscale frame is reduced to the fraction of pixels that
+    differ from the background (the median gray, so light, sepia and dark
+    themes all work), all in a few whole-array operations. The widest
+    run of blank columns in the middle band of the frame is the gutter if it
+    is at least min_gap of the width and both sides carry ink. Anything else,
+    e.g. a cover or an illustration shown on its own, is a single page.
+
+    band: (start, end) fractions of the width searched for the gutter.
+    min_gap: minimum gutter width as a fraction of the frame width. Has to
+        exceed the gaps between vertical text columns (about half an em).
+    ink_tolerance: gray-level difference from the background that counts as ink.
+    blank_ink: columns with at most this fraction of ink pixels count as blank.
+    min_page_ink: mean ink fraction each side needs for the frame to be a spread.
+    row_step: only every row_step-th row is read.
+    """
+    def __init__(self, band=(0.3, 0.7), min_gap=0.02, ink_tolerance=48, blank_ink=0.002,
+                 min_page_ink=0.005, row_step=4):
+        self.band = band
+        self.min_gap = min_gap
+        self.ink_tolerance = ink_tolerance
+        self.blank_ink = blank_ink
+        self.min_page_ink = min_page_ink
+        self.row_step = row_step
+        self.stats = {'spreads': 0, 'singles': 0}
+
+    def _gray(self, img):
+        rows = img[::self.row_step]
+        if rows.ndim == 2:
+            return rows
+        return cv2.cvtColor(rows, cv2.COLOR_BGRA2GRAY if rows.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+    def find_gutter(self, frame):
+        """Column index of the gutter, or None if the frame shows a single page."""
+        img = np.asarray(frame)
+        width = img.shape[1]
+        gray = self._gray(img)
+        background = np.full_like(gray, int(np.median(gray[:, ::max(1, width // 256)])))
+        ink = np.count_nonzero(cv2.absdiff(gray, background) > self.ink_tolerance, axis=0) / gray.shape[0]
+
+        start, end = int(width * self.band[0]), int(width * self.band[1])
+        blank = np.concatenate(([0], (ink[start:end] <= self.blank_ink).astype(np.int8), [0]))
+        edges = np.flatnonzero(np.diff(blank))
+        if not len(edges):
+            return None
+        run_starts, run_ends = edges[::2], edges[1::2]
+        widest = int(np.argmax(run_ends - run_starts))
+        if run_ends[widest] - run_starts[widest] < self.min_gap * width:
+            return None
+        gutter = start + (int(run_starts[widest]) + int(run_ends[widest])) // 2
+        if ink[:gutter].mean() < self.min_page_ink or ink[gutter:].mean() < self.min_page_ink:
+            return None  # one side is empty: a single page off-center, not a spread
+        return gutter
+
+    def split(self, frame, right_to_left=False):
+        """
+        Returns the pages of a frame in reading order: [frame] for a single
+        page, two Frames (views into the frame, no copy) for a spread.
+        right_to_left: vertical (tategaki) books read the right page first.
+        """
+        gutter = self.find_gutter(frame)
+        if gutter is None:
+            self.stats['singles'] += 1
+            return [frame]
+        self.stats['spreads'] += 1
+        img = np.asarray(frame)
+        left, right = Frame(img[:, :gutter]), Frame(img[:, gutter:])
+        return [right, left] if right_to_left else [left, right]
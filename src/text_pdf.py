@@ -0,0 +1,196 @@
+import zlib
+
+import cv2
+
+from page_archive import read_image
+from pdf_writer import ImagePayload, StreamingPDFWriter
+
+A5 = (419.53, 595.28)  # points
+
+# Predefined Japanese CID font: every PDF viewer has it (or a substitute), so
+# nothing is embedded. UniJIS-UCS2-HW-H takes UTF-16 codes directly and maps
+# ASCII to the half-width glyphs (CIDs 231-325), hence the /W entry.
+FONT_NAME = "HeiseiMin-W3"
+FONT_ENCODING = "UniJIS-UCS2-HW-H"
+_HALF_WIDTH_CIDS = "[231 325 500]"
+
+# Characters that must not start a line (kinsoku); they hang off the previous line instead
+_NO_LINE_START = set("、。，．・：；？！ー）」』】〕〉》’”ぁぃぅぇぉっゃゅょァィゥェォッャュョ々,.)!?:;")
+
+
+def char_width(c):
+    """Advance width in em: ASCII and half-width katakana are half width, everything else full width."""
+    code = ord(c)
+    return 0.5 if 0x20 <= code < 0x7f or 0xff61 <= code <= 0xff9f else 1.0
+
+
+def wrap_text(text, max_em):
+    """Breaks text into lines no wider than max_em, keeping its own line breaks and blank lines."""
+    lines = []
+    for paragraph in text.split("\n"):
+        line, width = [], 0.0
+        for c in paragraph.replace("\t", " "):
+            w = char_width(c)
+            if line and width + w > max_em and c not in _NO_LINE_START:
+                lines.append("".join(line))
+                line, width = [], 0.0
+            line.append(c)
+            width += w
+        lines.append("".join(line))
+    return lines
+
+
+def _encode(line):
+    # UCS-2 only: characters outside the BMP (and control characters) become the geta mark
+    chars = (c if 0x20 <= ord(c) <= 0xffff and not 0xd800 <= ord(c) <= 0xdfff else "〓" for c in line)
+    return "<" + "".join(chars).encode("utf-16-be").hex() + ">"
+
+
+def _to_unicode_cmap():
+    # Character codes are UTF-16 code units already, so the mapping is the identity
+    ranges = [f"<{hi:02x}00> <{hi:02x}ff> <{hi:02x}00>" for hi in range(256) if not 0xd8 <= hi <= 0xdf]
+    blocks = []
+    for i in range(0, len(ranges), 100):
+        chunk = ranges[i:i + 100]
+        blocks.append(f"{len(chunk)} beginbfrange\n" + "\n".join(chunk) + "\nendbfrange")
+    return ("/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+            "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+            "1 begincodespacerange\n<0000> <ffff>\nendcodespacerange\n"
+            + "\n".join(blocks) +
+            "\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend\n").encode("ascii")
+
+
+def preview_payload(path, max_width=640, quality=50):
+    """Downscaled grayscale JPEG of a page image as an ImagePayload, or None if unreadable."""
+    img = read_image(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    h, w = img.shape
+    if w > max_width:
+        img = cv2.resize(img, (max_width, max(1, round(h * max_width / w))), interpolation=cv2.INTER_AREA)
+    ok, data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return None
+    return ImagePayload(img.shape[1], img.shape[0], "/DeviceGray", 8, "/DCTDecode", None, data.tobytes())
+
+
+class TextPDFWriter(StreamingPDFWriter):
+    """
+    StreamingPDFWriter for text pages built from OCR results.
+
+    Each book page becomes one PDF page of real text (continued on extra pages
+    if it does not fit). With a preview image the page shows the downscaled
+    scan and the text is laid over it invisibly, like a searchable scan, so
+    it still costs only a few KB. size_with_text() gives the exact final size
+    for splitting, as size_with() does for image pages.
+    """
+    def __init__(self, path, page_size=A5, font_size=10.5, margin=42.0, line_spacing=1.7):
+        super().__init__(path)
+        self.page_size = page_size
+        self.font_size = font_size
+        self.margin = margin
+        self.line_spacing = line_spacing
+        self._font_id = None  # Type0 font object, written with the first page
+
+    def add_text_page(self, text, heading=None, image=None):
+        """Adds one book page. image: optional ImagePayload (see preview_payload)."""
+        pages, font_id = self._text_pages(text, heading, image)
+        self._add_pages(pages)
+        self._font_id = font_id
+
+    def size_with_text(self, text, heading=None, image=None):
+        """Exact size of the file if this page were added and then the file closed."""
+        return self._size_with_pages(self._text_pages(text, heading, image)[0])
+
+    def _font_objects(self, first_id):
+        fd_id, cid_id, cmap_id, font_id = first_id, first_id + 1, first_id + 2, first_id + 3
+        cmap = zlib.compress(_to_unicode_cmap(), 9)
+        objects = [
+            (fd_id, self._object_chunks(fd_id,
+                f"<< /Type /FontDescriptor /FontName /{FONT_NAME} /Flags 6 /FontBBox [-123 -257 1001 910]"
+                f" /ItalicAngle 0 /Ascent 723 /Descent -241 /CapHeight 709 /StemV 69 >>")),
+            (cid_id, self._object_chunks(cid_id,
+                f"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /{FONT_NAME}"
+                f" /CIDSystemInfo << /Registry (Adobe) /Ordering (Japan1) /Supplement 2 >>"
+                f" /FontDescriptor {fd_id} 0 R /DW 1000 /W {_HALF_WIDTH_CIDS} >>")),
+            (cmap_id, self._stream_chunks(cmap_id, f"<< /Filter /FlateDecode /Length {len(cmap)} >>", cmap)),
+            (font_id, self._object_chunks(font_id,
+                f"<< /Type /Font /Subtype /Type0 /BaseFont /{FONT_NAME} /Encoding /{FONT_ENCODING}"
+                f" /DescendantFonts [{cid_id} 0 R] /ToUnicode {cmap_id} 0 R >>")),
+        ]
+        return objects, font_id
+
+    def _layout(self, text, heading, width, height, font_size, overflow):
+        """Splits the page text into lines per PDF page at font_size (None if it must fit and does not)."""
+        leading = font_size * self.line_spacing
+        lines = wrap_text(text.rstrip("\n"), (width - 2 * self.margin) / font_size)
+        if heading:
+            lines = [None, ""] + lines  # None marks the heading line
+        per_page = max(1, int((height - 2 * self.margin) / leading))
+        if not overflow and len(lines) > per_page:
+            return None
+        return [lines[i:i + per_page] for i in range(0, max(len(lines), 1), per_page)]
+
+    def _text_pages(self, text, heading, image):
+        next_id = self._next_id
+        pages = []
+        font_id = self._font_id
+        prefix = []
+        if font_id is None:
+            prefix, font_id = self._font_objects(next_id)
+            next_id = font_id + 1
+
+        width = self.page_size[0]
+        if image is not None:
+            # Page takes the image's aspect ratio; the text has to fit on it, so shrink it if needed
+            height = width * image.height / image.width
+            font_size = self.font_size
+            chunks = self._layout(text, heading, width, height, font_size, overflow=False)
+            while chunks is None and font_size > 1:
+                font_size *= 0.85
+                chunks = self._layout(text, heading, width, height, font_size, overflow=font_size <= 1)
+        else:
+            height = self.page_size[1]
+            font_size = self.font_size
+            chunks = self._layout(text, heading, width, height, font_size, overflow=True)
+
+        for n, lines in enumerate(chunks):
+            objects = prefix if n == 0 else []
+            image_ref = ""
+            ops = []
+            if image is not None and n == 0:
+                image_id = next_id
+                next_id += 1
+                parms = f" /DecodeParms {image.decode_parms}" if image.decode_parms else ""
+                objects = objects + [(image_id, self._stream_chunks(image_id,
+                    f"<< /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height}"
+                    f" /ColorSpace {image.colorspace} /BitsPerComponent {image.bits}"
+                    f" /Filter {image.filter}{parms} /Length {len(image.data)} >>", image.data))]
+                image_ref = f" /XObject << /Im0 {image_id} 0 R >>"
+                ops.append(f"q {width:.4f} 0 0 {height:.4f} 0 0 cm /Im0 Do Q")
+            ops.append(f"BT /F1 {font_size:.3f} Tf {font_size * self.line_spacing:.3f} TL")
+            if image is not None:
+                ops.append("3 Tr")  # invisible: the scan is what is seen, the text is for search/extraction
+            ops.append(f"{self.margin:.3f} {height - self.margin - font_size:.3f} Td")
+            for line in lines:
+                if line is None:
+                    ops.append(f"/F1 {font_size * 1.3:.3f} Tf {_encode(heading)} Tj /F1 {font_size:.3f} Tf T*")
+                elif line:
+                    ops.append(f"{_encode(line)} Tj T*")
+                else:
+                    ops.append("T*")
+            ops.append("ET")
+            content = zlib.compress("\n".join(ops).encode("ascii"), 6)
+
+            content_id, page_id = next_id, next_id + 1
+            next_id += 2
+            objects = objects + [
+                (content_id, self._stream_chunks(content_id,
+                    f"<< /Filter /FlateDecode /Length {len(content)} >>", content)),
+                (page_id, self._object_chunks(page_id,
+                    f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.4f} {height:.4f}]"
+                    f" /Resources << /Font << /F1 {font_id} 0 R >>{image_ref} >> /Contents {content_id} 0 R >>")),
+            ]
+            pages.append(objects)
+        return pages, font_id
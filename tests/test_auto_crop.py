@@ -0,0 +1,37 @@
+"""Auto crop: one box for the whole book, written no larger than the captured pages."""
+import os
+
+import cv2
+import numpy as np
+
+from auto_crop import auto_crop_book, find_book_crop
+from frame_buffer import write_png
+
+
+def page(tmp_path, name, shape=(400, 300), box=(60, 80, 240, 320)):
+    img = np.full(shape + (3,), 255, np.uint8)
+    left, top, right, bottom = box
+    rng = np.random.default_rng(len(name))
+    img[top:bottom, left:right] = np.where(rng.random((bottom - top, right - left, 1)) < 0.3, 0, 255)
+    path = str(tmp_path / name)
+    write_png(img, path)
+    return path
+
+
+def test_crop_covers_every_page(tmp_path):
+    paths = [page(tmp_path, "a.png", box=(60, 80, 240, 320)),
+             page(tmp_path, "b.png", box=(40, 100, 200, 360))]
+    left, top, right, bottom = find_book_crop(paths, padding=0)
+    assert left <= 40 and top <= 80 and right >= 240 and bottom >= 360
+
+
+def test_pages_of_different_sizes_are_not_cropped(tmp_path):
+    paths = [page(tmp_path, "a.png"), page(tmp_path, "b.png", shape=(500, 300))]
+    assert find_book_crop(paths) is None
+
+
+def test_cropped_pages_are_smaller(tmp_path):
+    paths = [page(tmp_path, f"p{i}.png") for i in range(3)]
+    cropped = auto_crop_book(paths, str(tmp_path / "crop"))
+    assert sum(map(os.path.getsize, cropped)) < sum(map(os.path.getsize, paths))
+    assert cv2.imread(cropped[0]).shape[:2] < cv2.imread(paths[0]).shape[:2]
@@ -0,0 +1,65 @@
+"""Finding a book's pages, and the OCR default when no title is given."""
+import os
+import time
+
+import numpy as np
+
+import ocr_processor
+from books import book_pages, latest_book
+from page_archive import PageArchive, archive_path
+from page_store import PageStore
+from session_journal import journal_for_book
+
+
+def store_book(images, title, values):
+    store = PageStore(images)
+    for value in values:
+        digest, _ = store.put_frame(np.full((4, 4, 4), value, np.uint8))
+        store.append_page(title, digest)
+    return store.book_pages(title)
+
+
+def touch(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+def test_book_pages_from_store_journal_and_archive(tmp_path):
+    images = str(tmp_path)
+    assert book_pages(images, "none") == []
+    stored = store_book(images, "stored", [1, 2])
+    assert book_pages(images, "stored") == stored
+
+    page = os.path.join(images, "page_0001.png")
+    open(page, 'wb').close()
+    journal = journal_for_book(images, "journaled")
+    journal.start(region=None)
+    journal.record_page(page, "d1")
+    journal.record_end('stopped')
+    assert book_pages(images, "journaled") == [page]
+
+    archive = PageArchive(archive_path(images, "archived"), 'w')
+    archive.append(b"page")
+    archive.close()
+    assert len(book_pages(images, "archived")) == 1
+
+
+def test_ocr_defaults_to_the_latest_book(tmp_path, capsys):
+    images = str(tmp_path)
+    old = store_book(images, "old book", [1])
+    new = store_book(images, "new book", [2, 3])
+    now = time.time()
+    touch(os.path.join(images, "books", "old book.txt"), now - 100)
+    touch(os.path.join(images, "books", "new book.txt"), now)
+    assert latest_book(images) == ("new book", now)
+    assert ocr_processor.list_images(images) == new
+    assert "new book" in capsys.readouterr().out
+    assert ocr_processor.list_images(images, "old book") == old
+
+
+def test_newer_loose_pngs_win(tmp_path):
+    images = str(tmp_path)
+    store_book(images, "book", [1])
+    touch(os.path.join(images, "books", "book.txt"), time.time() - 100)
+    loose = os.path.join(images, "page_0001.png")
+    open(loose, 'wb').close()
+    assert ocr_processor.list_images(images) == [loose]
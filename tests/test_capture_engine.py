@@ -0,0 +1,58 @@
+"""CaptureEngine against replay sources: pages saved, end of book, adaptive vs fixed wait."""
+import numpy as np
+import pytest
+
+from bench_capture import run_benchmark
+from frame_source import ReplaySource, SyntheticBookSource
+
+
+class ListSource(ReplaySource):
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+
+    def __len__(self):
+        return len(self.pages)
+
+    def page(self, index):
+        return self.pages[index]
+
+
+def look_alike_pages(count):
+    """
+    Pages whose thumbnails are identical: they differ only in rows the
+    fingerprint skips (it samples every 5th row of a 1600 px wide frame).
+    """
+    pages = []
+    for i in range(count):
+        page = np.full((400, 1600, 4), 255, np.uint8)
+        page[1 + i:300:5, 100:1500] = 0
+        pages.append(page)
+    return pages
+
+
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_every_page_saved_and_end_detected(adaptive):
+    source = SyntheticBookSource(pages=12, width=200, height=300, duplicate_rate=0.2, seed=3)
+    result = run_benchmark(source, wait_time=0.02, adaptive=adaptive)
+    assert result['pages_saved'] == result['expected_pages']
+    assert result['end_detected']
+
+
+def test_adaptive_saves_look_alike_pages():
+    source = ListSource(look_alike_pages(3))
+    result = run_benchmark(source, wait_time=0.05, adaptive=True)
+    assert result['pages_saved'] == 3
+    assert result['end_detected']
+
+
+def test_adaptive_is_no_slower_than_fixed_wait():
+    # wait_time is what an operator sets for this render latency; adaptive mode also
+    # uses it as the no-change timeout, so end of book costs the same in both modes
+    def elapsed(adaptive):
+        source = SyntheticBookSource(pages=15, width=300, height=450, render_latency=0.05, duplicate_rate=0.1)
+        result = run_benchmark(source, wait_time=0.15, adaptive=adaptive)
+        assert result['pages_saved'] == result['expected_pages']
+        return result['elapsed_sec']
+
+    assert elapsed(adaptive=True) <= elapsed(adaptive=False)
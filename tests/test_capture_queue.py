@@ -0,0 +1,98 @@
+"""CaptureQueue: job status transitions, failures, stop and resume from the queue file."""
+import pytest
+
+import capture_queue
+from capture_engine import CaptureEngine
+from capture_queue import CaptureQueue, load_queue, make_job, save_queue
+from frame_source import SyntheticBookSource
+
+
+class OpenBook:
+    """Open actions: 'opening' a book rewinds the replay source to its first page."""
+    def __init__(self, source, fail=()):
+        self.source = source
+        self.fail = fail
+        self.opened = []
+
+    def run(self, actions):
+        title = actions[0].partition(" ")[2]
+        if title in self.fail:
+            raise RuntimeError("pyautogui fail-safe")
+        self.opened.append(title)
+        self.source.index = 0
+        self.source._turned_at = None
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """Every status each job was saved with, in order (after the initial 'pending')."""
+    changes = {}
+    save = capture_queue.save_queue
+
+    def record(jobs, path):
+        for job in jobs:
+            seen = changes.setdefault(job['title'], [])
+            if job['status'] != 'pending' and job['status'] not in seen:
+                seen.append(job['status'])
+        save(jobs, path)
+
+    monkeypatch.setattr(capture_queue, 'save_queue', record)
+    return changes
+
+
+def make_queue(tmp_path, source, actions, titles=None):
+    """A queue over `source`; titles: write a new queue file with these jobs first."""
+    path = str(tmp_path / "queue.json")
+    if titles is not None:
+        save_queue([make_job(title, (0, 0, 0, 0), wait_ms=10, open_wait=0, pdf=False,
+                             open_actions=[f"type {title}"]) for title in titles], path)
+    images = str(tmp_path / "images")
+    engine = CaptureEngine(output_dir=images, frame_source=source, page_turner=source)
+    return CaptureQueue(engine, path=path, images_dir=images, pdf_dir=str(tmp_path / "pdfs"),
+                        actions=actions, on_status=lambda msg, count: None)
+
+
+def statuses(queue):
+    return {job['title']: job['status'] for job in load_queue(queue.path)}
+
+
+def test_jobs_go_through_every_status(tmp_path, history):
+    source = SyntheticBookSource(pages=4, width=120, height=160, seed=1)
+    queue = make_queue(tmp_path, source, OpenBook(source), ["A", "B"])
+    queue.run()
+    assert statuses(queue) == {'A': 'done', 'B': 'done'}
+    assert history == {'A': ['capturing', 'processing', 'done'], 'B': ['capturing', 'processing', 'done']}
+    assert [job['pages'] for job in load_queue(queue.path)] == [4, 4]
+
+
+def test_failed_book_does_not_stop_the_queue(tmp_path):
+    source = SyntheticBookSource(pages=3, width=120, height=160, seed=2)
+    queue = make_queue(tmp_path, source, OpenBook(source, fail=("A",)), ["A", "B"])
+    queue.run()
+    jobs = load_queue(queue.path)
+    assert [job['status'] for job in jobs] == ['failed', 'done']
+    assert jobs[0]['error'] == "pyautogui fail-safe"
+
+
+def test_stopped_book_stays_pending_and_resumes(tmp_path):
+    class StopAfterTurns(SyntheticBookSource):
+        queue = None
+
+        def turn(self, key):
+            super().turn(key)
+            if self.turns == 2 and self.queue:
+                self.queue.stop()
+
+    source = StopAfterTurns(pages=5, width=120, height=160, seed=3)
+    actions = OpenBook(source)
+    queue = source.queue = make_queue(tmp_path, source, actions, ["A", "B"])
+    queue.run()
+    assert statuses(queue) == {'A': 'pending', 'B': 'pending'}
+    assert load_queue(queue.path)[0]['error'] == 'stopped'
+    assert actions.opened == ["A"]  # the queue stops after the interrupted book
+
+    source.queue = None
+    resumed = make_queue(tmp_path, source, actions)  # a later run picks the queue file up again
+    resumed.run()
+    assert statuses(resumed) == {'A': 'done', 'B': 'done'}
+    assert actions.opened == ["A", "A", "B"]
@@ -0,0 +1,46 @@
+"""OCRCache: hits and misses, LRU eviction by stored text size, reopening."""
+from ocr_cache import OCRCache
+
+
+def test_hit_miss_and_key_includes_backend(tmp_path):
+    cache = OCRCache(str(tmp_path / "cache.sqlite"))
+    cache.put("hash1", "drive", "text")
+    assert cache.get("hash1", "drive") == "text"
+    assert cache.get("hash1", "tesseract") is None
+    assert cache.get("hash2", "drive") is None
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr("ocr_cache.time.time", lambda: next(clock))
+    cache = OCRCache(str(tmp_path / "cache.sqlite"), max_bytes=30)
+    for name in "abc":
+        cache.put(name, "drive", name * 10)
+    cache.get("a", "drive")  # "b" is now the oldest
+    cache.put("d", "drive", "d" * 10)
+    assert cache.get("b", "drive") is None
+    assert [cache.get(name, "drive") for name in "acd"] == ["a" * 10, "c" * 10, "d" * 10]
+    assert cache.stats['evicted'] == 1
+    assert cache.summary() == (3, 30)
+
+
+def test_replacing_an_entry_counts_its_size_once(tmp_path):
+    cache = OCRCache(str(tmp_path / "cache.sqlite"), max_bytes=25)
+    cache.put("a", "drive", "x" * 10)
+    cache.put("b", "drive", "y" * 10)
+    cache.put("a", "drive", "z" * 10)
+    assert cache.stats['evicted'] == 0
+    assert cache.summary() == (2, 20)
+
+
+def test_size_limit_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = OCRCache(path)
+    cache.put("a", "drive", "日本語")  # 9 bytes in UTF-8
+    cache.close()
+    cache = OCRCache(path, max_bytes=12)
+    assert cache.summary() == (1, 9)
+    cache.put("b", "drive", "abcd")
+    assert cache.get("a", "drive") is None
+    assert cache.summary() == (1, 4)
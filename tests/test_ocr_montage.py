@@ -0,0 +1,44 @@
+"""ocr_montage: stacking pages with marker bands and splitting the OCR result back."""
+import cv2
+import numpy as np
+
+from ocr_montage import MONTAGE_WIDTH, SEPARATOR_HEIGHT, build_montage, split_montage
+
+
+def para(text):
+    return ['NORMAL_TEXT', text]
+
+
+def test_split_at_markers():
+    paragraphs = [para(""), para("PAGEBREAK 1"), para("一ページ目"), para("続き"),
+                  para("PAGE BREAK 2."), para("二ページ目"), para("pagebreak 3")]
+    assert split_montage(paragraphs, 3) == [[para("一ページ目"), para("続き")], [para("二ページ目")], []]
+
+
+def test_ambiguous_splits_fall_back():
+    # A marker merged with page text, out of sequence, text above the first one, or the wrong count
+    assert split_montage([para("PAGEBREAK 1"), para("本文 PAGEBREAK 2 本文")], 2) is None
+    assert split_montage([para("PAGEBREAK 1"), para("a"), para("PAGEBREAK 3"), para("b")], 2) is None
+    assert split_montage([para("前書き"), para("PAGEBREAK 1"), para("a")], 1) is None
+    assert split_montage([para("PAGEBREAK 1"), para("a")], 2) is None
+
+
+def write_page(path, width, height):
+    page = np.full((height, width, 3), 255, np.uint8)
+    page[height // 4:height // 2, width // 4:width // 2] = 0
+    cv2.imwrite(str(path), page)
+    return str(path)
+
+
+def test_build_montage_stacks_pages_at_one_width(tmp_path):
+    wide = write_page(tmp_path / "wide.png", 2000, 3000)
+    narrow = write_page(tmp_path / "narrow.png", 500, 400)
+    montage = cv2.imdecode(build_montage([wide, narrow]), cv2.IMREAD_UNCHANGED)
+    assert montage.ndim == 2
+    assert montage.shape == (2 * SEPARATOR_HEIGHT + 1500 + 400, MONTAGE_WIDTH)
+    assert (montage[:SEPARATOR_HEIGHT] < 128).any()  # the first marker is printed
+
+
+def test_build_montage_without_a_page(tmp_path):
+    page = write_page(tmp_path / "page.png", 100, 100)
+    assert build_montage([page, str(tmp_path / "missing.png")]) is None
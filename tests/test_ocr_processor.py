@@ -0,0 +1,173 @@
+"""The Drive OCR pipeline against drive_stub.StubDriveService: order, retries, batched deletes."""
+import itertools
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+import ocr_processor
+from drive_stub import StubDriveService
+from ocr_processor import AdaptiveRateLimiter, DeleteBatcher, DriveOCRBackend, process_images
+
+
+@pytest.fixture(autouse=True)
+def stub(monkeypatch):
+    StubDriveService._docs.clear()
+    StubDriveService._recent.clear()
+    StubDriveService.stats.update(calls=0, errors=0, rate_limited=0)
+    monkeypatch.setattr(ocr_processor, 'RETRY_BASE_DELAY', 0.01)
+    return StubDriveService
+
+
+def pages(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"page_{i + 1:03d}.png"
+        path.write_bytes(b"png")
+        paths.append(str(path))
+    return paths
+
+
+def backend(service_factory, concurrency=4, **kwargs):
+    return DriveOCRBackend(service_factory, service_factory, concurrency=concurrency,
+                           limiter=AdaptiveRateLimiter(rate=1000, max_rate=1000), **kwargs)
+
+
+def test_output_in_page_order(tmp_path):
+    paths = pages(tmp_path, 12)
+    output = tmp_path / "output.md"
+    # Random latencies make pages finish out of order (one service per worker thread)
+    seeds = itertools.count()
+    factory = lambda: StubDriveService(latency=0.001 * (next(seeds) % 5), seed=next(seeds))
+    texts = process_images(paths, str(output), backend(factory))
+    names = [f"page_{i + 1:03d}.png" for i in range(12)]
+    assert texts == names
+    assert output.read_text(encoding='utf-8').split() == names
+
+
+@pytest.mark.parametrize("errors", [(429, 503), (ConnectionResetError, TimeoutError)])
+def test_transient_errors_are_retried(tmp_path, errors):
+    paths = pages(tmp_path, 8)
+    ocr = backend(lambda: StubDriveService(latency=0, error_rate=0.3, error_statuses=errors, seed=1))
+    texts = process_images(paths, str(tmp_path / "output.md"), ocr)
+    assert None not in texts
+    assert StubDriveService.stats['errors'] > 0
+    assert ocr.limiter.stats['throttled'] > 0
+    assert not StubDriveService._docs  # every temporary document deleted
+
+
+def test_deletes_are_batched(tmp_path):
+    paths = pages(tmp_path, 10)
+    ocr = backend(lambda: StubDriveService(latency=0))
+    ocr.deleter.batch_size = 4
+    process_images(paths, str(tmp_path / "output.md"), ocr)
+    assert ocr.deleter.stats == {'batches': 3, 'deleted': 10, 'failed': 0}
+    # create + documents.get per page, one round trip per delete batch
+    assert StubDriveService.stats['calls'] == 2 * 10 + 3
+    assert not StubDriveService._docs
+
+
+def test_failed_cleanup_keeps_results(tmp_path):
+    class BrokenDeletes(StubDriveService):
+        def new_batch_http_request(self, callback=None):
+            raise ConnectionResetError("connection reset")
+
+    paths = pages(tmp_path, 5)
+    ocr = backend(lambda: BrokenDeletes(latency=0))
+    ocr.deleter.batch_size = 2
+    texts = process_images(paths, str(tmp_path / "output.md"), ocr)
+    assert texts == [f"page_{i + 1:03d}.png" for i in range(5)]
+    assert ocr.deleter.stats['failed'] == 5
+
+
+def test_delete_batcher_retries_dropped_connections():
+    class Flaky(StubDriveService):
+        drops = 0
+
+        def _call(self, fn):
+            if self.drops:
+                self.drops -= 1
+                raise ConnectionResetError("reset")
+            return super()._call(fn)
+
+    service = Flaky(latency=0)
+    ids = [service.files().create(body={'name': str(i)}).execute()['id'] for i in range(3)]
+    service.drops = 1
+    deleter = DeleteBatcher(lambda: service)
+    for file_id in ids:
+        deleter.add(file_id)
+    deleter.flush()
+    assert deleter.stats == {'batches': 2, 'deleted': 3, 'failed': 0}
+    assert not StubDriveService._docs
+
+
+def http_error(status, content):
+    import httplib2
+    from googleapiclient.errors import HttpError
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+def test_disabled_docs_api_stops_the_run(tmp_path):
+    calls = []
+
+    class DocsDisabled(StubDriveService):
+        def _document(self, file_id):
+            calls.append(file_id)
+            raise http_error(403, b'{"error": {"code": 403, "message": "Google Docs API has not been used '
+                                  b'in project 1 before or it is disabled.", "status": "PERMISSION_DENIED"}}')
+
+    paths = pages(tmp_path, 20)
+    ocr = backend(lambda: DocsDisabled(latency=0.01), concurrency=2)
+    with pytest.raises(ocr_processor.OCRSetupError, match="Google Docs API"):
+        process_images(paths, str(tmp_path / "output.md"), ocr)
+    assert len(calls) < len(paths)  # pages not yet started are cancelled
+    assert not StubDriveService._docs  # the uploads made so far are still cleaned up
+
+
+def test_403_rate_limit_is_retried(tmp_path):
+    class RateLimited403(StubDriveService):
+        limited = 2
+
+        def _document(self, file_id):
+            if RateLimited403.limited:
+                RateLimited403.limited -= 1
+                raise http_error(403, b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}')
+            return super()._document(file_id)
+
+    paths = pages(tmp_path, 3)
+    texts = process_images(paths, str(tmp_path / "output.md"), backend(lambda: RateLimited403(latency=0)))
+    assert texts == [f"page_{i + 1:03d}.png" for i in range(3)]
+
+
+def image_pages(tmp_path, count):
+    import cv2
+    import numpy as np
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / f"page_{i + 1:03d}.png")
+        cv2.imwrite(path, np.full((300, 200), 255, np.uint8))
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("markers_read", [True, False])
+def test_montage_split_and_fallback(tmp_path, markers_read):
+    class Montage(StubDriveService):
+        def _create(self, body, path):
+            result = super()._create(body, path)
+            if markers_read and body['name'].startswith("montage_"):
+                # Converted montage of two pages: each page's text after its marker
+                StubDriveService._docs[result['id']] = "PAGEBREAK 1\nfirst\nPAGEBREAK 2\nsecond\n"
+            return result
+
+    paths = image_pages(tmp_path, 4)
+    ocr = backend(lambda: Montage(latency=0), montage=2)
+    texts = process_images(paths, str(tmp_path / "output.md"), ocr)
+    if markers_read:
+        assert texts == ["first", "second"] * 2
+        assert ocr.montage_stats['uploads'] == 2 and ocr.montage_stats['fallbacks'] == 0
+    else:
+        # The stub's "OCR" has no markers: each montage is OCRed again page by page
+        assert texts == [f"page_{i + 1:03d}.png" for i in range(4)]
+        assert ocr.montage_stats['fallbacks'] == 2
+    assert not StubDriveService._docs
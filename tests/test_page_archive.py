@@ -0,0 +1,85 @@
+"""PageArchive: append, reopen for append, and recovery of a crashed (unclosed, torn) archive."""
+import os
+
+import pytest
+
+from page_archive import PageArchive, close_readers, open_page, page_digest, page_ref
+from session_journal import file_digest
+
+
+@pytest.fixture(autouse=True)
+def readers():
+    yield
+    close_readers()
+
+
+def pages(count, start=0):
+    return [b"png %d " % i * (i + 1) for i in range(start, start + count)]
+
+
+def test_append_and_read(tmp_path):
+    path = str(tmp_path / "book.pages")
+    archive = PageArchive(path, 'w')
+    refs = [archive.append(data) for data in pages(3)]
+    assert refs == [page_ref(path, i) for i in range(3)]
+    assert bytes(archive.read(1)) == pages(3)[1]  # readable before close
+    archive.close()
+
+    loose = tmp_path / "page.png"
+    loose.write_bytes(pages(3)[2])
+    assert open_page(refs[2]).read() == pages(3)[2]
+    assert page_digest(refs[2]) == file_digest(str(loose))
+
+
+def test_reopen_for_append_continues_after_the_last_page(tmp_path):
+    path = str(tmp_path / "book.pages")
+    archive = PageArchive(path, 'w')
+    for data in pages(2):
+        archive.append(data)
+    archive.close()
+
+    archive = PageArchive(path, 'a')
+    assert archive.append(pages(1, start=2)[0]) == page_ref(path, 2)
+    archive.close()
+    reader = PageArchive(path)
+    assert [bytes(reader.read(i)) for i in range(len(reader))] == pages(3)
+    reader.close()
+
+
+def test_crash_recovery_ignores_a_torn_last_page(tmp_path):
+    path = str(tmp_path / "book.pages")
+    archive = PageArchive(path, 'w')
+    for data in pages(3):
+        archive.append(data)
+    archive._f.close()  # crash: no index or footer
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 2)  # the last page was being written
+
+    reader = PageArchive(path)
+    assert len(reader) == 2
+    reader.close()
+
+    archive = PageArchive(path, 'a')
+    archive.append(pages(1, start=2)[0])
+    archive.close()
+    reader = PageArchive(path)
+    assert [bytes(reader.read(i)) for i in range(len(reader))] == pages(3)
+    reader.close()
+
+
+def test_reader_sees_pages_appended_by_a_writer(tmp_path):
+    path = str(tmp_path / "book.pages")
+    writer = PageArchive(path, 'w')
+    writer.append(b"first")
+    reader = PageArchive(path)
+    writer.append(b"second")
+    assert bytes(reader.read(1)) == b"second"
+    reader.close()
+    writer.close()
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "book.pages"
+    path.write_bytes(b"PNG")
+    with pytest.raises(ValueError):
+        PageArchive(str(path))
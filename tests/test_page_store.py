@@ -0,0 +1,99 @@
+"""PageStore: blobs shared across runs, book indexes, splicing overlapping runs, gc."""
+import os
+
+import numpy as np
+import pytest
+
+from capture_engine import CaptureEngine
+from frame_source import SyntheticBookSource
+from page_store import PageStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PageStore(str(tmp_path))
+
+
+def write_book(store, book_id, digests):
+    for d in digests:
+        store.append_page(book_id, d)
+
+
+def frame(value):
+    return np.full((8, 6, 4), value, np.uint8)
+
+
+def test_identical_frames_share_one_blob(store):
+    first, path = store.put_frame(frame(10))
+    again, same_path = store.put_frame(frame(10))
+    other, _ = store.put_frame(frame(20))
+    assert first == again and path == same_path and other != first
+    assert os.path.exists(path)
+    assert store.stats == {'stored': 2, 'reused': 1}
+
+
+@pytest.mark.parametrize("run", [
+    ['blank', 'x', 'y'],    # repeats a page from the middle, then goes elsewhere
+    ['blank'],              # a single page proves nothing
+    ['blank', 'e'],         # repeats the end, but fewer than SPLICE_OVERLAP pages
+])
+def test_single_page_match_never_truncates(store, run):
+    book = ['a', 'blank', 'c', 'd', 'blank', 'e']
+    write_book(store, 'b', book)
+    position = store.splice_point('b', run, final=True)
+    assert position == len(book)
+    store.splice_book('b', position, run)
+    assert store.book_hashes('b') == book + run
+
+
+def test_run_repeating_the_end_continues_the_book(store):
+    write_book(store, 'b', ['a', 'b', 'c', 'd', 'e'])
+    assert store.splice_point('b', ['c', 'd']) is None  # could still be an overlap
+    assert store.splice_point('b', ['c', 'd', 'e']) == 2
+    store.splice_book('b', 2, ['c', 'd', 'e', 'f'])
+    assert store.book_hashes('b') == ['a', 'b', 'c', 'd', 'e', 'f']
+
+
+def test_overlap_must_reach_the_end_of_the_book(store):
+    write_book(store, 'b', ['a', 'b', 'c', 'd', 'e'])
+    # Re-capturing pages 1-3 of a longer book must not drop pages 4-5
+    assert store.splice_point('b', ['a', 'b', 'c']) is None
+    assert store.splice_point('b', ['a', 'b', 'c', 'x']) == 5
+    assert store.splice_point('b', ['a', 'b', 'c'], final=True) == 5
+
+
+def test_empty_or_short_book_is_appended(store):
+    assert store.splice_point('new', ['a']) == 0
+    write_book(store, 'short', ['a', 'b'])
+    assert store.splice_point('short', ['a', 'b', 'c']) == 2
+
+
+def test_gc_keeps_pages_of_every_book(store):
+    kept, kept_path = store.put_frame(frame(1))
+    shared, shared_path = store.put_frame(frame(2))
+    dropped, dropped_path = store.put_frame(frame(3))
+    write_book(store, 'one', [kept, shared])
+    write_book(store, 'two', [shared, dropped])
+    store.delete_book('two')
+    assert store.books() == ['one']
+    assert store.gc() == 1
+    assert os.path.exists(kept_path) and os.path.exists(shared_path)
+    assert not os.path.exists(dropped_path)
+
+
+def capture(store, tmp_path, pages, **kwargs):
+    source = SyntheticBookSource(pages=pages, width=120, height=160)
+    engine = CaptureEngine(str(tmp_path / "out"), frame_source=source, page_turner=source,
+                           page_store=store, report_dir=str(tmp_path / "reports"))
+    engine.set_region(0, 0, 120, 160)
+    engine.start_capture(wait_time=0, book_id='book', **kwargs)
+    return engine
+
+
+def test_recapture_reuses_blobs_and_keeps_the_index(store, tmp_path):
+    capture(store, tmp_path, 6)
+    first = store.book_hashes('book')
+    assert len(first) == 6
+    engine = capture(store, tmp_path, 6)
+    assert store.book_hashes('book') == first
+    assert engine.page_store.stats['reused'] == 6
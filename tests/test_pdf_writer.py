@@ -0,0 +1,126 @@
+"""
+StreamingPDFWriter (image PDFs, streaming capture-time PDFs, text PDFs) writes PDF
+syntax by hand, so its output is checked with a real parser: qpdf via
+pikepdf, with xref recovery off so a wrong offset fails instead of being
+repaired silently.
+"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+pikepdf = pytest.importorskip("pikepdf")
+
+from pdf_writer import PDFGenerator, StreamingPDFWriter, load_image_payload
+from text_pdf import TextPDFWriter
+
+
+def open_pdf(path):
+    pdf = pikepdf.open(path, attempt_recovery=False)
+    assert pdf.check_pdf_syntax() == []
+    return pdf
+
+
+def page_image(page):
+    (image,) = page.Resources.XObject.values()
+    return np.asarray(pikepdf.PdfImage(image).as_pil_image())
+
+
+@pytest.fixture
+def pages(tmp_path):
+    """Pages in every form the writer embeds: RGB PNG, gray PNG, JPEG, bilevel G4 TIFF."""
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (60, 40, 3), dtype=np.uint8)
+    gray = rng.integers(0, 256, (50, 30), dtype=np.uint8)
+    bw = np.where(rng.random((64, 48)) < 0.2, 0, 255).astype(np.uint8)
+    paths = {
+        'rgb': str(tmp_path / "rgb.png"),
+        'gray': str(tmp_path / "gray.png"),
+        'jpeg': str(tmp_path / "photo.jpg"),
+        'g4': str(tmp_path / "text.tif"),
+    }
+    cv2.imwrite(paths['rgb'], cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+    cv2.imwrite(paths['gray'], gray)
+    Image.fromarray(rgb).save(paths['jpeg'], 'JPEG', quality=90)
+    Image.fromarray(bw).convert('1').save(paths['g4'], 'TIFF', compression='group4', tiffinfo={278: bw.shape[0]})
+    return paths, {'rgb': rgb, 'gray': gray, 'g4': bw}
+
+
+def test_pages_parse_and_decode_losslessly(tmp_path, pages):
+    paths, pixels = pages
+    out = str(tmp_path / "out.pdf")
+    writer = StreamingPDFWriter(out)
+    for kind in ('rgb', 'gray', 'jpeg', 'g4'):
+        writer.add_image(paths[kind])
+    writer.close()
+
+    pdf = open_pdf(out)
+    assert len(pdf.pages) == 4
+    rgb, gray, jpeg, g4 = pdf.pages
+    assert np.array_equal(page_image(rgb), pixels['rgb'])
+    assert np.array_equal(page_image(gray), pixels['gray'])
+    assert page_image(jpeg).shape == pixels['rgb'].shape
+    assert np.array_equal(page_image(g4).astype(bool), pixels['g4'].astype(bool))
+    # 96 dpi: 40 x 60 px -> 30 x 45 pt
+    assert [float(v) for v in rgb.MediaBox] == [0, 0, 30, 45]
+
+
+def test_predicted_size_is_exact(tmp_path, pages):
+    paths, _ = pages
+    out = str(tmp_path / "out.pdf")
+    writer = StreamingPDFWriter(out)
+    predicted = None
+    for kind in ('rgb', 'gray', 'jpeg', 'g4'):
+        payload = load_image_payload(paths[kind])
+        predicted = writer.size_with(payload)
+        writer.add_payload(payload)
+        assert writer.final_size() == predicted
+    writer.close()
+    assert os.path.getsize(out) == predicted
+
+
+def test_stream_splits_under_limit(tmp_path, pages):
+    paths, _ = pages
+    images = [paths['rgb'], paths['gray'], paths['jpeg'], paths['g4']] * 3
+    generator = PDFGenerator(str(tmp_path / "pdf"))
+    generator.max_size_bytes = 20000
+    stream = generator.open_stream("book")
+    for path in images:
+        stream.add_page(path)
+    parts = stream.close()
+
+    assert len(parts) > 1
+    assert all(os.path.getsize(part) <= generator.max_size_bytes for part in parts)
+    assert sum(len(open_pdf(part).pages) for part in parts) == len(images)
+
+
+def test_generate_splits_under_limit(tmp_path, pages):
+    paths, _ = pages
+    images = [paths['rgb'], paths['gray'], paths['jpeg'], paths['g4']] * 3
+    generator = PDFGenerator(str(tmp_path / "pdf"))
+    generator.max_size_bytes = 20000
+    payloads = [load_image_payload(path) for path in images]
+    for balance in (False, True):
+        plan = generator.plan_parts(payloads, balance=balance)
+        parts = generator.generate(images, "book", balance=balance)
+        # Written exactly as planned: no part over the limit, none re-split
+        assert len(parts) == len(plan) > 1
+        assert [os.path.getsize(part) for part in parts] == \
+            [PDFGenerator._part_size(payloads[start:end]) for start, end in plan]
+        assert all(os.path.getsize(part) <= generator.max_size_bytes for part in parts)
+        assert sum(len(open_pdf(part).pages) for part in parts) == len(images)
+
+
+def test_text_pages_parse(tmp_path):
+    out = str(tmp_path / "text.pdf")
+    writer = TextPDFWriter(out)
+    writer.add_text_page("吾輩は猫である。名前はまだ無い。\nABC 123", heading="p. 1")
+    writer.add_text_page("どこで生れたかとんと見当がつかぬ。" * 80)  # flows over several pages
+    predicted = writer.final_size()
+    writer.close()
+
+    pdf = open_pdf(out)
+    assert len(pdf.pages) >= 3
+    assert os.path.getsize(out) == predicted
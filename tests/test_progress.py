@@ -0,0 +1,55 @@
+"""ProgressChannel: worker threads only queue; everything runs on the main-loop tick."""
+import threading
+
+from progress import ProgressChannel
+
+
+class FakeWidget:
+    """Records after() jobs instead of running a Tk main loop; tick() runs them."""
+    def __init__(self):
+        self.jobs = []
+
+    def after(self, ms, fn):
+        self.jobs.append(fn)
+        return len(self.jobs)
+
+    def after_cancel(self, job):
+        pass
+
+    def tick(self):
+        jobs, self.jobs = self.jobs, []
+        for fn in jobs:
+            fn()
+
+
+def test_messages_coalesce_and_calls_run_on_the_tick():
+    widget = FakeWidget()
+    seen = []
+    channel = ProgressChannel(widget, lambda message, count: seen.append(('update', message, count)))
+    channel.start()
+
+    def worker():
+        for page in range(1, 51):
+            channel.post(f"page {page}", page)
+        channel.call(seen.append, ('finished',))
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert seen == []  # nothing ran on the worker thread
+
+    widget.tick()
+    assert seen == [('update', "page 50", 50), ('finished',)]
+    widget.tick()
+    assert seen[-1] == ('update', None, None)  # metrics keep refreshing
+
+
+def test_stop_delivers_what_is_queued():
+    widget = FakeWidget()
+    seen = []
+    channel = ProgressChannel(widget, lambda message, count: seen.append(message))
+    channel.start()
+    channel.post("done")
+    channel.call(seen.append, "callback")
+    channel.stop()
+    assert seen == ["done", "callback"]
@@ -0,0 +1,70 @@
+"""SessionJournal: crash-safe record of a capture session, resume and delete."""
+import json
+import os
+
+import pytest
+
+from session_journal import SessionJournal, journal_for_book
+
+
+@pytest.fixture
+def saved_pages(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"page_{i + 1:04d}.png"
+        path.write_bytes(b"png %d" % i)
+        paths.append(str(path))
+    return paths
+
+
+def record(journal, paths):
+    for i, path in enumerate(paths):
+        journal.record_page(path, f"hash{i}")
+
+
+def test_interrupted_session_reloads_and_resumes(tmp_path, saved_pages):
+    journal = journal_for_book(str(tmp_path), "本: 第1巻")
+    journal.start(region={'top': 0, 'left': 0, 'width': 10, 'height': 10}, wait_time=0.5)
+    record(journal, saved_pages[:2])
+    journal.close()  # crash: no end record
+
+    reopened = journal_for_book(str(tmp_path), "本: 第1巻")
+    assert reopened.resumable
+    assert reopened.header['wait_time'] == 0.5
+    assert reopened.page_paths() == saved_pages[:2]
+    assert reopened.last_page()['hash'] == "hash1"
+
+    reopened.resume()
+    reopened.record_page(saved_pages[2], "hash2")
+    reopened.record_end('completed')
+    done = SessionJournal(reopened.path)
+    assert [p['index'] for p in done.pages] == [1, 2, 3]
+    assert not done.resumable
+
+
+def test_torn_last_line_is_ignored(tmp_path, saved_pages):
+    path = str(tmp_path / "session.jsonl")
+    journal = SessionJournal(path)
+    journal.start()
+    record(journal, saved_pages[:2])
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'type': 'page', 'index': 3, 'path': saved_pages[2]})[:20])
+    assert SessionJournal(path).page_paths() == saved_pages[:2]
+
+
+def test_pages_deleted_since_are_skipped(tmp_path, saved_pages):
+    journal = SessionJournal(str(tmp_path / "session.jsonl"))
+    journal.start()
+    record(journal, saved_pages)
+    os.remove(saved_pages[1])
+    assert journal.page_paths() == [saved_pages[0], saved_pages[2]]
+
+
+def test_delete_leaves_nothing_to_resume(tmp_path, saved_pages):
+    journal = journal_for_book(str(tmp_path), "book")
+    journal.start()
+    record(journal, saved_pages)
+    journal.delete()
+    assert not os.path.exists(journal.path)
+    assert not journal_for_book(str(tmp_path), "book").resumable
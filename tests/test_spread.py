@@ -0,0 +1,48 @@
+"""SpreadSplitter: two-page spreads are split at the gutter, single pages are left alone."""
+import numpy as np
+import pytest
+
+from frame_source import Frame
+from spread import SpreadSplitter
+
+
+def text_block(img, left, right, ink):
+    # Vertical text columns with narrow gaps, which must not be taken for the gutter
+    for x in range(left, right, 12):
+        img[40:-40:3, x:x + 8] = ink
+
+
+def make_frame(width=800, height=600, gutter=None, background=255, ink=0):
+    img = np.full((height, width, 4), background, np.uint8)
+    if gutter is None:
+        text_block(img, 40, width - 40, ink)
+    else:
+        text_block(img, 40, gutter - 30, ink)
+        text_block(img, gutter + 30, width - 40, ink)
+    return Frame(img)
+
+
+@pytest.mark.parametrize("background, ink", [(255, 0), (30, 220)])  # light and dark themes
+def test_spread_is_split_in_reading_order(background, ink):
+    frame = make_frame(gutter=420, background=background, ink=ink)
+    splitter = SpreadSplitter()
+    gutter = splitter.find_gutter(frame)
+    assert abs(gutter - 420) <= 4
+    right_first = splitter.split(frame, right_to_left=True)
+    assert [np.asarray(page).shape[1] for page in right_first] == [800 - gutter, gutter]
+    left, right = splitter.split(frame)
+    assert np.shares_memory(np.asarray(left), np.asarray(frame))  # views, not copies
+    assert splitter.stats == {'spreads': 2, 'singles': 0}
+
+
+def test_single_page_is_kept_whole():
+    splitter = SpreadSplitter()
+    frame = make_frame()
+    assert splitter.split(frame) == [frame]
+    # A gap with ink on one side only is an off-center page, and a blank frame is no spread either
+    half = make_frame()
+    np.asarray(half)[:, 400:] = 255
+    assert splitter.split(half) == [half]
+    blank = make_frame(gutter=400, ink=255)
+    assert splitter.split(blank) == [blank]
+    assert splitter.stats == {'spreads': 0, 'singles': 3}